@@ -31,6 +31,27 @@
 # NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-from gengo import Gengo, GengoError, GengoAuthError
+from gengo import Gengo, GengoError, GengoAuthError, GengoCircuitOpenError, \
+    GengoDeadlineExceeded, GengoInFlightError, GengoJobsError
+from cache import JobCache
+from hedging import Hedger
+from breaker import CircuitBreaker
+from deadline import Deadline
+from limiter import AdaptiveLimiter
+from ratelimit import SQLiteRateLimitBackend
+from journal import SubmissionJournal
+from idempotency import IdempotencyIndex
+from tm import TranslationMemory
+from quotes import QuoteCache
+from files import FileIndex
+from languages import LanguagePairIndex
+from sync import JobSync
+from glossary import GlossaryManager
+from orders import OrderWaiter
 
-__all__ = ['Gengo', 'GengoError', 'GengoAuthError']
+__all__ = ['Gengo', 'GengoError', 'GengoAuthError', 'GengoCircuitOpenError',
+           'GengoDeadlineExceeded', 'GengoInFlightError', 'GengoJobsError',
+           'JobCache', 'Hedger', 'CircuitBreaker', 'Deadline',
+           'AdaptiveLimiter', 'SQLiteRateLimitBackend', 'SubmissionJournal',
+           'IdempotencyIndex', 'TranslationMemory', 'QuoteCache', 'FileIndex',
+           'LanguagePairIndex', 'JobSync', 'GlossaryManager', 'OrderWaiter']
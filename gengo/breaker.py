@@ -0,0 +1,181 @@
+# All code provided from the http://gengo.com site, such as API example code
+# and libraries, is provided under the New BSD license unless otherwise
+# noted. Details are below.
+#
+# New BSD License
+# Copyright (c) 2009-2012, myGengo, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# Neither the name of myGengo, Inc. nor the names of its contributors may
+# be used to endorse or promote products derived from this software
+# without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A circuit breaker for the Gengo API.
+
+When the API is having a bad day, waiting on every slow or failing call
+ties up all of our worker threads. The breaker watches each endpoint group
+(see the 'group' entries in mockdb.apihash) and, after too many failures or
+too many slow calls in a row, "opens": calls to that group are refused
+straight away for a while. After reset_timeout a few probe calls are let
+through (half-open); if they succeed the breaker closes again, otherwise it
+re-opens.
+"""
+
+import threading
+
+from time import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class _Circuit(object):
+    """
+    State for a single endpoint group.
+    """
+    def __init__(self, failure_threshold, slow_call_threshold,
+                 reset_timeout, half_open_probes):
+        self.failure_threshold = failure_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self.probes = 0
+        self.successes = 0
+        self.rejected = 0
+        self.trips = 0
+
+
+class CircuitBreaker(object):
+    """
+    CircuitBreaker(failure_threshold = 5, slow_call_threshold = 10.0,
+    reset_timeout = 30.0, half_open_probes = 1, groups = None)
+
+    failure_threshold - consecutive bad calls (errors, 5xx responses or
+    calls slower than slow_call_threshold seconds) that trip the breaker.
+    reset_timeout - seconds to stay open before probing.
+    half_open_probes - how many probe calls may be in flight at once, and
+    how many must succeed before the breaker closes.
+    groups - per-group overrides, e.g. {'quote': {'slow_call_threshold':
+    60}}. Keys are the same keyword arguments as above.
+    """
+    def __init__(self, failure_threshold=5, slow_call_threshold=10.0,
+                 reset_timeout=30.0, half_open_probes=1, groups=None):
+        self.defaults = {
+            'failure_threshold': failure_threshold,
+            'slow_call_threshold': slow_call_threshold,
+            'reset_timeout': reset_timeout,
+            'half_open_probes': half_open_probes,
+        }
+        self.overrides = groups or {}
+        self.circuits = {}
+        self.lock = threading.Lock()
+
+    def allow(self, group):
+        """
+        Returns True if a call to group may go ahead. In the half-open
+        state this hands out one of the probe slots, so every allowed call
+        must be followed by record().
+        """
+        with self.lock:
+            circuit = self._circuit(group)
+            if circuit.state == OPEN:
+                if time() - circuit.opened_at < circuit.reset_timeout:
+                    circuit.rejected += 1
+                    return False
+                circuit.state = HALF_OPEN
+                circuit.probes = 0
+                circuit.successes = 0
+            if circuit.state == HALF_OPEN:
+                if circuit.probes >= circuit.half_open_probes:
+                    circuit.rejected += 1
+                    return False
+                circuit.probes += 1
+            return True
+
+    def record(self, group, ok, elapsed):
+        """
+        Reports the outcome of an allowed call: ok is False for errors and
+        server-side failures, elapsed is its duration in seconds.
+        """
+        with self.lock:
+            circuit = self._circuit(group)
+            if elapsed > circuit.slow_call_threshold:
+                ok = False
+            if circuit.state == HALF_OPEN:
+                circuit.probes -= 1
+                if not ok:
+                    self._trip(circuit)
+                else:
+                    circuit.successes += 1
+                    if circuit.successes >= circuit.half_open_probes:
+                        circuit.state = CLOSED
+                        circuit.failures = 0
+            elif ok:
+                circuit.failures = 0
+            else:
+                circuit.failures += 1
+                if circuit.state == CLOSED and \
+                        circuit.failures >= circuit.failure_threshold:
+                    self._trip(circuit)
+
+    def retry_after(self, group):
+        """
+        Seconds until an open circuit starts probing again.
+        """
+        with self.lock:
+            circuit = self._circuit(group)
+            if circuit.state != OPEN:
+                return 0
+            return max(0, circuit.reset_timeout -
+                       (time() - circuit.opened_at))
+
+    def state(self, group):
+        with self.lock:
+            return self._circuit(group).state
+
+    def stats(self):
+        with self.lock:
+            return dict([(group, {'state': c.state,
+                                  'failures': c.failures,
+                                  'rejected': c.rejected,
+                                  'trips': c.trips})
+                         for group, c in self.circuits.items()])
+
+    def _trip(self, circuit):
+        circuit.state = OPEN
+        circuit.opened_at = time()
+        circuit.trips += 1
+
+    def _circuit(self, group):
+        circuit = self.circuits.get(group)
+        if circuit is None:
+            config = dict(self.defaults)
+            config.update(self.overrides.get(group, {}))
+            circuit = self.circuits[group] = _Circuit(**config)
+        return circuit
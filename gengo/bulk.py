@@ -0,0 +1,302 @@
+# All code provided from the http://gengo.com site, such as API example code
+# and libraries, is provided under the New BSD license unless otherwise
+# noted. Details are below.
+#
+# New BSD License
+# Copyright (c) 2009-2012, myGengo, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# Neither the name of myGengo, Inc. nor the names of its contributors may
+# be used to endorse or promote products derived from this software
+# without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Helpers for calls that cover many jobs at once.
+
+A single request for hundreds of jobs is slow and fails as a unit. The
+helpers here split the work into smaller requests, run them concurrently
+over the Gengo instance's connection pool (sized by its AdaptiveLimiter,
+if it has one) and merge the results back under the original job keys.
+"""
+
+import heapq
+import os
+import threading
+
+from Queue import Queue, Empty
+
+from gengo import GengoError, GengoJobsError
+
+DEFAULT_WORKERS = 4
+
+
+def job_size(job):
+    """
+    Bytes a job adds to a request: the file for file jobs, the source text
+    for everything else.
+    """
+    if job.get('type') == 'file' and job.get('file_path'):
+        return os.path.getsize(job['file_path'])
+    body = job.get('body_src') or ''
+    if isinstance(body, unicode):
+        body = body.encode('utf-8')
+    return len(body)
+
+
+def pack_jobs(jobs, max_bytes, max_jobs):
+    """
+    Splits {key: job} into a list of {key: job} groups of roughly equal
+    size, each at most max_bytes (by job_size()) and max_jobs jobs. A job
+    bigger than max_bytes gets a group of its own.
+
+    Jobs are placed largest first into the lightest group that still has
+    room, starting from as few groups as the limits allow.
+    """
+    sizes = dict([(k, job_size(j)) for k, j in jobs.items()])
+    keys = sorted(jobs, key=lambda k: (-sizes[k], k))
+    total = sum(sizes.values())
+    count = max(-(-total // max_bytes), -(-len(keys) // max_jobs), 1)
+    groups = [{} for i in range(min(count, len(keys)))]
+    heap = [(0, i) for i in range(len(groups))]
+    for key in keys:
+        skipped = []
+        while heap:
+            load, i = heapq.heappop(heap)
+            if len(groups[i]) < max_jobs and \
+                    (not groups[i] or load + sizes[key] <= max_bytes):
+                break
+            skipped.append((load, i))
+        else:
+            groups.append({})
+            load, i = 0, len(groups) - 1
+        groups[i][key] = jobs[key]
+        heapq.heappush(heap, (load + sizes[key], i))
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+    return [g for g in groups if g]
+
+
+def run_concurrently(tasks, work, workers=None, gengo=None):
+    """
+    Calls work(task) for every task on a small pool of threads and returns
+    [(task, result, error)] in the order of tasks, error being the
+    exception (if any) raised for that task, be it a GengoError or a
+    network failure. Without an explicit workers
+    count, the pool follows gengo.limiter's current limit.
+    """
+    if workers is None:
+        limiter = getattr(gengo, 'limiter', None)
+        workers = limiter.limit if limiter is not None else DEFAULT_WORKERS
+    queue = Queue()
+    for i, task in enumerate(tasks):
+        queue.put((i, task))
+    outcomes = [None] * len(tasks)
+
+    def worker():
+        while True:
+            try:
+                i, task = queue.get_nowait()
+            except Empty:
+                return
+            try:
+                outcomes[i] = (task, work(task), None)
+            except Exception, e:
+                outcomes[i] = (task, None, e)
+
+    threads = [threading.Thread(target=worker)
+               for i in range(max(1, min(workers, len(tasks))))]
+    for t in threads:
+        t.daemon = True
+        t.start()
+    for t in threads:
+        t.join()
+    return outcomes
+
+
+def group_errors(group, e):
+    """
+    {job_key: [{'code', 'msg'}]} for every job in a group whose request
+    failed as a whole. Errors from outside the API (a dropped connection,
+    say) have no code and use their string form as the message.
+    """
+    error = [{'code': getattr(e, 'error_code', None),
+              'msg': getattr(e, 'msg', None) or str(e)}]
+    return dict([(k, error) for k in group])
+
+
+def quote_jobs(gengo, jobs, max_bytes=8 << 20, max_jobs=50, workers=None,
+               deadline=None):
+    """
+    quote_jobs(gengo, jobs, max_bytes = 8MB, max_jobs = 50, workers = None,
+    deadline = None) -> dict
+
+    determineTranslationCost for any number of jobs, files included. The
+    jobs are packed into groups with pack_jobs(), and the groups quoted
+    concurrently. Returns {'jobs': {key: quote}, 'errors': {key: [{'code',
+    'msg'}]}}; a failed group only costs the quotes of its own jobs.
+    """
+    def quote(group):
+        # The upload path rewrites file jobs, so send copies.
+        payload = dict([(k, dict(j)) for k, j in group.items()])
+        return gengo.determineTranslationCost(jobs={'jobs': payload},
+                                              deadline=deadline)
+
+    quotes = {}
+    errors = {}
+    groups = pack_jobs(jobs, max_bytes, max_jobs)
+    for group, result, e in run_concurrently(groups, quote, workers, gengo):
+        if isinstance(e, GengoJobsError):
+            quotes.update(e.succeeded)
+            errors.update(e.errors)
+        elif e is not None:
+            errors.update(group_errors(group, e))
+        else:
+            quotes.update(result.get('response', {}).get('jobs', {}))
+    return {'jobs': quotes, 'errors': errors}
+
+
+def expand_targets(job, targets):
+    """
+    One job per target language: {lc_tgt: job}. The copies are shallow,
+    so body_src and every other field is shared rather than duplicated;
+    repeated targets are dropped.
+    """
+    return dict([(lc_tgt, dict(job, lc_tgt=lc_tgt)) for lc_tgt in targets])
+
+
+def order_targets(gengo, job, targets, pairs, options=None, quote=True,
+                  deadline=None):
+    """
+    order_targets(gengo, job, targets, pairs, options = None, quote = True,
+    deadline = None) -> dict
+
+    Orders one source job (everything but lc_tgt) in every language of
+    targets, keyed by lc_tgt. pairs is a LanguagePairIndex; it is loaded
+    if need be, and jobs it finds invalid (e.g. an unsupported target)
+    raise GengoJobsError before anything is quoted or ordered. options
+    holds extra payload fields such as as_group.
+
+    All targets are quoted with one determineTranslationCost call (unless
+    quote is False) and ordered with one postTranslationJobs call. Returns
+    {'jobs': {lc_tgt: quote}, 'order': the postTranslationJobs
+    response}.
+    """
+    pairs.ensure(gengo, deadline)
+    jobs = expand_targets(job, targets)
+    errors = pairs.validate(jobs)
+    if errors:
+        raise GengoJobsError('Cannot order %s' % ', '.join(sorted(errors)),
+                             errors=errors, submitted=jobs)
+    quotes = {}
+    if quote:
+        quoted = gengo.determineTranslationCost(jobs={'jobs': jobs},
+                                                deadline=deadline)
+        quotes = quoted['response'].get('jobs', {})
+    payload = dict(options or {})
+    payload['jobs'] = jobs
+    order = gengo.postTranslationJobs(jobs=payload, deadline=deadline)
+    return {'jobs': quotes, 'order': order.get('response', {})}
+
+
+def _job_id(entry):
+    # job_ids entries are IDs, or dictionaries with a job_id and the
+    # fields the action needs (e.g. a rating).
+    if isinstance(entry, dict):
+        return entry.get('job_id')
+    return entry
+
+
+def _job_outcomes(chunk, result, e):
+    """
+    Splits the outcome of one request covering the jobs in chunk into
+    ({job_id: result}, {job_id: errors}, [job_id]), the last being jobs
+    a partial failure said nothing about: whether the action was applied
+    to them is unknown, so they are neither updated nor failed.
+    """
+    ids = [_job_id(entry) for entry in chunk]
+    if isinstance(e, GengoJobsError):
+        errors = dict([(i, e.errors[str(i)]) for i in ids
+                       if str(i) in e.errors])
+        updated = dict([(i, e.succeeded[str(i)]) for i in ids
+                        if str(i) in e.succeeded and i not in errors])
+        return (updated, errors,
+                [i for i in ids if i not in errors and i not in updated])
+    if e is not None:
+        return {}, group_errors(ids, e), []
+    return dict([(i, result.get('response') or {}) for i in ids]), {}, []
+
+
+def update_jobs(gengo, action, job_ids, chunk_size=50, workers=None,
+                deadline=None):
+    """
+    update_jobs(gengo, action, job_ids, chunk_size = 50, workers = None,
+    deadline = None) -> dict
+
+    Applies action ('approve', 'archive', ... or a dictionary with the
+    action and its extra fields) to every job in job_ids, using
+    updateTranslationJobs for chunk_size jobs at a time and running the
+    chunks concurrently. Returns {'jobs': {job_id: response}, 'errors':
+    {job_id: [{'code', 'msg'}]}, 'unknown': [job_id]}. When a chunk fails
+    for some of its jobs, the ones the API neither confirmed nor blamed
+    go to 'unknown'; check on them or send them again.
+    """
+    def update(chunk):
+        return gengo.updateTranslationJobs(action=action, job_ids=chunk,
+                                           deadline=deadline)
+
+    chunks = [job_ids[i:i + chunk_size]
+              for i in range(0, len(job_ids), chunk_size)]
+    updated = {}
+    errors = {}
+    unknown = []
+    for chunk, result, e in run_concurrently(chunks, update, workers,
+                                             gengo):
+        chunk_updated, chunk_errors, chunk_unknown = \
+            _job_outcomes(chunk, result, e)
+        updated.update(chunk_updated)
+        errors.update(chunk_errors)
+        unknown.extend(chunk_unknown)
+    return {'jobs': updated, 'errors': errors, 'unknown': unknown}
+
+
+def delete_jobs(gengo, job_ids, workers=None, deadline=None):
+    """
+    Cancels every job in job_ids with concurrent deleteTranslationJob
+    calls (the API has no bulk delete). Returns the same shape as
+    update_jobs().
+    """
+    def delete(job_id):
+        return gengo.deleteTranslationJob(id=job_id, deadline=deadline)
+
+    deleted = {}
+    errors = {}
+    unknown = []
+    for job_id, result, e in run_concurrently(job_ids, delete, workers,
+                                              gengo):
+        job_deleted, job_errors, job_unknown = \
+            _job_outcomes([job_id], result, e)
+        deleted.update(job_deleted)
+        errors.update(job_errors)
+        unknown.extend(job_unknown)
+    return {'jobs': deleted, 'errors': errors, 'unknown': unknown}
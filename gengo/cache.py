@@ -0,0 +1,255 @@
+# All code provided from the http://gengo.com site, such as API example code
+# and libraries, is provided under the New BSD license unless otherwise
+# noted. Details are below.
+#
+# New BSD License
+# Copyright (c) 2009-2012, myGengo, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# Neither the name of myGengo, Inc. nor the names of its contributors may
+# be used to endorse or promote products derived from this software
+# without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A job cache that understands the lifecycle of a Gengo job.
+
+Once a job is approved or cancelled its details, revisions and feedback
+stop changing, so there is no reason to keep asking the API for them. Jobs
+that are still moving through the system are only cached for a short TTL.
+Revalidation is driven by the job status we observe: whenever
+getTranslationJob reports a status different from the one we knew, every
+cached sub-resource for that job is dropped.
+"""
+
+import os
+import threading
+
+from time import time
+
+try:
+    import json
+    json  # silence pyflakes
+except ImportError:
+    import simplejson as json
+
+# Statuses after which a job's payloads are, for our purposes, immutable.
+TERMINAL_STATUSES = ('approved', 'cancelled')
+
+# API calls whose results are cached, keyed by job id.
+CACHED_CALLS = ('getTranslationJob', 'getTranslationJobRevisions',
+                'getTranslationJobFeedback')
+
+
+class LRU(object):
+    """
+    LRU(capacity)
+
+    A small least-recently-used mapping. Python 2.6 has no OrderedDict, so
+    this keeps its own doubly linked list; put() returns whatever fell out
+    the far end so callers can spill it somewhere.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.map = {}
+        # Sentinel node; links are [prev, next, key, value].
+        self.root = root = []
+        root[:] = [root, root, None, None]
+
+    def __len__(self):
+        return len(self.map)
+
+    def __contains__(self, key):
+        return key in self.map
+
+    def get(self, key, default=None):
+        link = self.map.get(key)
+        if link is None:
+            return default
+        self._unlink(link)
+        self._append(link)
+        return link[3]
+
+    def put(self, key, value):
+        evicted = []
+        link = self.map.get(key)
+        if link is not None:
+            link[3] = value
+            self._unlink(link)
+            self._append(link)
+            return evicted
+        link = [None, None, key, value]
+        self.map[key] = link
+        self._append(link)
+        while len(self.map) > self.capacity:
+            oldest = self.root[1]
+            self._unlink(oldest)
+            del self.map[oldest[2]]
+            evicted.append((oldest[2], oldest[3]))
+        return evicted
+
+    def pop(self, key, default=None):
+        link = self.map.pop(key, None)
+        if link is None:
+            return default
+        self._unlink(link)
+        return link[3]
+
+    def _append(self, link):
+        last = self.root[0]
+        link[0] = last
+        link[1] = self.root
+        last[1] = link
+        self.root[0] = link
+
+    def _unlink(self, link):
+        link[0][1] = link[1]
+        link[1][0] = link[0]
+
+
+class JobCache(object):
+    """
+    JobCache(max_entries = 1024, ttl = 30, spill_dir = None)
+
+    max_entries - how many payloads to keep in memory.
+    ttl - seconds a payload for a job that is not yet finished stays fresh.
+    spill_dir - optional directory; payloads of finished jobs that fall out
+    of memory are written here as JSON and read back on demand.
+
+    Payloads are stored as JSON strings, so every hit hands out a fresh
+    dictionary that the caller is free to mutate.
+    """
+    def __init__(self, max_entries=1024, ttl=30, spill_dir=None):
+        self.ttl = ttl
+        self.spill_dir = spill_dir
+        self.entries = LRU(max_entries)
+        self.statuses = LRU(max_entries)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.spilled = 0
+        if spill_dir is not None and not os.path.isdir(spill_dir):
+            os.makedirs(spill_dir)
+
+    def get(self, api_call, job_id):
+        """
+        Returns the cached results for api_call on job_id, or None.
+        """
+        key = (api_call, str(job_id))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self._load_spilled(key)
+            if entry is not None:
+                payload, status, stored = entry
+                if status in TERMINAL_STATUSES or \
+                        time() - stored < self.ttl:
+                    self.hits += 1
+                    return json.loads(payload)
+                self.entries.pop(key)
+            self.misses += 1
+        return None
+
+    def put(self, api_call, job_id, results):
+        """
+        Stores a successful result. getTranslationJob results also update
+        the job status we know about; a status change invalidates the
+        job's other cached payloads.
+        """
+        job_id = str(job_id)
+        with self.lock:
+            status = self.statuses.get(job_id)
+            if api_call == 'getTranslationJob':
+                try:
+                    new_status = results['response']['job']['status']
+                except (KeyError, TypeError):
+                    new_status = None
+                if status is not None and new_status != status:
+                    self._invalidate(job_id)
+                self.statuses.put(job_id, new_status)
+                status = new_status
+            entry = (json.dumps(results, separators=(',', ':')), status,
+                     time())
+            for key, old in self.entries.put((api_call, job_id), entry):
+                self._spill(key, old)
+
+    def invalidate(self, job_id):
+        """
+        Forgets everything cached about a job (e.g. after updating it).
+        """
+        with self.lock:
+            self._invalidate(str(job_id))
+            self.statuses.pop(str(job_id))
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'spilled': self.spilled,
+                'entries': len(self.entries),
+            }
+
+    def _invalidate(self, job_id):
+        for api_call in CACHED_CALLS:
+            key = (api_call, job_id)
+            self.entries.pop(key)
+            path = self._spill_path(key)
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+
+    def _spill_path(self, key):
+        if self.spill_dir is None:
+            return None
+        # Job ids are numeric, but don't trust them blindly with a path.
+        safe_id = ''.join([c for c in key[1] if c.isalnum()])
+        return os.path.join(self.spill_dir, '%s-%s.json' % (key[0], safe_id))
+
+    def _spill(self, key, entry):
+        # Only finished jobs are worth keeping around on disk; anything
+        # else would be stale long before it is read back.
+        path = self._spill_path(key)
+        if path is None or entry[1] not in TERMINAL_STATUSES:
+            return
+        tmp = path + '.tmp'
+        f = open(tmp, 'wb')
+        try:
+            f.write(json.dumps([entry[0], entry[1], entry[2]]))
+        finally:
+            f.close()
+        os.rename(tmp, path)
+        self.spilled += 1
+
+    def _load_spilled(self, key):
+        path = self._spill_path(key)
+        if path is None or not os.path.exists(path):
+            return None
+        f = open(path, 'rb')
+        try:
+            payload, status, stored = json.loads(f.read())
+        finally:
+            f.close()
+        entry = (payload, status, stored)
+        for old_key, old in self.entries.put(key, entry):
+            self._spill(old_key, old)
+        return entry
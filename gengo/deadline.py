@@ -0,0 +1,90 @@
+# All code provided from the http://gengo.com site, such as API example code
+# and libraries, is provided under the New BSD license unless otherwise
+# noted. Details are below.
+#
+# New BSD License
+# Copyright (c) 2009-2012, myGengo, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# Neither the name of myGengo, Inc. nor the names of its contributors may
+# be used to endorse or promote products derived from this software
+# without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Deadline budgets for operations that are made of several API calls.
+
+A Deadline is created once, at the top of an operation ("submit all of
+these jobs within 60 seconds"), and handed down to every call the
+operation makes. Each call caps its own socket timeout to whatever is
+left of the budget, and once the budget is spent no new requests are
+started.
+"""
+
+from time import time
+
+
+class Deadline(object):
+    """
+    Deadline(seconds)
+
+    A point in time, `seconds` from now, by which an operation has to be
+    finished.
+    """
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time() + seconds
+
+    def remaining(self):
+        """
+        Seconds left in the budget, never negative.
+        """
+        return max(0.0, self.expires_at - time())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def child(self, seconds):
+        """
+        A nested deadline for a sub-operation: `seconds` from now, but
+        never later than this one.
+        """
+        child = Deadline(min(seconds, self.remaining()))
+        child.expires_at = min(child.expires_at, self.expires_at)
+        return child
+
+    def cap(self, timeout):
+        """
+        Bounds a requests-style timeout (None, a number, or a (connect,
+        read) tuple) by the remaining budget.
+        """
+        remaining = self.remaining()
+        if timeout is None:
+            return remaining
+        if isinstance(timeout, tuple):
+            return tuple([min(t, remaining) if t is not None else remaining
+                          for t in timeout])
+        return min(timeout, remaining)
+
+    def __repr__(self):
+        return '<Deadline %.3fs remaining>' % self.remaining()
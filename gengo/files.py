@@ -0,0 +1,250 @@
+# All code provided from the http://gengo.com site, such as API example code
+# and libraries, is provided under the New BSD license unless otherwise
+# noted. Details are below.
+#
+# New BSD License
+# Copyright (c) 2009-2012, myGengo, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# Neither the name of myGengo, Inc. nor the names of its contributors may
+# be used to endorse or promote products derived from this software
+# without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Pre-flight analysis of local files before they are uploaded.
+
+File jobs are quoted by uploading the whole document. Much of the time we
+already know the answer, or at least roughly: analyze_file() memory-maps a
+file and works out its size, SHA-1, text encoding and an approximate unit
+count while only ever holding one block of it in the Python heap. The
+hash lets quotes (and later uploads) be reused for unchanged files.
+
+FileIndex goes one step further: it remembers the identifier the API
+handed back for each uploaded file, so re-quoting or ordering an
+unchanged file never streams its bytes again.
+"""
+
+import codecs
+import mmap
+import os
+import sqlite3
+import threading
+
+from hashlib import sha1
+from time import time
+
+from units import is_character_language
+
+try:
+    import json
+    json  # silence pyflakes
+except ImportError:
+    import simplejson as json
+
+BLOCK_SIZE = 1 << 20
+
+# Tried in order on files without a byte order mark.
+CANDIDATE_ENCODINGS = ('utf-8', 'shift_jis', 'euc-jp', 'gb18030', 'big5',
+                       'euc-kr')
+
+_BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+
+def detect_encoding(sample):
+    """
+    Best guess at the encoding of a byte string taken from the start of a
+    file. Returns None for data that doesn't look like text in any of the
+    encodings we know.
+    """
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
+    if '\0' in sample:
+        return None
+    for encoding in CANDIDATE_ENCODINGS:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            # final=False: the sample may end halfway through a character.
+            decoder.decode(sample, False)
+        except UnicodeDecodeError:
+            continue
+        return encoding
+    return None
+
+
+def analyze_file(path, lc_src=None, sample_size=65536):
+    """
+    analyze_file(path, lc_src = None) -> dict
+
+    Returns {'path', 'size', 'sha1', 'encoding', 'unit_count'}.
+    unit_count is counted in words, or in characters when lc_src is
+    ja/zh/ko; it's only approximate (markup counts too) and is None for
+    files that aren't plain text or when lc_src isn't given.
+    """
+    size = os.path.getsize(path)
+    info = {'path': path, 'size': size, 'sha1': None, 'encoding': None,
+            'unit_count': None}
+    h = sha1()
+    if size == 0:
+        info['sha1'] = h.hexdigest()
+        return info
+    f = open(path, 'rb')
+    try:
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            encoding = detect_encoding(m[:sample_size])
+            counter = None
+            if encoding is not None and lc_src is not None:
+                counter = _UnitCounter(encoding, lc_src)
+            for offset in xrange(0, size, BLOCK_SIZE):
+                block = m[offset:offset + BLOCK_SIZE]
+                h.update(block)
+                if counter is not None:
+                    counter.feed(block)
+            info['sha1'] = h.hexdigest()
+            info['encoding'] = encoding
+            if counter is not None:
+                info['unit_count'] = counter.finish()
+        finally:
+            m.close()
+    finally:
+        f.close()
+    return info
+
+
+class _UnitCounter(object):
+    """
+    Counts units over a stream of byte blocks, carrying partial characters
+    and words across block boundaries.
+    """
+    def __init__(self, encoding, lc_src):
+        self.decoder = codecs.getincrementaldecoder(encoding)('replace')
+        self.characters = is_character_language(lc_src)
+        self.count = 0
+        self.in_word = False
+
+    def feed(self, block, final=False):
+        text = self.decoder.decode(block, final)
+        if not text:
+            return
+        parts = text.split()
+        if self.characters:
+            self.count += sum([len(p) for p in parts])
+            return
+        self.count += len(parts)
+        # A word cut in two by the block boundary was counted twice.
+        if parts and self.in_word and not text[0].isspace():
+            self.count -= 1
+        self.in_word = not text[-1].isspace()
+
+    def finish(self):
+        self.feed('', True)
+        return self.count
+
+
+class FileIndex(object):
+    """
+    FileIndex(path = ':memory:', max_age = 86400)
+
+    path - SQLite file holding file hash -> identifier and quote. Use a
+    real file so the index survives restarts.
+    max_age - seconds an entry stays usable. Keep it below how long the
+    API holds on to uploaded files.
+
+    Pass it to Gengo(file_index=...). determineTranslationCost then
+    answers quotes for files it has seen (same content, language pair and
+    tier) locally, and postTranslationJobs swaps the file_path of a quoted
+    file for its identifier.
+    """
+    def __init__(self, path=':memory:', max_age=86400):
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS files ('
+                          'sha1 TEXT, lc_src TEXT, lc_tgt TEXT, tier TEXT, '
+                          'identifier TEXT, quote TEXT, stored REAL, '
+                          'PRIMARY KEY (sha1, lc_src, lc_tgt, tier))')
+        self.conn.commit()
+        self.reused = 0
+
+    def lookup(self, digest, job):
+        """
+        The quote we got for this file and job's language pair and tier,
+        or None.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT quote FROM files WHERE sha1 = ? AND lc_src = ? AND '
+                'lc_tgt = ? AND tier = ? AND stored > ?',
+                (digest, job.get('lc_src'), job.get('lc_tgt'),
+                 job.get('tier'), time() - self.max_age)).fetchone()
+            if row is None:
+                return None
+            self.reused += 1
+        return json.loads(row[0])
+
+    def identifier(self, digest):
+        """
+        The most recent identifier for a file, whatever it was quoted
+        for, or None.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT identifier FROM files WHERE sha1 = ? AND '
+                'stored > ? ORDER BY stored DESC LIMIT 1',
+                (digest, time() - self.max_age)).fetchone()
+            if row is None:
+                return None
+            self.reused += 1
+        return row[0]
+
+    def record(self, digest, job, quote):
+        """
+        Stores a quote for an uploaded file; quotes without an
+        identifier are ignored.
+        """
+        if not quote.get('identifier'):
+            return
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (digest, job.get('lc_src'), job.get('lc_tgt'),
+                 job.get('tier'), quote['identifier'], json.dumps(quote),
+                 time()))
+            self.conn.commit()
+
+    def expire(self):
+        """
+        Drops entries older than max_age.
+        """
+        with self.lock:
+            self.conn.execute('DELETE FROM files WHERE stored <= ?',
+                              (time() - self.max_age,))
+            self.conn.commit()
@@ -51,6 +51,13 @@ from string import lower
 
 # mockdb is a file with a dictionary of every API endpoint for Gengo.
 from mockdb import api_urls, apihash
+from singleflight import SingleFlight
+from cache import CACHED_CALLS
+from ratelimit import LocalRateLimitBackend, SharedRateLimiter
+from idempotency import SUBMIT_CALLS, read_fingerprint
+from jobs import collapse_duplicates, expand_results
+from files import analyze_file
+from streaming import StreamingFormBody
 
 # There are some special setups (like a Django application) where
 # simplejson exists. Past Python 2.6, this should never
@@ -109,12 +116,142 @@ class GengoAuthError(GengoError):
         return repr(self.msg)
 
 
+class GengoCircuitOpenError(GengoError):
+    """
+    Raised without touching the network when the circuit breaker for an
+    endpoint group is open. retry_after is the number of seconds until
+    the breaker lets probe calls through again.
+    """
+    def __init__(self, msg, group=None, retry_after=None):
+        self.msg = msg
+        self.group = group
+        self.retry_after = retry_after
+
+    def __str__(self):
+        return repr(self.msg)
+
+
+class GengoDeadlineExceeded(GengoError):
+    """
+    Raised when a call is attempted after the deadline it was given (see
+    gengo.deadline.Deadline) has already run out.
+    """
+    def __init__(self, msg):
+        self.msg = msg
+
+    def __str__(self):
+        return repr(self.msg)
+
+
+class GengoInFlightError(GengoError):
+    """
+    Raised in idempotency mode when nothing in a submission can be sent
+    because its new jobs are being submitted by another call right now.
+    Nothing was ordered; retry once that call is done. already_ordered is
+    what the response would have listed, in-flight jobs included.
+    """
+    def __init__(self, msg, already_ordered=None):
+        self.msg = msg
+        self.already_ordered = already_ordered or {}
+
+    def __str__(self):
+        return repr(self.msg)
+
+
+class GengoJobsError(GengoError):
+    """
+    Raised when a call covering several jobs (postTranslationJobs,
+    determineTranslationCost, bulk updates) fails for some of them.
+
+    errors - {job_key: [{'code': ..., 'msg': ...}, ...]} for every job that
+    failed.
+    succeeded - {job_key: result} for jobs the response reports on that
+    did not fail (e.g. quotes, or job IDs), where the API returned any.
+    response - the raw 'response' part of the reply, if there was one.
+
+    failed_jobs() gives back the payloads of just the failed jobs, ready to
+    be fixed up and resubmitted.
+    """
+    def __init__(self, msg, error_code=None, errors=None, response=None,
+                 submitted=None):
+        self.msg = msg
+        self.error_code = error_code
+        self.errors = errors or {}
+        self.response = response
+        self.submitted = submitted or {}
+        self.succeeded = {}
+        reported = {}
+        if isinstance(response, dict) and \
+                isinstance(response.get('jobs'), dict):
+            reported = response['jobs']
+        for job_key, result in reported.items():
+            if job_key not in self.errors:
+                self.succeeded[job_key] = result
+
+    def failed_jobs(self):
+        return dict([(k, j) for k, j in self.submitted.items()
+                     if k in self.errors])
+
+    def __str__(self):
+        return repr(self.msg)
+
+
+def _job_errors(err):
+    """
+    Picks the per-job entries out of an 'err' block. A plain error is just
+    {'code': ..., 'msg': ...}; errors for several jobs come keyed by job,
+    each with a list of {'code', 'msg'} dictionaries (or a single one).
+    """
+    job_errors = {}
+    if not isinstance(err, dict):
+        return job_errors
+    for job_key, value in err.items():
+        if job_key in ('code', 'msg'):
+            continue
+        if isinstance(value, dict) and 'code' in value:
+            value = [value]
+        if isinstance(value, list) and value and \
+                isinstance(value[0], dict):
+            job_errors[job_key] = value
+    return job_errors
+
+
+def _submitted_fingerprints(post_data):
+    """
+    The idempotency fingerprints embedded in the jobs of a submission.
+    """
+    if 'job' in post_data:
+        jobs = [post_data['job']['job']]
+    else:
+        jobs = post_data['jobs']['jobs'].values()
+    return [read_fingerprint(j.get('custom_data')) for j in jobs]
+
+
+def _raise_if_in_flight(to_send, known):
+    """
+    A submission left with nothing to send but jobs another call is still
+    submitting has no answer to give yet.
+    """
+    in_flight = sorted([k for k, v in known.items() if v.get('in_flight')])
+    if in_flight and not to_send:
+        raise GengoInFlightError(
+            'Being submitted by another call, retry later: %s' %
+            ', '.join(in_flight), already_ordered=known)
+
+
 class Gengo(object):
     def __init__(self, public_key=None, private_key=None, sandbox=False,
-                 api_version='2', headers=None, debug=False):
+                 api_version='2', headers=None, debug=False,
+                 coalesce=False, job_cache=None, hedger=None,
+                 breaker=None, timeout=None, limiter=None, rate_limit=None,
+                 rate_limit_backend=None, idempotency=None,
+                 pre_submit=None, file_index=None, stream_body=False):
         """
         Gengo(public_key = None, private_key = None, sandbox = False,
-        headers = None)
+        headers = None, coalesce = False, job_cache = None, hedger = None,
+        breaker = None, timeout = None, limiter = None, rate_limit = None,
+        rate_limit_backend = None, idempotency = None, pre_submit = None,
+        file_index = None, stream_body = False)
 
         Instantiates an instance of Gengo.
 
@@ -129,6 +266,56 @@ class Gengo(object):
         'Bert'}
         debug - a flag (True/False) which will cause the library to print
         useful debugging info.
+        coalesce - a flag (True/False). When set, concurrent identical GET
+        calls made through this instance share a single HTTP request and
+        its result. Counters live on self.singleflight.
+        job_cache - an optional gengo.cache.JobCache. getTranslationJob,
+        getTranslationJobRevisions and getTranslationJobFeedback results are
+        served from it; approved/cancelled jobs are kept indefinitely.
+        hedger - an optional gengo.hedging.Hedger. Slow GET requests get a
+        second, identical request sent after a percentile-based delay and
+        the first response wins.
+        breaker - an optional gengo.breaker.CircuitBreaker. While the
+        breaker for an endpoint group is open, calls to it raise
+        GengoCircuitOpenError instead of waiting on a struggling API.
+        timeout - default timeout for every request, in seconds, or a
+        (connect, read) tuple. Individual calls can override it with a
+        timeout keyword argument, and can pass deadline=Deadline(...) to
+        cap it by an overall budget.
+        limiter - an optional gengo.limiter.AdaptiveLimiter bounding how
+        many requests this instance has in flight; the bound adapts to
+        observed latency.
+        rate_limit - requests per second allowed for this public_key.
+        rate_limit_backend - where the token bucket lives, e.g. a
+        gengo.ratelimit.SQLiteRateLimitBackend shared by every process on
+        the host. Defaults to a bucket private to this process.
+        idempotency - an optional gengo.idempotency.IdempotencyIndex.
+        postTranslationJob(s) then fingerprint every job into its
+        custom_data and never order the same job twice; jobs that were
+        already ordered are listed under 'already_ordered' in the
+        response.
+        pre_submit - an optional callable run on the jobs of every
+        postTranslationJobs call. It takes {key: job} and returns (jobs
+        to send, report); the report is passed back as
+        response['pre_submit']. See TranslationMemory.pre_submit_hook().
+        A list of such callables runs them in order, each on the jobs the
+        previous one kept, and response['pre_submit'] is then the list of
+        their reports, e.g. pre_submit=[pairs.pre_submit_hook(),
+        tm.pre_submit_hook()] validates jobs before looking them up.
+        file_index - an optional gengo.files.FileIndex. File jobs whose
+        content was uploaded before are then quoted from the index and
+        ordered by the identifier the API gave back, instead of being
+        uploaded again.
+        stream_body - a flag (True/False). When set, jobs payloads are
+        JSON- and form-encoded into the request body as it is sent (see
+        gengo.streaming) rather than built in memory first; worth it for
+        very large batches.
+
+        postTranslationJobs and determineTranslationCost also take
+        dedupe=True, which sends identical text jobs (same body_src,
+        lc_src, lc_tgt, tier and glossary_id) once. Quotes are copied back
+        to every original key, and response['collapsed'] maps each key
+        that was sent to all the keys it stands for.
         """
         self.api_url = \
             api_urls['sandbox'] if sandbox is True else api_urls['base']
@@ -146,6 +333,24 @@ class Gengo(object):
                     'Version %s; http://gengo.com/' % __version__}
         self.headers['Accept'] = 'application/json'
         self.debug = debug
+        self.singleflight = SingleFlight() if coalesce is True else None
+        self.job_cache = job_cache
+        self.hedger = hedger
+        self.breaker = breaker
+        self.timeout = timeout
+        self.limiter = limiter
+        self.rate_limiter = None
+        if rate_limit is not None:
+            self.rate_limiter = SharedRateLimiter(
+                rate_limit_backend or LocalRateLimitBackend(),
+                'gengo:%s' % public_key, rate_limit)
+        self.idempotency = idempotency
+        self.pre_submit = pre_submit
+        self.file_index = file_index
+        self.stream_body = stream_body
+        # One session per instance, so concurrent calls (see gengo.bulk)
+        # share a pool of keep-alive connections.
+        self.session = requests.Session()
 
     def __getattr__(self, api_call):
         """
@@ -179,6 +384,26 @@ class Gengo(object):
             # from our api hash table.
             fn = apihash[api_call]
 
+            # Timeouts and deadlines are ours, not the API's. A call made
+            # with an exhausted deadline never leaves the building.
+            timeout = kwargs.pop('timeout', self.timeout)
+            deadline = kwargs.pop('deadline', None)
+            if deadline is not None:
+                if deadline.expired():
+                    raise GengoDeadlineExceeded(
+                        'Deadline exceeded before calling %s' % api_call)
+                timeout = deadline.cap(timeout)
+
+            # Job payloads are cached by job id only, so anything with
+            # extra parameters goes straight to the API.
+            job_id = kwargs.get('id')
+            cacheable = self.job_cache is not None and \
+                api_call in CACHED_CALLS and kwargs.keys() == ['id']
+            if cacheable:
+                cached = self.job_cache.get(api_call, job_id)
+                if cached is not None:
+                    return cached
+
             # Do a check here for specific job sets - we need to support
             # posting multiple jobs
             # at once, so see if there's an dictionary of jobs passed in,
@@ -196,6 +421,64 @@ class Gengo(object):
             if 'job_ids' in kwargs:
                 post_data['job_ids'] = kwargs.pop('job_ids')
 
+            # The jobs as the caller passed them, for failed_jobs();
+            # what is sent may be collapsed, filtered or tagged below.
+            submitted = post_data.get('jobs', {}).get('jobs', {})
+
+            # With dedupe=True, identical text jobs in a batch are sent
+            # (and paid for) once; results are fanned back out below.
+            collapsed = {}
+            if kwargs.pop('dedupe', False) and \
+                    'jobs' in post_data.get('jobs', {}):
+                payload = dict(post_data['jobs'])
+                payload['jobs'], collapsed = \
+                    collapse_duplicates(payload['jobs'])
+                post_data['jobs'] = payload
+
+            # Give the pre-submit hooks (e.g. a translation memory) the
+            # chance to drop jobs we don't need to order.
+            pre_submit_report = None
+            if self.pre_submit is not None and \
+                    api_call == 'postTranslationJobs':
+                chained = isinstance(self.pre_submit, (list, tuple))
+                hooks = self.pre_submit if chained else [self.pre_submit]
+                payload = dict(post_data['jobs'])
+                reports = []
+                for hook in hooks:
+                    payload['jobs'], report = hook(payload['jobs'])
+                    reports.append(report)
+                pre_submit_report = reports if chained else reports[0]
+                post_data['jobs'] = payload
+                if not payload['jobs']:
+                    return {'opstat': 'ok', 'response': {
+                        'order_id': None, 'job_count': 0,
+                        'collapsed': collapsed,
+                        'pre_submit': pre_submit_report}}
+
+            # Files we've uploaded before are referred to by the
+            # identifier the API gave us rather than sent again.
+            file_hashes = {}
+            file_quotes = {}
+            if self.file_index is not None and \
+                    'jobs' in post_data.get('jobs', {}):
+                file_hashes, file_quotes = \
+                    self._file_index_prepare(api_call, post_data)
+                if file_quotes and not post_data['jobs']['jobs']:
+                    return {'opstat': 'ok', 'response': {
+                        'jobs': file_quotes}}
+
+            # In idempotency mode, jobs that were ordered before are
+            # answered from the index instead of being ordered again.
+            idempotent = self.idempotency is not None and \
+                api_call in SUBMIT_CALLS
+            if idempotent:
+                already_ordered, replay = \
+                    self._idempotent_prepare(post_data)
+                if replay is not None:
+                    if collapsed:
+                        replay['response']['collapsed'] = collapsed
+                    return replay
+
             # Set up a true base URL, abstracting away the need to care
             # about the sandbox mode or API versioning at this stage.
             base_url = self.api_url % {'version':
@@ -241,25 +524,70 @@ class Gengo(object):
 
             # If any further APIs require their own special signing needs,
             # fork here...
-            response = self.signAndRequestAPILatest(fn, base, query_params,
-                                                    post_data, file_data)
+            try:
+                response = self._send(fn, base, query_params, post_data,
+                                      file_data, timeout)
+            except Exception:
+                # No answer: the jobs stay marked as unanswered, to be
+                # verified by whoever submits them next.
+                if idempotent:
+                    self.idempotency.release(_submitted_fingerprints(
+                        post_data))
+                raise
             results = response.json
 
             # See if we got any errors back that we can cleanly raise on
             if 'opstat' in results and results['opstat'] != 'ok':
+                if idempotent:
+                    self.idempotency.forget(_submitted_fingerprints(
+                        post_data))
                 # In cases of multiple errors, the keys for results['err']
-                # will be the job IDs.
-                if not 'msg' and 'code' in results['err']:
+                # will be the job keys (or IDs). Hand back everything we
+                # know per job, so callers only resubmit what failed.
+                job_errors = expand_results(_job_errors(results['err']),
+                                            collapsed)
+                if job_errors:
                     concatted_msg = ''
-                    for job_key, msg_code_list in results['err'].iteritems():
+                    for job_key in sorted(job_errors):
                         concatted_msg += '<%s: %s> ' % \
-                            (job_key, msg_code_list[0]['msg'])
-                    raise GengoError(concatted_msg,
-                                     results['err'].itervalues().
-                                     next()[0]['code'])
+                            (job_key, job_errors[job_key][0].get('msg'))
+                    raise GengoJobsError(
+                        concatted_msg.strip(),
+                        job_errors[sorted(job_errors)[0]][0].get('code'),
+                        errors=job_errors, response=results.get('response'),
+                        submitted=submitted)
                 raise GengoError(results['err']['msg'],
                                  results['err']['code'])
 
+            if idempotent:
+                self._idempotent_record(post_data, results, already_ordered)
+            if file_hashes or file_quotes:
+                self._file_index_record(post_data, results, file_hashes,
+                                        file_quotes)
+            if pre_submit_report is not None:
+                results.setdefault('response', {})['pre_submit'] = \
+                    pre_submit_report
+            if collapsed:
+                response = results.setdefault('response', {})
+                if isinstance(response.get('jobs'), dict):
+                    response['jobs'] = expand_results(response['jobs'],
+                                                      collapsed)
+                response['collapsed'] = collapsed
+
+            # Keep the job cache honest: reads get stored, anything that
+            # changes a job throws away what we knew about it.
+            if cacheable:
+                self.job_cache.put(api_call, job_id, results)
+            elif self.job_cache is not None and 'job_ids' in post_data:
+                for entry in post_data['job_ids']:
+                    if isinstance(entry, dict):
+                        entry = entry.get('job_id')
+                    self.job_cache.invalidate(entry)
+            elif self.job_cache is not None and job_id is not None and \
+                    fn['method'] != 'GET' and \
+                    fn['url'].startswith('/translate/job/{{id}}'):
+                self.job_cache.invalidate(job_id)
+
             # If not, return the results
             return results
 
@@ -268,8 +596,168 @@ class Gengo(object):
         else:
             raise AttributeError
 
+    def _idempotent_prepare(self, post_data):
+        """
+        Runs the jobs in post_data through the idempotency index, leaving
+        only the ones that still need ordering. Returns (already_ordered,
+        replay); replay is a complete result when there is nothing left to
+        send at all.
+        """
+        if 'job' in post_data:
+            to_send, known = self.idempotency.prepare(
+                self, {'job': post_data['job']['job']})
+            _raise_if_in_flight(to_send, known)
+            if known:
+                return known, {'opstat': 'ok', 'response': {
+                    'job': known['job'], 'already_ordered': known}}
+            post_data['job']['job'] = to_send['job']
+            return known, None
+        payload = dict(post_data['jobs'])
+        to_send, known = self.idempotency.prepare(self, payload['jobs'])
+        _raise_if_in_flight(to_send, known)
+        if not to_send:
+            return known, {'opstat': 'ok', 'response': {
+                'order_id': None, 'job_count': 0, 'already_ordered': known}}
+        payload['jobs'] = to_send
+        post_data['jobs'] = payload
+        return known, None
+
+    def _idempotent_record(self, post_data, results, already_ordered):
+        """
+        Remembers what a successful submission created.
+        """
+        response = results.get('response', {})
+        if 'job' in post_data:
+            job = response.get('job', {})
+            self.idempotency.record(
+                read_fingerprint(post_data['job']['job']['custom_data']),
+                job.get('job_id'), job.get('order_id'))
+        else:
+            for fp in _submitted_fingerprints(post_data):
+                self.idempotency.record(fp, None, response.get('order_id'))
+        if already_ordered:
+            response['already_ordered'] = already_ordered
+
+    def _file_index_prepare(self, api_call, post_data):
+        """
+        Looks the file jobs in post_data up in the file index. Quotes we
+        already have are taken out of the payload; orders get the file's
+        identifier in place of its file_path. Returns (hashes, quotes):
+        the hash of every file still to be uploaded, and the known quotes.
+        """
+        payload = dict(post_data['jobs'])
+        jobs = dict(payload['jobs'])
+        hashes = {}
+        quotes = {}
+        for key, job in jobs.items():
+            if job.get('type') != 'file' or not job.get('file_path'):
+                continue
+            digest = analyze_file(job['file_path'])['sha1']
+            if api_call == 'determineTranslationCost':
+                cached = self.file_index.lookup(digest, job)
+                if cached is not None:
+                    quotes[key] = cached
+                    del jobs[key]
+                else:
+                    # The upload below rewrites the job; keep the
+                    # caller's copy intact.
+                    jobs[key] = dict(job)
+                    hashes[key] = digest
+                continue
+            identifier = self.file_index.identifier(digest)
+            if identifier is None:
+                raise GengoError('%s has to be quoted before it can be '
+                                 'ordered' % job['file_path'])
+            job = dict(job)
+            del job['file_path']
+            job['identifier'] = identifier
+            jobs[key] = job
+        payload['jobs'] = jobs
+        post_data['jobs'] = payload
+        return hashes, quotes
+
+    def _file_index_record(self, post_data, results, hashes, quotes):
+        """
+        Remembers the identifiers of freshly uploaded files, and merges
+        the quotes we had into the response.
+        """
+        response = results.setdefault('response', {})
+        if not isinstance(response.get('jobs'), dict):
+            return
+        jobs = post_data['jobs']['jobs']
+        for key, digest in hashes.items():
+            if isinstance(response['jobs'].get(key), dict):
+                self.file_index.record(digest, jobs[key],
+                                       response['jobs'][key])
+        response['jobs'].update(quotes)
+
+    def _send(self, fn, base, query_params, post_data, file_data,
+              timeout=None):
+        """
+        Hands a fully built call over to signAndRequestAPILatest().
+
+        GET requests are idempotent, which lets us do a couple of things
+        we'd never dare with a POST: hedge slow requests with a duplicate,
+        and let identical concurrent calls share one request. The latter
+        keys them by URL plus the (sorted) parameters - minus the
+        timestamp, which differs from call to call.
+        """
+        idempotent = fn['method'] == 'GET'
+
+        def request():
+            # Every attempt signs its own copy of the parameters, and
+            # takes its own token and concurrency slot.
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            if self.limiter is not None:
+                return self.limiter.call(
+                    (fn['method'], fn['url']), self.signAndRequestAPILatest,
+                    fn, base, dict(query_params), post_data, file_data,
+                    timeout=timeout)
+            return self.signAndRequestAPILatest(fn, base,
+                                                dict(query_params),
+                                                post_data, file_data,
+                                                timeout=timeout)
+
+        def hedged():
+            return self.hedger.run(request)
+
+        send = request
+        if idempotent and self.hedger is not None:
+            send = hedged
+        if self.breaker is not None:
+            send = self._guard(fn.get('group', 'default'), send)
+        if idempotent and self.singleflight is not None:
+            key = (base, tuple(sorted([(k, v) for k, v
+                                       in query_params.items()
+                                       if k != 'ts'])))
+            return self.singleflight.do(key, send)
+        return send()
+
+    def _guard(self, group, send):
+        """
+        Wraps send() with the circuit breaker for an endpoint group.
+        Network errors and 5xx responses count against the group; API
+        level errors (bad job data, auth) don't, since the API answered
+        just fine.
+        """
+        def guarded():
+            if not self.breaker.allow(group):
+                raise GengoCircuitOpenError(
+                    'Circuit open for %s endpoints' % group, group,
+                    self.breaker.retry_after(group))
+            start = time()
+            ok = False
+            try:
+                response = send()
+                ok = getattr(response, 'status_code', 200) < 500
+            finally:
+                self.breaker.record(group, ok, time() - start)
+            return response
+        return guarded
+
     def signAndRequestAPILatest(self, fn, base, query_params, post_data={},
-                                file_data=False):
+                                file_data=False, timeout=None):
         """
         This method signs the request with just the timestamp and
         private key, which is what api v1.1 and 2 rely on.
@@ -279,6 +767,7 @@ class Gengo(object):
         query_params - Dictionary of data eventually getting sent over
         to Gengo.
         post_data - Any extra special post data to get sent over.
+        timeout - passed straight on to requests; None waits forever.
         """
         # Encoding jobs becomes a bit different than any other method call,
         # so we catch them and do a little
@@ -286,17 +775,30 @@ class Gengo(object):
         # sense of portability between the various
         # job-posting methods in that they can all safely rely on passing
         # dictionaries around. Huzzah!
-        req_method = requests.__getattribute__(lower(fn['method']))
+        req_method = getattr(self.session, lower(fn['method']))
         if fn['method'] == 'POST' or fn['method'] == 'PUT':
+            stream = False
             if 'job' in post_data:
                 query_params['data'] = json.dumps(post_data['job'],
                                                   separators=(',', ':'))
+            elif 'jobs' in post_data and self.stream_body and \
+                    not file_data:
+                stream = True
             elif 'jobs' in post_data:
                 query_params['data'] = json.dumps(post_data['jobs'],
                                                   separators=(',', ':'))
             elif 'comment' in post_data:
                 query_params['data'] = json.dumps(post_data['comment'],
                                                   separators=(',', ':'))
+            elif 'job_ids' in post_data:
+                # Bulk updates: the action (a name, or a dictionary with
+                # extra fields) and the jobs it applies to go together.
+                action = post_data.get('action')
+                if not isinstance(action, dict):
+                    action = {'action': action}
+                query_params['data'] = json.dumps(
+                    dict(action, job_ids=post_data['job_ids']),
+                    separators=(',', ':'))
             elif 'action' in post_data:
                 query_params['data'] = json.dumps(post_data['action'],
                                                   separators=(',', ':'))
@@ -309,15 +811,27 @@ class Gengo(object):
             if self.debug is True:
                 print query_params
 
-            if not file_data:
+            if stream:
+                headers = dict(self.headers)
+                headers['Content-Type'] = \
+                    'application/x-www-form-urlencoded'
+                return req_method(base,
+                                  headers=headers,
+                                  data=StreamingFormBody(query_params,
+                                                         'data',
+                                                         post_data['jobs']),
+                                  timeout=timeout)
+            elif not file_data:
                 return req_method(base,
                                   headers=self.headers,
-                                  data=query_params)
+                                  data=query_params,
+                                  timeout=timeout)
             else:
                 return req_method(base,
                                   headers=self.headers,
                                   files=file_data,
-                                  data=query_params)
+                                  data=query_params,
+                                  timeout=timeout)
         else:
             query_string = urlencode(sorted(query_params.items(),
                                             key=itemgetter(0)))
@@ -331,7 +845,8 @@ class Gengo(object):
             if self.debug is True:
                 print base + '?%s' % query_string
             return req_method(base + '?%s' % query_string,
-                              headers=self.headers)
+                              headers=self.headers,
+                              timeout=timeout)
 
     @staticmethod
     def unicode2utf8(text):
@@ -0,0 +1,304 @@
+# All code provided from the http://gengo.com site, such as API example code
+# and libraries, is provided under the New BSD license unless otherwise
+# noted. Details are below.
+#
+# New BSD License
+# Copyright (c) 2009-2012, myGengo, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# Neither the name of myGengo, Inc. nor the names of its contributors may
+# be used to endorse or promote products derived from this software
+# without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A local glossary cache and term index.
+
+GlossaryManager keeps the glossaries of an account in memory, checking
+getGlossaryList now and then and dropping any glossary whose list entry
+changed. For matching, the terms of every glossary with the same source
+language go into one Aho-Corasick automaton (TermIndex), so finding all
+terms in a batch of strings costs time linear in the length of the text,
+however many terms and glossaries there are. That makes it cheap to pick
+a glossary_id for each job before submitting.
+"""
+
+import threading
+
+from hashlib import sha1
+from time import time
+
+from units import is_character_language
+
+try:
+    import json
+    json  # silence pyflakes
+except ImportError:
+    import simplejson as json
+
+
+def _text(value):
+    if isinstance(value, str):
+        return value.decode('utf-8', 'replace')
+    return value or u''
+
+
+class TermIndex(object):
+    """
+    TermIndex(terms, whole_words = True)
+
+    An Aho-Corasick automaton over terms: (term, value) pairs. Matching
+    ignores case; with whole_words, a match must not be part of a longer
+    word (turn it off for ja/zh/ko, which don't separate words).
+    """
+    def __init__(self, terms, whole_words=True):
+        self.whole_words = whole_words
+        # Node 0 is the root; per node: transitions, failure link and
+        # the (length, term, value) entries that end there.
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for term, value in terms:
+            term = _text(term).strip()
+            if term:
+                self._add(term, value)
+        self._link()
+
+    def _add(self, term, value):
+        node = 0
+        for char in term.lower():
+            child = self.goto[node].get(char)
+            if child is None:
+                child = len(self.goto)
+                self.goto[node][char] = child
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+            node = child
+        self.out[node].append((len(term), term, value))
+
+    def _link(self):
+        # Breadth first, so every failure link points at a node that is
+        # already finished.
+        queue = self.goto[0].values()
+        while queue:
+            next_queue = []
+            for node in queue:
+                for char, child in self.goto[node].iteritems():
+                    fail = self.fail[node]
+                    while fail and char not in self.goto[fail]:
+                        fail = self.fail[fail]
+                    target = self.goto[fail].get(char, 0)
+                    self.fail[child] = target if target != child else 0
+                    self.out[child] = self.out[child] + \
+                        self.out[self.fail[child]]
+                    next_queue.append(child)
+            queue = next_queue
+
+    def __len__(self):
+        return len(self.goto) - 1
+
+    def find(self, text):
+        """
+        Every match in text as (start, end, term, value).
+        """
+        text = _text(text)
+        lowered = text.lower()
+        goto = self.goto
+        fail = self.fail
+        out = self.out
+        matches = []
+        node = 0
+        for i, char in enumerate(lowered):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for length, term, value in out[node]:
+                start = i + 1 - length
+                if self.whole_words and not (
+                        (start == 0 or not lowered[start - 1].isalnum()) and
+                        (i + 1 == len(lowered) or
+                         not lowered[i + 1].isalnum())):
+                    continue
+                matches.append((start, i + 1, term, value))
+        return matches
+
+
+def _target_languages(entry):
+    """
+    The target language codes of a getGlossaryList entry, which may come
+    as codes, [id, code] pairs or dictionaries.
+    """
+    codes = set()
+    for target in entry.get('target_languages') or []:
+        if isinstance(target, (list, tuple)) and target:
+            target = target[-1]
+        elif isinstance(target, dict):
+            target = target.get('lc') or target.get('language_code')
+        if target:
+            codes.add(target)
+    return codes
+
+
+def _terms(glossary, lc_src):
+    """
+    Source terms from a getGlossary response. Terms may be plain strings,
+    or dictionaries holding the source term under 'source', 'term', 'src'
+    or the source language code.
+    """
+    if isinstance(glossary.get('glossary'), dict):
+        glossary = glossary['glossary']
+    terms = []
+    for entry in glossary.get('terms') or glossary.get('entries') or []:
+        if isinstance(entry, dict):
+            for field in ('source', 'term', 'src', lc_src):
+                if isinstance(entry.get(field), basestring):
+                    terms.append((entry[field], entry))
+                    break
+        elif isinstance(entry, basestring):
+            terms.append((entry, {'source': entry}))
+    return terms
+
+
+class GlossaryManager(object):
+    """
+    GlossaryManager(list_max_age = 300)
+
+    list_max_age - seconds between checks of getGlossaryList. A glossary
+    whose list entry changed (say its unit_count) is fetched again the
+    next time it's needed.
+    """
+    def __init__(self, list_max_age=300):
+        self.list_max_age = list_max_age
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.signatures = {}
+        self.glossaries = {}
+        self.indexes = {}
+        self.listed_at = None
+
+    def refresh(self, gengo, deadline=None):
+        """
+        Reloads the glossary list, forgetting glossaries that changed or
+        went away.
+        """
+        listing = gengo.getGlossaryList(deadline=deadline)
+        entries = {}
+        for entry in listing.get('response') or []:
+            if isinstance(entry, dict) and entry.get('id') is not None:
+                entries[entry['id']] = entry
+        with self.lock:
+            signatures = dict([
+                (i, sha1(json.dumps(e, sort_keys=True)).hexdigest())
+                for i, e in entries.items()])
+            stale = [i for i in self.glossaries
+                     if self.signatures.get(i) != signatures.get(i)]
+            for glossary_id in stale:
+                del self.glossaries[glossary_id]
+            if stale or set(entries) != set(self.entries):
+                self.indexes = {}
+            self.entries = entries
+            self.signatures = signatures
+            self.listed_at = time()
+
+    def ensure(self, gengo, deadline=None):
+        listed_at = self.listed_at
+        if listed_at is None or time() - listed_at > self.list_max_age:
+            self.refresh(gengo, deadline)
+
+    def glossary(self, gengo, glossary_id, deadline=None):
+        """
+        The getGlossary response for a glossary, from the cache if it
+        hasn't changed.
+        """
+        with self.lock:
+            cached = self.glossaries.get(glossary_id)
+        if cached is None:
+            cached = gengo.getGlossary(id=glossary_id,
+                                       deadline=deadline).get('response')
+            with self.lock:
+                self.glossaries[glossary_id] = cached or {}
+        return cached
+
+    def index(self, gengo, lc_src, deadline=None):
+        """
+        The TermIndex over every glossary with source language lc_src.
+        Match values are (glossary_id, term entry).
+        """
+        self.ensure(gengo, deadline)
+        with self.lock:
+            index = self.indexes.get(lc_src)
+            entries = self.entries.values()
+        if index is not None:
+            return index
+        terms = []
+        for entry in entries:
+            if entry.get('source_language_code') != lc_src:
+                continue
+            glossary = self.glossary(gengo, entry['id'], deadline) or {}
+            terms.extend([(term, (entry['id'], value))
+                          for term, value in _terms(glossary, lc_src)])
+        index = TermIndex(terms,
+                          whole_words=not is_character_language(lc_src))
+        with self.lock:
+            self.indexes[lc_src] = index
+        return index
+
+    def match_jobs(self, gengo, jobs, deadline=None):
+        """
+        Takes {key: job} and returns {key: {glossary_id: [terms]}} for
+        the jobs whose body_src contains glossary terms. Only glossaries
+        covering the job's lc_tgt count.
+        """
+        matches = {}
+        for key, job in jobs.items():
+            if not job.get('body_src'):
+                continue
+            index = self.index(gengo, job.get('lc_src'), deadline)
+            if not len(index):
+                continue
+            found = {}
+            for start, end, term, (glossary_id, value) in \
+                    index.find(job['body_src']):
+                entry = self.entries.get(glossary_id, {})
+                if job.get('lc_tgt') in _target_languages(entry):
+                    found.setdefault(glossary_id, set()).add(term)
+            if found:
+                matches[key] = dict([(g, sorted(t))
+                                     for g, t in found.items()])
+        return matches
+
+    def assign_glossaries(self, gengo, jobs, deadline=None):
+        """
+        Returns copies of jobs with glossary_id set to the glossary that
+        matches the most distinct terms in each job's body_src. Jobs that
+        already have a glossary_id, or match nothing, are left alone.
+        """
+        matches = self.match_jobs(gengo, dict(
+            [(k, j) for k, j in jobs.items() if not j.get('glossary_id')]),
+            deadline)
+        assigned = dict(jobs)
+        for key, found in matches.items():
+            best = sorted(found, key=lambda g: (-len(found[g]), g))[0]
+            assigned[key] = dict(jobs[key], glossary_id=best)
+        return assigned
@@ -0,0 +1,196 @@
+# All code provided from the http://gengo.com site, such as API example code
+# and libraries, is provided under the New BSD license unless otherwise
+# noted. Details are below.
+#
+# New BSD License
+# Copyright (c) 2009-2012, myGengo, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# Neither the name of myGengo, Inc. nor the names of its contributors may
+# be used to endorse or promote products derived from this software
+# without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Hedged requests for idempotent Gengo API calls.
+
+Most slow calls are slow because of one unlucky connection, not because the
+API is slow. If a GET hasn't come back within (roughly) the latency that
+covers most of our recent requests, we fire off an identical request and
+take whichever answer arrives first. A budget caps how many hedges we send,
+so an outage where *everything* is slow doesn't double our load.
+"""
+
+import sys
+import threading
+
+from collections import deque
+from time import time
+from Queue import Queue, Empty
+
+
+class Hedger(object):
+    """
+    Hedger(percentile = 95, min_delay = 0.05, max_delay = 2.0,
+    budget = 0.1, burst = 10, window = 500, warmup = 20)
+
+    percentile - a hedge is sent once a request has been outstanding for
+    longer than this percentile of recent latencies.
+    min_delay, max_delay - bounds (seconds) for that delay. max_delay is
+    also used until warmup samples have been collected.
+    budget - hedges we may send per request, on average (0.1 = 10%).
+    burst - how many unused hedges may be saved up.
+    window - how many recent latencies to remember.
+
+    Metrics: requests, hedged, hedge_won, suppressed (hedges we wanted to
+    send but the budget said no).
+    """
+    def __init__(self, percentile=95, min_delay=0.05, max_delay=2.0,
+                 budget=0.1, burst=10, window=500, warmup=20):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.burst = burst
+        self.warmup = warmup
+        self.latencies = deque(maxlen=window)
+        self.tokens = float(burst)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_won = 0
+        self.suppressed = 0
+
+    def delay(self):
+        """
+        How long to wait for the first response before hedging.
+        """
+        with self.lock:
+            if len(self.latencies) < self.warmup:
+                return self.max_delay
+            ordered = sorted(self.latencies)
+        index = int(len(ordered) * self.percentile / 100.0)
+        delay = ordered[min(index, len(ordered) - 1)]
+        return min(max(delay, self.min_delay), self.max_delay)
+
+    def run(self, request):
+        """
+        Calls request() and, if it is slow, a second request(); returns the
+        first successful response. If both fail, the first error is
+        re-raised.
+
+        A losing request can't be interrupted mid-flight with requests, so
+        it is left to finish on its daemon thread and its response is
+        closed straight away.
+        """
+        with self.lock:
+            self.requests += 1
+            self.tokens = min(self.burst, self.tokens + self.budget)
+        outcomes = Queue()
+        state = {'decided': False}
+        state_lock = threading.Lock()
+
+        def attempt(name):
+            start = time()
+            try:
+                response = request()
+            except:
+                outcomes.put((name, None, sys.exc_info()))
+                return
+            with self.lock:
+                self.latencies.append(time() - start)
+            with state_lock:
+                if not state['decided']:
+                    outcomes.put((name, response, None))
+                    return
+            self._discard(response)
+
+        self._spawn(attempt, 'primary')
+        attempts = 1
+        try:
+            outcome = outcomes.get(timeout=self.delay())
+        except Empty:
+            outcome = None
+            if self._take_token():
+                self._spawn(attempt, 'hedge')
+                attempts = 2
+
+        errors = []
+        while True:
+            if outcome is None:
+                outcome = outcomes.get()
+            name, response, exc_info = outcome
+            outcome = None
+            if exc_info is None:
+                # The other attempt may have finished in the meantime;
+                # anything arriving after this is closed by attempt().
+                with state_lock:
+                    state['decided'] = True
+                    self._drain(outcomes)
+                if name == 'hedge':
+                    with self.lock:
+                        self.hedge_won += 1
+                return response
+            errors.append(exc_info)
+            if len(errors) == attempts:
+                raise errors[0][0], errors[0][1], errors[0][2]
+
+    def stats(self):
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'hedged': self.hedged,
+                'hedge_won': self.hedge_won,
+                'suppressed': self.suppressed,
+            }
+
+    def _take_token(self):
+        with self.lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.hedged += 1
+                return True
+            self.suppressed += 1
+            return False
+
+    def _spawn(self, attempt, name):
+        t = threading.Thread(target=attempt, args=(name,))
+        t.daemon = True
+        t.start()
+
+    def _drain(self, outcomes):
+        while True:
+            try:
+                name, response, exc_info = outcomes.get_nowait()
+            except Empty:
+                return
+            if response is not None:
+                self._discard(response)
+
+    def _discard(self, response):
+        close = getattr(response, 'close', None)
+        if close is not None:
+            try:
+                close()
+            except Exception:
+                pass
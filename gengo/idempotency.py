@@ -0,0 +1,241 @@
+# All code provided from the http://gengo.com site, such as API example code
+# and libraries, is provided under the New BSD license unless otherwise
+# noted. Details are below.
+#
+# New BSD License
+# Copyright (c) 2009-2012, myGengo, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# Neither the name of myGengo, Inc. nor the names of its contributors may
+# be used to endorse or promote products derived from this software
+# without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Idempotent job submission.
+
+Retrying a postTranslationJob(s) call that timed out is dangerous: the
+first attempt may well have gone through, and a second one orders (and
+pays for) the same work again. In idempotency mode every job is
+fingerprinted (body_src, lc_src, lc_tgt, tier, slug), the fingerprint is
+embedded in the job's custom_data, and a local index remembers which
+fingerprints were already ordered. Resubmissions are answered from the
+index; jobs whose earlier attempt never got an answer are looked up on
+the API (by the fingerprint in custom_data) before anything is reordered.
+"""
+
+import sqlite3
+import threading
+
+from time import time
+
+from jobs import fetch_recent_jobs, job_fingerprint
+
+# custom_data is limited to 1kb; the marker takes 50 bytes of it.
+FINGERPRINT_PREFIX = 'gengo-fp:'
+
+SUBMIT_CALLS = ('postTranslationJob', 'postTranslationJobs')
+
+
+def tag_custom_data(job, fingerprint):
+    """
+    Returns a copy of job with the fingerprint marker at the front of its
+    custom_data (separated from any existing value by a ';').
+    """
+    job = dict(job)
+    marker = FINGERPRINT_PREFIX + fingerprint
+    custom_data = job.get('custom_data')
+    if custom_data and not custom_data.startswith(FINGERPRINT_PREFIX):
+        marker = '%s;%s' % (marker, custom_data)
+    elif custom_data:
+        marker = custom_data
+    job['custom_data'] = marker
+    return job
+
+
+def read_fingerprint(custom_data):
+    """
+    The fingerprint embedded in a custom_data value, or None.
+    """
+    if not custom_data or not custom_data.startswith(FINGERPRINT_PREFIX):
+        return None
+    return custom_data[len(FINGERPRINT_PREFIX):].split(';', 1)[0]
+
+
+class IdempotencyIndex(object):
+    """
+    IdempotencyIndex(path = ':memory:', verify_window = 3600)
+
+    path - SQLite file holding fingerprint -> job_id/order_id. Use a real
+    file so the index survives restarts.
+    verify_window - how far back (seconds) to look on the API for jobs
+    whose submission never got an answer.
+
+    Pass it to Gengo(idempotency=...) to switch idempotency mode on.
+    """
+    def __init__(self, path=':memory:', verify_window=3600):
+        self.verify_window = verify_window
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS fingerprints ('
+                          'fp TEXT PRIMARY KEY, job_id INTEGER, '
+                          'order_id INTEGER, submitted REAL)')
+        self.conn.commit()
+        self.replayed = 0
+        # Fingerprints a submission in this process is working on.
+        self.in_flight = set()
+
+    def lookup(self, fingerprint):
+        """
+        (job_id, order_id, submitted) for a fingerprint, or None. A row
+        with neither id is a submission still waiting for its answer.
+        """
+        with self.lock:
+            return self.conn.execute(
+                'SELECT job_id, order_id, submitted FROM fingerprints '
+                'WHERE fp = ?', (fingerprint,)).fetchone()
+
+    def record(self, fingerprint, job_id=None, order_id=None):
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?)',
+                (fingerprint, job_id, order_id, time()))
+            self.conn.commit()
+            if job_id is not None or order_id is not None:
+                self.in_flight.discard(fingerprint)
+
+    def release(self, fingerprints):
+        """
+        Ends this process' hold on fingerprints whose submission never got
+        an answer; they stay marked as unanswered.
+        """
+        with self.lock:
+            self.in_flight.difference_update(fingerprints)
+
+    def forget(self, fingerprints):
+        """
+        Drops in-flight marks, e.g. after the API turned a submission down.
+        """
+        with self.lock:
+            self.conn.executemany(
+                'DELETE FROM fingerprints WHERE fp = ? AND job_id IS NULL '
+                'AND order_id IS NULL', [(fp,) for fp in fingerprints])
+            self.conn.commit()
+            self.in_flight.difference_update(fingerprints)
+
+    def prepare(self, gengo, jobs):
+        """
+        Takes {key: job}, and returns (to_send, known): the tagged jobs
+        that still need ordering and {key: {'job_id', 'order_id'}} for
+        those that were ordered before. Fingerprints still waiting for an
+        answer are checked against the API first.
+
+        Checking a fingerprint and marking it as in flight is one step, so
+        of two concurrent submissions of the same job only one sends it;
+        the other lists it as known with 'in_flight': True. If checking on
+        the API fails, the claims are dropped before the error is raised.
+        """
+        fingerprints = dict([(k, job_fingerprint(j))
+                             for k, j in jobs.items()])
+        known = {}
+        claimed = set()
+        fresh = set()
+        unanswered = {}
+        with self.lock:
+            now = time()
+            for key, fp in fingerprints.items():
+                if fp in self.in_flight:
+                    known[key] = {'job_id': None, 'order_id': None,
+                                  'in_flight': True}
+                    continue
+                inserted = self.conn.execute(
+                    'INSERT OR IGNORE INTO fingerprints VALUES '
+                    '(?, NULL, NULL, ?)', (fp, now)).rowcount
+                if inserted:
+                    fresh.add(fp)
+                else:
+                    row = self.conn.execute(
+                        'SELECT job_id, order_id, submitted FROM '
+                        'fingerprints WHERE fp = ?', (fp,)).fetchone()
+                    if row[0] is not None or row[1] is not None:
+                        known[key] = {'job_id': row[0], 'order_id': row[1]}
+                        continue
+                    unanswered[key] = (fp, row[2])
+                self.in_flight.add(fp)
+                claimed.add(key)
+            self.conn.commit()
+        if unanswered:
+            since = min([ts for fp, ts in unanswered.values()])
+            try:
+                found = self._verify(gengo, max(since - 60,
+                                                time() - self.verify_window))
+            except Exception:
+                # Nothing was sent: give up the claims, and the marks of
+                # jobs that were never submitted before.
+                self.forget(fresh)
+                self.release([fingerprints[k] for k in claimed])
+                raise
+            for key, (fp, ts) in unanswered.items():
+                if fp in found:
+                    known[key] = found[fp]
+                    claimed.discard(key)
+                    self.record(fp, **found[fp])
+                else:
+                    self.record(fp)
+        self.replayed += len(known)
+        to_send = dict([(key, tag_custom_data(jobs[key], fingerprints[key]))
+                        for key in claimed])
+        return to_send, known
+
+    def resolve(self, gengo, order_id, deadline=None):
+        """
+        Fills in job IDs for an order we only know the order_id of, using
+        getTranslationOrderJobs and the fingerprints in custom_data.
+        Returns {fingerprint: job_id}.
+        """
+        order = gengo.getTranslationOrderJobs(id=order_id,
+                                              deadline=deadline)
+        order = order['response']['order']
+        job_ids = []
+        for k, v in order.items():
+            if k.startswith('jobs_') and isinstance(v, list):
+                job_ids.extend([str(i) for i in v])
+        resolved = {}
+        for i in range(0, len(job_ids), 50):
+            batch = gengo.getTranslationJobBatch(
+                id=','.join(job_ids[i:i + 50]), deadline=deadline)
+            for job in batch['response'].get('jobs', []):
+                fp = read_fingerprint(job.get('custom_data'))
+                if fp is not None:
+                    self.record(fp, job['job_id'], order_id)
+                    resolved[fp] = job['job_id']
+        return resolved
+
+    def _verify(self, gengo, since):
+        found = {}
+        for job in fetch_recent_jobs(gengo, since):
+            fp = read_fingerprint(job.get('custom_data'))
+            if fp is not None:
+                found[fp] = {'job_id': job['job_id'],
+                             'order_id': job.get('order_id')}
+        return found
@@ -0,0 +1,197 @@
+# All code provided from the http://gengo.com site, such as API example code
+# and libraries, is provided under the New BSD license unless otherwise
+# noted. Details are below.
+#
+# New BSD License
+# Copyright (c) 2009-2012, myGengo, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# Neither the name of myGengo, Inc. nor the names of its contributors may
+# be used to endorse or promote products derived from this software
+# without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Helpers for working with job payloads - the dictionaries that go into
+postTranslationJobs, determineTranslationCost and friends - and with jobs
+read back from the API.
+"""
+
+from hashlib import sha1
+
+from units import count_units_batch
+
+try:
+    import json
+    json  # silence pyflakes
+except ImportError:
+    import simplejson as json
+
+# The fields that decide what a job actually is (and what it costs).
+FINGERPRINT_FIELDS = ('body_src', 'lc_src', 'lc_tgt', 'tier', 'slug')
+
+
+def _utf8(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+def job_fingerprint(job, fields=FINGERPRINT_FIELDS):
+    """
+    A stable hex digest identifying a job by the given fields. Works the
+    same for jobs we built (str or unicode) and jobs read back from the
+    API (unicode), so the two can be matched up.
+    """
+    h = sha1()
+    for field in fields:
+        value = job.get(field)
+        if value is None:
+            value = ''
+        elif not isinstance(value, basestring):
+            value = str(value)
+        h.update(_utf8(value))
+        h.update('\0')
+    return h.hexdigest()
+
+
+# Jobs that agree on all of these are the same piece of work.
+DEDUPE_FIELDS = ('body_src', 'lc_src', 'lc_tgt', 'tier', 'glossary_id')
+
+
+def collapse_duplicates(jobs, fields=DEDUPE_FIELDS):
+    """
+    Collapses text jobs that are identical in `fields` into one. Returns
+    (unique, groups): the jobs to actually send, keyed by the first key
+    (in sorted order) of each group, and {kept_key: [all keys]} for the
+    groups that had duplicates. Jobs without a body_src (file jobs) are
+    never collapsed.
+    """
+    unique = {}
+    groups = {}
+    seen = {}
+    for key in sorted(jobs):
+        job = jobs[key]
+        if job.get('body_src') is None:
+            unique[key] = job
+            continue
+        fp = job_fingerprint(job, fields)
+        kept = seen.get(fp)
+        if kept is None:
+            seen[fp] = key
+            unique[key] = job
+        else:
+            groups.setdefault(kept, [kept]).append(key)
+    return unique, groups
+
+
+def expand_results(results, groups):
+    """
+    Fans per-job results keyed by kept key (quotes, job IDs, later on
+    translations) back out to every key of its group.
+    """
+    expanded = dict(results)
+    for kept, keys in groups.items():
+        if kept in results:
+            for key in keys:
+                value = results[kept]
+                if isinstance(value, dict):
+                    value = dict(value)
+                expanded[key] = value
+    return expanded
+
+
+def payload_hash(jobs):
+    """
+    A digest of a whole jobs dictionary, independent of key order.
+    """
+    return sha1(json.dumps(jobs, sort_keys=True,
+                           separators=(',', ':'))).hexdigest()
+
+
+def chunk_jobs(jobs, size):
+    """
+    Splits a jobs dictionary into a list of smaller dictionaries of at
+    most `size` jobs each. Keys are taken in sorted order, so the same
+    input always produces the same chunks.
+    """
+    keys = sorted(jobs)
+    return [dict([(k, jobs[k]) for k in keys[i:i + size]])
+            for i in range(0, len(keys), size)]
+
+
+def chunk_jobs_by_units(jobs, max_units, max_jobs=None):
+    """
+    Like chunk_jobs(), but each chunk holds at most max_units billable
+    units (and at most max_jobs jobs). A single job bigger than max_units
+    gets a chunk of its own. Units are counted in one batch per source
+    language.
+    """
+    keys = sorted(jobs)
+    units = dict([(k, 0) for k in keys])
+    by_language = {}
+    for key in keys:
+        if jobs[key].get('body_src'):
+            by_language.setdefault(jobs[key].get('lc_src'), []).append(key)
+    for lc_src, lang_keys in by_language.items():
+        counts = count_units_batch([jobs[k]['body_src'] for k in lang_keys],
+                                   lc_src)
+        units.update(zip(lang_keys, counts))
+    chunks = []
+    chunk = {}
+    total = 0
+    for key in keys:
+        full = max_jobs is not None and len(chunk) >= max_jobs
+        if chunk and (full or total + units[key] > max_units):
+            chunks.append(chunk)
+            chunk = {}
+            total = 0
+        chunk[key] = jobs[key]
+        total += units[key]
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def fetch_recent_jobs(gengo, since, count=200, deadline=None):
+    """
+    Full details of every job created after the unix timestamp `since`:
+    getTranslationJobs gives the IDs, and getTranslationJobBatch fetches
+    the jobs 50 at a time. `count` is the size of the first listing; as
+    long as a listing comes back full there may be more jobs, so it is
+    asked for again with twice the count.
+    """
+    while True:
+        listing = gengo.getTranslationJobs(timestamp_after=int(since),
+                                           count=count, deadline=deadline)
+        listing = listing.get('response', [])
+        if len(listing) < count:
+            break
+        count *= 2
+    job_ids = [str(j['job_id']) for j in listing]
+    jobs = []
+    for i in range(0, len(job_ids), 50):
+        batch = gengo.getTranslationJobBatch(id=','.join(job_ids[i:i + 50]),
+                                             deadline=deadline)
+        jobs.extend(batch['response'].get('jobs', []))
+    return jobs
@@ -0,0 +1,296 @@
+# All code provided from the http://gengo.com site, such as API example code
+# and libraries, is provided under the New BSD license unless otherwise
+# noted. Details are below.
+#
+# New BSD License
+# Copyright (c) 2009-2012, myGengo, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# Neither the name of myGengo, Inc. nor the names of its contributors may
+# be used to endorse or promote products derived from this software
+# without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A write-ahead journal for bulk job submission.
+
+Pushing a large jobs dictionary through postTranslationJobs happens in
+chunks. Before a chunk is sent we append an "intent" record (its payload
+hash and the fingerprint of every job in it) to a local file; once the API
+answers we append a "done" record with the order it created. If the
+process dies in between, the next run finds the intent without a matching
+done record and asks the API which of those jobs actually landed before
+deciding what to resend. Every job sent carries a marker for its chunk in
+custom_data, so jobs are only ever matched to the chunk that sent them.
+
+The journal is plain JSON lines, appended and fsynced a group of records at
+a time rather than after every single write.
+"""
+
+import os
+
+from time import time
+
+from gengo import GengoError
+from jobs import chunk_jobs, chunk_jobs_by_units, fetch_recent_jobs, \
+    job_fingerprint, payload_hash
+
+try:
+    import json
+    json  # silence pyflakes
+except ImportError:
+    import simplejson as json
+
+# Put at the front of custom_data; 28 of its 1kb.
+CHUNK_PREFIX = 'gengo-chunk:'
+
+
+def chunk_marker(chunk_hash):
+    return CHUNK_PREFIX + chunk_hash[:16]
+
+
+def read_chunk_marker(custom_data):
+    """
+    The chunk marker in a custom_data value (possibly behind other
+    markers, such as idempotency's), or None.
+    """
+    for part in (custom_data or '').split(';'):
+        if part.startswith(CHUNK_PREFIX):
+            return part
+    return None
+
+
+class SubmissionJournal(object):
+    """
+    SubmissionJournal(path, group_size = 8)
+
+    path - the journal file; created if missing, appended to otherwise.
+    group_size - how many chunks are announced (and fsynced) together
+    before being sent.
+
+    landed - {job_key: {'order_id': ..., 'job_id': ...}} for every job we
+    know reached Gengo. job_id is only known for jobs found through
+    reconcile(); jobs confirmed by a normal response only have order_id.
+    """
+    def __init__(self, path, group_size=8):
+        self.path = path
+        self.group_size = group_size
+        self.landed = {}
+        self.pending = {}
+        complete = self._load()
+        self.f = open(path, 'ab')
+        if complete is not None and complete < self.f.tell():
+            # Drop the torn tail a crash left, or the next record would
+            # be glued onto it and lost along with it.
+            self.f.truncate(complete)
+            self._sync()
+
+    def submit(self, gengo, jobs, chunk_size=50, deadline=None,
+               max_units=None, **options):
+        """
+        Submits every job in `jobs` (a {key: job} dictionary) that hasn't
+        landed yet, chunk_size jobs per postTranslationJobs call. With
+        max_units, chunks are also kept to that many billable units (see
+        units.count_units_batch), so orders come out of similar size.
+        Extra keyword arguments (process, as_group, ...) go into every
+        chunk's payload. Returns the list of new 'done' records.
+
+        With a deadline, no new chunk is started once it has run out; the
+        remaining jobs are picked up by the next call.
+        """
+        if self.pending:
+            self.reconcile(gengo, deadline=deadline)
+        remaining = dict([(k, j) for k, j in jobs.items()
+                          if k not in self.landed])
+        if max_units is not None:
+            chunks = chunk_jobs_by_units(remaining, max_units, chunk_size)
+        else:
+            chunks = chunk_jobs(remaining, chunk_size)
+        done = []
+        for start in range(0, len(chunks), self.group_size):
+            if deadline is not None and deadline.expired():
+                break
+            group = chunks[start:start + self.group_size]
+            intents = []
+            for chunk in group:
+                intent = {
+                    'event': 'intent',
+                    'chunk': payload_hash(chunk),
+                    'ts': int(time()),
+                    'fingerprints': dict([(k, job_fingerprint(j))
+                                          for k, j in chunk.items()]),
+                }
+                self._write(intent)
+                intents.append(intent)
+            self._sync()
+            attempted = 0
+            try:
+                for chunk, intent in zip(group, intents):
+                    if deadline is not None and deadline.expired():
+                        break
+                    attempted += 1
+                    done.append(self._send(gengo, chunk, intent, deadline,
+                                           options))
+            finally:
+                # Chunks we announced but never got round to sending
+                # don't need reconciling.
+                for intent in intents[attempted:]:
+                    self._write({'event': 'skipped',
+                                 'chunk': intent['chunk']})
+                    del self.pending[intent['chunk']]
+                self._sync()
+            if len(done) < (start + len(group)):
+                break
+        return done
+
+    def reconcile(self, gengo, deadline=None, scan_limit=200):
+        """
+        Resolves chunks that were announced but never confirmed: lists
+        recent jobs with getTranslationJobs, fetches their details in
+        batches and matches them to the journal by chunk marker and
+        fingerprint. Each remote job is matched at most once, so keys with
+        identical content get distinct jobs. Jobs that are found are
+        recorded as landed; the rest will be resent.
+
+        scan_limit is the 'count' of the first getTranslationJobs listing;
+        it grows until every job since the oldest intent has been seen.
+        """
+        if not self.pending:
+            return
+        since = min([i['ts'] for i in self.pending.values()]) - 60
+        taken = set([v.get('job_id') for v in self.landed.values()])
+        remote = {}
+        for job in fetch_recent_jobs(gengo, since, scan_limit, deadline):
+            marker = read_chunk_marker(job.get('custom_data'))
+            if marker is not None and job['job_id'] not in taken:
+                remote.setdefault((marker, job_fingerprint(job)),
+                                  []).append(job)
+        for jobs in remote.values():
+            jobs.sort(key=lambda j: j['job_id'])
+        for chunk_hash, intent in sorted(self.pending.items(),
+                                         key=lambda p: p[1]['ts']):
+            marker = chunk_marker(chunk_hash)
+            found = {}
+            for key, fp in sorted(intent['fingerprints'].items()):
+                candidates = remote.get((marker, fp))
+                if candidates:
+                    job = candidates.pop(0)
+                    found[key] = {'job_id': job['job_id'],
+                                  'order_id': job.get('order_id')}
+            self._write({'event': 'reconciled', 'chunk': chunk_hash,
+                         'found': found})
+            self.landed.update(found)
+            del self.pending[chunk_hash]
+        self._sync()
+
+    def order_ids(self):
+        """
+        Every order created through this journal, for use with
+        getTranslationOrderJobs.
+        """
+        return sorted(set([v['order_id'] for v in self.landed.values()
+                           if v.get('order_id') is not None]))
+
+    def close(self):
+        self._sync()
+        self.f.close()
+
+    def _send(self, gengo, chunk, intent, deadline, options):
+        marker = chunk_marker(intent['chunk'])
+        payload = dict(options)
+        payload['jobs'] = dict([(k, _tag(j, marker))
+                                for k, j in chunk.items()])
+        try:
+            results = gengo.postTranslationJobs(jobs=payload,
+                                                deadline=deadline)
+        except GengoError, e:
+            # Only an answer from the API (or a call we refused to make)
+            # tells us nothing was ordered; for anything else - timeouts,
+            # dropped connections - the intent stays pending and
+            # reconcile() sorts it out.
+            self._write({'event': 'failed', 'chunk': intent['chunk'],
+                         'error': str(e)})
+            del self.pending[intent['chunk']]
+            raise
+        response = results.get('response', {})
+        record = {'event': 'done', 'chunk': intent['chunk'],
+                  'order_id': response.get('order_id'),
+                  'keys': sorted(chunk)}
+        self._write(record)
+        for key in chunk:
+            self.landed[key] = {'order_id': record['order_id']}
+        del self.pending[intent['chunk']]
+        return record
+
+    def _write(self, record):
+        self.f.write(json.dumps(record, separators=(',', ':')) + '\n')
+        if record['event'] == 'intent':
+            self.pending[record['chunk']] = record
+
+    def _sync(self):
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def _load(self):
+        """
+        Replays the journal file; returns the length of its complete
+        lines, or None if there is no file yet.
+        """
+        if not os.path.exists(self.path):
+            return None
+        complete = 0
+        f = open(self.path, 'rb')
+        try:
+            for line in f:
+                if not line.endswith('\n'):
+                    # A torn final line from a crash mid-write.
+                    break
+                complete += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                event = record['event']
+                if event == 'intent':
+                    self.pending[record['chunk']] = record
+                elif event == 'done':
+                    self.pending.pop(record['chunk'], None)
+                    for key in record['keys']:
+                        self.landed[key] = {'order_id': record['order_id']}
+                elif event == 'reconciled':
+                    self.pending.pop(record['chunk'], None)
+                    self.landed.update(record['found'])
+                elif event in ('failed', 'skipped'):
+                    self.pending.pop(record['chunk'], None)
+        finally:
+            f.close()
+        return complete
+
+
+def _tag(job, marker):
+    job = dict(job)
+    custom_data = job.get('custom_data')
+    if custom_data:
+        marker = '%s;%s' % (marker, custom_data)
+    job['custom_data'] = marker
+    return job
@@ -0,0 +1,178 @@
+# All code provided from the http://gengo.com site, such as API example code
+# and libraries, is provided under the New BSD license unless otherwise
+# noted. Details are below.
+#
+# New BSD License
+# Copyright (c) 2009-2012, myGengo, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# Neither the name of myGengo, Inc. nor the names of its contributors may
+# be used to endorse or promote products derived from this software
+# without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A local index of the language pairs and tiers the API supports.
+
+getServiceLanguagePairs changes rarely, but knowing what it says up front
+lets us catch an unsupported pair before a request goes out. The index
+keeps the tiers for each (lc_src, lc_tgt) pair in a dictionary, so a
+lookup costs the same however many pairs there are, and validate() can
+check a batch of 100k jobs in well under a second.
+"""
+
+import threading
+
+from time import time
+
+from gengo import GengoJobsError
+
+# Fields every job needs (see examples/postTranslationJobs.py). File jobs
+# carry a file_path or identifier in place of body_src.
+REQUIRED_FIELDS = ('type', 'slug', 'lc_src', 'lc_tgt', 'tier')
+JOB_TYPES = ('text', 'file')
+
+
+class LanguagePairIndex(object):
+    """
+    LanguagePairIndex(max_age = 86400)
+
+    max_age - seconds before ensure() reloads the pairs from the API.
+
+    self.pairs is {(lc_src, lc_tgt): frozenset of tiers}, and
+    self.languages {lc: getServiceLanguages entry}.
+    """
+    def __init__(self, max_age=86400):
+        self.max_age = max_age
+        self.pairs = {}
+        self.languages = {}
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    def learn_language_pairs(self, results):
+        """
+        Replaces the index with the pairs in a getServiceLanguagePairs
+        result.
+        """
+        pairs = {}
+        for pair in results.get('response', []):
+            try:
+                key = (pair['lc_src'], pair['lc_tgt'])
+                tier = pair['tier']
+            except (KeyError, TypeError):
+                continue
+            pairs.setdefault(key, set()).add(tier)
+        with self.lock:
+            self.pairs = dict([(k, frozenset(v)) for k, v in pairs.items()])
+            self.loaded_at = time()
+
+    def learn_languages(self, results):
+        """
+        Replaces the known languages with those in a getServiceLanguages
+        result.
+        """
+        languages = {}
+        for language in results.get('response', []):
+            if isinstance(language, dict) and language.get('lc'):
+                languages[language['lc']] = language
+        with self.lock:
+            self.languages = languages
+
+    def refresh(self, gengo, deadline=None):
+        self.learn_languages(gengo.getServiceLanguages(deadline=deadline))
+        self.learn_language_pairs(
+            gengo.getServiceLanguagePairs(deadline=deadline))
+
+    def ensure(self, gengo, deadline=None):
+        """
+        Loads the pairs if we have none yet, or they're older than
+        max_age.
+        """
+        loaded_at = self.loaded_at
+        if loaded_at is None or time() - loaded_at > self.max_age:
+            self.refresh(gengo, deadline)
+
+    def tiers(self, lc_src, lc_tgt):
+        """
+        The tiers offered for a pair; empty if the pair isn't supported.
+        """
+        return self.pairs.get((lc_src, lc_tgt), frozenset())
+
+    def supports(self, lc_src, lc_tgt, tier=None):
+        tiers = self.tiers(lc_src, lc_tgt)
+        return bool(tiers) and (tier is None or tier in tiers)
+
+    def validate(self, jobs):
+        """
+        Checks {key: job} against the index without touching the network.
+        Returns {key: [{'code': None, 'msg': ...}]} for every job with
+        problems - the same shape as GengoJobsError.errors.
+        """
+        pairs = self.pairs
+        languages = self.languages
+        errors = {}
+        for key, job in jobs.iteritems():
+            problems = [field for field in REQUIRED_FIELDS
+                        if not job.get(field)]
+            if problems:
+                problems = ['missing %s' % ', '.join(problems)]
+            if job.get('type') and job['type'] not in JOB_TYPES:
+                problems.append('unknown type %r' % job['type'])
+            elif job.get('type') == 'file':
+                if not job.get('file_path') and not job.get('identifier'):
+                    problems.append('missing file_path')
+            elif not job.get('body_src'):
+                problems.append('missing body_src')
+            lc_src = job.get('lc_src')
+            lc_tgt = job.get('lc_tgt')
+            if languages:
+                for lc in (lc_src, lc_tgt):
+                    if lc and lc not in languages:
+                        problems.append('unknown language %r' % lc)
+            if lc_src and lc_tgt and job.get('tier'):
+                tiers = pairs.get((lc_src, lc_tgt))
+                if not tiers:
+                    problems.append('%s to %s is not offered' %
+                                    (lc_src, lc_tgt))
+                elif job['tier'] not in tiers:
+                    problems.append('%s to %s is not offered at the %s '
+                                    'tier' % (lc_src, lc_tgt, job['tier']))
+            if problems:
+                errors[key] = [{'code': None, 'msg': msg}
+                               for msg in problems]
+        return errors
+
+    def pre_submit_hook(self):
+        """
+        Returns a hook for Gengo(pre_submit=...) that validates every
+        postTranslationJobs batch, raising GengoJobsError before anything
+        is sent if any job is invalid. Load the index (ensure()) first.
+        """
+        def hook(jobs):
+            errors = self.validate(jobs)
+            if errors:
+                raise GengoJobsError(
+                    '%d of %d jobs are invalid' % (len(errors), len(jobs)),
+                    errors=errors, submitted=jobs)
+            return jobs, None
+        return hook
@@ -0,0 +1,159 @@
+# All code provided from the http://gengo.com site, such as API example code
+# and libraries, is provided under the New BSD license unless otherwise
+# noted. Details are below.
+#
+# New BSD License
+# Copyright (c) 2009-2012, myGengo, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# Neither the name of myGengo, Inc. nor the names of its contributors may
+# be used to endorse or promote products derived from this software
+# without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+An adaptive limit on the number of requests a client has in flight.
+
+Rather than guessing a fixed number of workers, the limiter keeps an eye
+on latency per endpoint. While latency stays close to the best we've seen
+for that endpoint the API clearly has room, so the limit creeps up; when
+latency climbs (requests are queueing somewhere) or calls fail, the limit
+comes down. This is the "gradient" approach used by TCP Vegas style
+congestion control:
+
+    gradient = tolerance * baseline / recent latency  (clamped to 0.5..1)
+    new limit = limit * gradient + headroom
+"""
+
+import math
+import threading
+
+from time import time
+
+
+class _Latency(object):
+    """
+    Baseline and recent latency for one endpoint.
+    """
+    def __init__(self, sample):
+        self.baseline = sample
+        self.recent = sample
+
+
+class AdaptiveLimiter(object):
+    """
+    AdaptiveLimiter(initial = 8, min_limit = 1, max_limit = 128,
+    tolerance = 1.5, smoothing = 0.2, backoff = 0.9)
+
+    initial, min_limit, max_limit - bounds on concurrent requests.
+    tolerance - how much slower than baseline a request may be before it
+    counts as a sign of queueing.
+    smoothing - how quickly the limit follows its target (0..1).
+    backoff - factor the limit is multiplied by when a request fails.
+
+    One limiter is shared by every call made through a Gengo instance;
+    bulk helpers read its current `limit` to size their worker pools.
+    """
+    def __init__(self, initial=8, min_limit=1, max_limit=128,
+                 tolerance=1.5, smoothing=0.2, backoff=0.9):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.backoff = backoff
+        self.estimate = float(initial)
+        self.in_flight = 0
+        self.latencies = {}
+        self.cond = threading.Condition()
+
+    @property
+    def limit(self):
+        return max(self.min_limit, int(self.estimate))
+
+    def acquire(self):
+        """
+        Blocks until there is room for one more request.
+        """
+        with self.cond:
+            while self.in_flight >= self.limit:
+                self.cond.wait()
+            self.in_flight += 1
+
+    def release(self, key, elapsed, ok=True):
+        """
+        Frees a slot and feeds the outcome of the request into the limit.
+        key identifies the endpoint, elapsed is in seconds.
+        """
+        with self.cond:
+            self.in_flight -= 1
+            if ok:
+                self._on_sample(key, elapsed)
+            else:
+                self.estimate = max(self.min_limit,
+                                    self.estimate * self.backoff)
+            self.cond.notify_all()
+
+    def call(self, key, fn, *args, **kwargs):
+        """
+        Runs fn(*args, **kwargs) inside a slot, timing it. A response with
+        a 5xx status counts as a failure.
+        """
+        self.acquire()
+        start = time()
+        ok = False
+        try:
+            result = fn(*args, **kwargs)
+            ok = getattr(result, 'status_code', 200) < 500
+            return result
+        finally:
+            self.release(key, time() - start, ok)
+
+    def stats(self):
+        with self.cond:
+            return {
+                'limit': self.limit,
+                'in_flight': self.in_flight,
+                'baselines': dict([(k, v.baseline) for k, v
+                                   in self.latencies.items()]),
+            }
+
+    def _on_sample(self, key, elapsed):
+        latency = self.latencies.get(key)
+        if latency is None:
+            latency = self.latencies[key] = _Latency(elapsed)
+        latency.recent += (elapsed - latency.recent) * self.smoothing
+        # The baseline follows improvements immediately but drifts up
+        # only slowly, so one lucky sample can't pin it down forever.
+        if elapsed < latency.baseline:
+            latency.baseline = elapsed
+        else:
+            latency.baseline += (elapsed - latency.baseline) * 0.01
+        if latency.recent <= 0:
+            return
+        gradient = self.tolerance * latency.baseline / latency.recent
+        gradient = max(0.5, min(1.0, gradient))
+        headroom = math.sqrt(self.estimate)
+        target = self.estimate * gradient + headroom
+        self.estimate += (target - self.estimate) * self.smoothing
+        self.estimate = max(self.min_limit,
+                            min(self.max_limit, self.estimate))
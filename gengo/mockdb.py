@@ -47,6 +47,11 @@ function at call time.
 i.e, in this case, if I pass bert = 47 to any function, {{bert}} will be
 replaced with 47, instead of defaulting to 1 (said defaulting takes place
 at conversion time).
+
+Every endpoint also names the 'group' it belongs to. Client-side
+machinery that cares about API health (e.g. the circuit breaker) tracks
+endpoints per group, so a struggling quote service doesn't take job
+lookups down with it.
 """
 
 # Gengo API urls. %(version)s gets replaced with v1/etc at run time.
@@ -63,51 +68,67 @@ apihash = {
     'getAccountStats': {
         'url': '/account/stats',
         'method': 'GET',
+        'group': 'account',
     },
     'getAccountBalance': {
         'url': '/account/balance',
         'method': 'GET',
+        'group': 'account',
     },
 
     # Creating new translation requests.
     'postTranslationJob': {
         'url': '/translate/job',
         'method': 'POST',
+        'group': 'jobs',
     },
     'postTranslationJobs': {
         'url': '/translate/jobs',
         'method': 'POST',
+        'group': 'jobs',
     },
 
     # Updating an existing translation request.
     'updateTranslationJob': {
         'url': '/translate/job/{{id}}',
         'method': 'PUT',
+        'group': 'jobs',
+    },
+    # ...or a whole list of them at once: pass action and job_ids.
+    'updateTranslationJobs': {
+        'url': '/translate/jobs',
+        'method': 'PUT',
+        'group': 'jobs',
     },
 
     # Viewing existing translation requests.
     'getTranslationJob': {
         'url': '/translate/job/{{id}}',
         'method': 'GET',
+        'group': 'jobs',
     },
     'getTranslationJobs': {
         'url': '/translate/jobs',
         'method': 'GET',
+        'group': 'jobs',
     },
     'getTranslationJobBatch': {
         'url': '/translate/jobs/{{id}}',
         'method': 'GET',
+        'group': 'jobs',
     },
 
     'getTranslationJobGroup': {
         'url': '/translate/jobs/group/{{id}}',
         'method': 'GET',
+        'group': 'jobs',
     },
 
     # Get a quote for how much a given job will cost.
     'determineTranslationCost': {
         'url': '/translate/service/quote',
         'method': 'POST',
+        'group': 'quote',
         'upload': True,  # with this being set the payload will be checked
         # for file_path args and - if found - modified in a way so that
         # opened file descriptors are passed to requests to do a multi part
@@ -119,32 +140,39 @@ apihash = {
     'postTranslationJobComment': {
         'url': '/translate/job/{{id}}/comment',
         'method': 'POST',
+        'group': 'jobs',
     },
     'getTranslationJobComments': {
         'url': '/translate/job/{{id}}/comments',
         'method': 'GET',
+        'group': 'jobs',
     },
     'getTranslationJobFeedback': {
         'url': '/translate/job/{{id}}/feedback',
         'method': 'GET',
+        'group': 'jobs',
     },
     'getTranslationJobRevisions': {
         'url': '/translate/job/{{id}}/revisions',
         'method': 'GET',
+        'group': 'jobs',
     },
     'getTranslationJobRevision': {
         'url': '/translate/job/{{id}}/revisions/{{revision_id}}',
         'method': 'GET',
+        'group': 'jobs',
     },
     'getTranslationJobPreviewImage': {
         'url': '/translate/job/{{id}}/preview',
         'method': 'GET',
+        'group': 'jobs',
     },
 
     # Delete a job...
     'deleteTranslationJob': {
         'url': '/translate/job/{{id}}',
         'method': 'DELETE',
+        'group': 'jobs',
     },
 
     # Translation Service language information. Holds information
@@ -152,26 +180,31 @@ apihash = {
     'getServiceLanguagePairs': {
         'url': '/translate/service/language_pairs',
         'method': 'GET',
+        'group': 'service',
     },
     'getServiceLanguages': {
         'url': '/translate/service/languages',
         'method': 'GET',
+        'group': 'service',
     },
 
     # glossary stuff
     'getGlossaryList': {
         'url': '/translate/glossary',
         'method': 'GET',
+        'group': 'glossary',
     },
 
     'getGlossary': {
         'url': '/translate/glossary/{{id}}',
         'method': 'GET',
+        'group': 'glossary',
     },
 
     # order information
     'getTranslationOrderJobs': {
         'url': '/translate/order/{{id}}',
         'method': 'GET',
+        'group': 'order',
     },
 }
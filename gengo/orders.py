@@ -0,0 +1,324 @@
+# All code provided from the http://gengo.com site, such as API example code
+# and libraries, is provided under the New BSD license unless otherwise
+# noted. Details are below.
+#
+# New BSD License
+# Copyright (c) 2009-2012, myGengo, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# Neither the name of myGengo, Inc. nor the names of its contributors may
+# be used to endorse or promote products derived from this software
+# without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Waiting for orders to finish.
+
+getTranslationOrderJobs lists an order's job IDs by status, which is all
+we need to tell how far along it is. OrderWaiter polls every order it is
+tracking from one shared loop: an order that hasn't changed since the last
+poll is polled less and less often (up to max_interval), one that moved
+goes back to min_interval. Full job details are only fetched for the jobs
+whose status changed, 50 at a time with getTranslationJobBatch.
+
+wait() blocks the calling thread until the orders are done. For callers
+that shouldn't block, start() runs the same loop on a background thread;
+add() then hands back an OrderHandle to wait on or attach a callback to.
+"""
+
+import threading
+
+from time import sleep, time
+
+from gengo import GengoDeadlineExceeded
+from bulk import run_concurrently
+
+# A job in one of these statuses is finished, as far as waiting goes.
+DONE_STATUSES = ('approved', 'cancelled')
+
+
+def order_progress(order):
+    """
+    Summarizes the 'order' part of a getTranslationOrderJobs response as
+    {'total': jobs in the order, 'queued': jobs without an ID yet,
+    'statuses': {job_id: status}, 'counts': {status: jobs}}.
+    """
+    statuses = {}
+    queued = 0
+    for field, value in order.items():
+        if not field.startswith('jobs_'):
+            continue
+        status = field[len('jobs_'):]
+        if isinstance(value, list):
+            for job_id in value:
+                statuses[str(job_id)] = status
+        elif status == 'queued':
+            try:
+                queued = int(value)
+            except (TypeError, ValueError):
+                pass
+    counts = {}
+    for status in statuses.values():
+        counts[status] = counts.get(status, 0) + 1
+    try:
+        total = int(order.get('total_jobs'))
+    except (TypeError, ValueError):
+        total = len(statuses) + queued
+    return {'total': total, 'queued': queued, 'statuses': statuses,
+            'counts': counts}
+
+
+class OrderHandle(object):
+    """
+    One order being waited on. progress is the latest order_progress(),
+    jobs the details of every job seen changing status, error the last
+    error polling it (polling carries on regardless).
+    """
+    def __init__(self, order_id):
+        self.order_id = order_id
+        self.progress = None
+        self.jobs = {}
+        self.error = None
+        self.callbacks = []
+        self.interval = None
+        self.next_poll = 0
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+
+    @property
+    def done(self):
+        return self.event.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Blocks until the order is done or timeout seconds have passed;
+        returns whether it's done.
+        """
+        self.event.wait(timeout)
+        return self.event.is_set()
+
+    def add_done_callback(self, callback):
+        """
+        Calls callback(handle) once the order is done - right away if it
+        already is.
+        """
+        with self.lock:
+            if not self.done:
+                self.callbacks.append(callback)
+                return
+        callback(self)
+
+    def finish(self):
+        with self.lock:
+            self.event.set()
+            callbacks = list(self.callbacks)
+        for callback in callbacks:
+            callback(self)
+
+
+class OrderWaiter(object):
+    """
+    OrderWaiter(gengo, done_statuses = DONE_STATUSES, min_interval = 5,
+    max_interval = 300, backoff = 2.0, on_transition = None,
+    workers = None)
+
+    done_statuses - statuses in which a job counts as finished; add
+    'reviewable' to stop waiting once every job can be reviewed.
+    min_interval, max_interval, backoff - polling interval bounds, and the
+    factor it grows by after every poll that saw no change.
+    on_transition - optional callable(order_id, job_id, old_status,
+    new_status, job) for every job seen changing status.
+    workers - how many orders are polled at once (see bulk).
+    """
+    def __init__(self, gengo, done_statuses=DONE_STATUSES, min_interval=5,
+                 max_interval=300, backoff=2.0, on_transition=None,
+                 workers=None):
+        self.gengo = gengo
+        self.done_statuses = frozenset(done_statuses)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.on_transition = on_transition
+        self.workers = workers
+        self.orders = {}
+        self.cond = threading.Condition()
+        self.thread = None
+        self.stopped = False
+
+    def add(self, order_id, callback=None):
+        """
+        Starts tracking an order (if it isn't tracked already) and
+        returns its OrderHandle.
+        """
+        with self.cond:
+            handle = self.orders.get(str(order_id))
+            if handle is None:
+                handle = self.orders[str(order_id)] = OrderHandle(order_id)
+            self.cond.notify_all()
+        if callback is not None:
+            handle.add_done_callback(callback)
+        return handle
+
+    def wait(self, order_ids, deadline=None):
+        """
+        Blocks until every order in order_ids is done, and returns
+        {order_id: OrderHandle}. Raises GengoDeadlineExceeded if deadline
+        runs out first. Without a background thread, the polling happens
+        right here, and every poll is bounded by what is left of deadline.
+        """
+        handles = dict([(order_id, self.add(order_id))
+                        for order_id in order_ids])
+        while True:
+            pending = [h for h in handles.values() if not h.done]
+            if not pending:
+                return handles
+            if deadline is not None and deadline.expired():
+                raise GengoDeadlineExceeded(
+                    'Deadline exceeded waiting for orders %s' %
+                    ', '.join([str(h.order_id) for h in pending]))
+            remaining = deadline.remaining() if deadline else None
+            if self.thread is not None:
+                pending[0].wait(remaining)
+                continue
+            delay = self.poll_due(deadline)
+            if delay is not None and delay > 0:
+                sleep(min(delay, remaining) if remaining is not None
+                      else delay)
+
+    def start(self):
+        """
+        Runs the polling loop on a background thread.
+        """
+        with self.cond:
+            if self.thread is not None:
+                return
+            self.stopped = False
+            self.thread = threading.Thread(target=self._run)
+            self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            thread = self.thread
+            self.cond.notify_all()
+        if thread is not None:
+            thread.join()
+        self.thread = None
+
+    def _run(self):
+        while True:
+            with self.cond:
+                if self.stopped:
+                    return
+            delay = self.poll_due()
+            with self.cond:
+                if self.stopped:
+                    return
+                if delay is None:
+                    # Nothing to watch: sleep until add() or stop().
+                    self.cond.wait()
+                elif delay > 0:
+                    self.cond.wait(delay)
+
+    def poll_due(self, deadline=None):
+        """
+        Polls every tracked order that is due, and returns the seconds
+        until the next one is (None when there are none left). deadline
+        is passed on to every call a poll makes.
+        """
+        now = time()
+        with self.cond:
+            due = [h for h in self.orders.values() if h.next_poll <= now]
+
+        def poll(handle):
+            # A failed poll (network trouble included) is retried later
+            # rather than ending the loop.
+            try:
+                self._poll(handle, deadline)
+            except GengoDeadlineExceeded, e:
+                # The caller's budget ran out, not the order's patience:
+                # it stays due for whoever polls next.
+                handle.error = e
+            except Exception, e:
+                handle.error = e
+                self._schedule(handle, False)
+
+        run_concurrently(due, poll, self.workers, self.gengo)
+        with self.cond:
+            if not self.orders:
+                return None
+            return min([h.next_poll for h in self.orders.values()]) - time()
+
+    def _poll(self, handle, deadline=None):
+        order = self.gengo.getTranslationOrderJobs(id=handle.order_id,
+                                                   deadline=deadline)
+        progress = order_progress(order.get('response', {}).get('order', {}))
+        previous = handle.progress
+        changed = previous is None or \
+            progress['statuses'] != previous['statuses'] or \
+            progress['queued'] != previous['queued']
+        if previous is not None and changed:
+            moved = [job_id for job_id, status
+                     in progress['statuses'].items()
+                     if previous['statuses'].get(job_id) != status]
+            self._fetch_moved(handle, previous, progress, moved, deadline)
+        handle.progress = progress
+        handle.error = None
+        if self._finished(progress):
+            with self.cond:
+                self.orders.pop(str(handle.order_id), None)
+            handle.finish()
+        else:
+            self._schedule(handle, changed)
+
+    def _finished(self, progress):
+        return not progress['queued'] and \
+            len(progress['statuses']) >= progress['total'] and \
+            not [s for s in progress['statuses'].values()
+                 if s not in self.done_statuses]
+
+    def _schedule(self, handle, changed):
+        if changed or handle.interval is None:
+            handle.interval = self.min_interval
+        else:
+            handle.interval = min(handle.interval * self.backoff,
+                                  self.max_interval)
+        handle.next_poll = time() + handle.interval
+
+    def _fetch_moved(self, handle, previous, progress, moved,
+                     deadline=None):
+        job_cache = getattr(self.gengo, 'job_cache', None)
+        for i in range(0, len(moved), 50):
+            batch = self.gengo.getTranslationJobBatch(
+                id=','.join(moved[i:i + 50]), deadline=deadline)
+            for job in batch.get('response', {}).get('jobs', []):
+                job_id = str(job.get('job_id'))
+                handle.jobs[job_id] = job
+                if job_cache is not None:
+                    job_cache.invalidate(job_id)
+                if self.on_transition is not None:
+                    self.on_transition(handle.order_id, job_id,
+                                       previous['statuses'].get(job_id),
+                                       progress['statuses'].get(job_id),
+                                       job)
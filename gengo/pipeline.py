@@ -0,0 +1,198 @@
+# All code provided from the http://gengo.com site, such as API example code
+# and libraries, is provided under the New BSD license unless otherwise
+# noted. Details are below.
+#
+# New BSD License
+# Copyright (c) 2009-2012, myGengo, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# Neither the name of myGengo, Inc. nor the names of its contributors may
+# be used to endorse or promote products derived from this software
+# without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A streaming submission pipeline for inputs too big to hold in memory.
+
+submit_stream() reads jobs from any iterable (a generator over a huge
+export, say), packs them into batches, and orders the batches on a few
+worker threads. Only a fixed window of batches is ever in flight or
+waiting to be handed back: once the window is full, reading the input
+simply pauses until the caller has consumed some results. Memory use
+therefore depends on the window and batch size, never on the input.
+"""
+
+import sys
+import threading
+
+from Queue import Queue
+
+from gengo import GengoError, GengoJobsError
+from bulk import DEFAULT_WORKERS, group_errors, job_size
+
+
+def batch_stream(jobs, max_jobs=50, max_bytes=1 << 20):
+    """
+    Groups an iterable of jobs into batches - lists of (key, job) pairs -
+    of at most max_jobs jobs and max_bytes (by job_size()). Items may be
+    (key, job) pairs or bare jobs, which are keyed 'job_<n>' by position.
+    """
+    batch = []
+    size = 0
+    for n, item in enumerate(jobs):
+        if isinstance(item, tuple):
+            key, job = item
+        else:
+            key, job = 'job_%d' % n, item
+        item_size = job_size(job)
+        if batch and (len(batch) >= max_jobs or
+                      size + item_size > max_bytes):
+            yield batch
+            batch = []
+            size = 0
+        batch.append((key, job))
+        size += item_size
+    if batch:
+        yield batch
+
+
+def _submit(gengo, batch, deadline):
+    """
+    Orders one batch; returns [(key, result, errors)] for its jobs. Every
+    exception ends up as errors for the jobs it covers: a worker that let
+    one escape would leave submit_stream() waiting for the batch forever.
+    Only a GengoError says nothing was ordered; after anything else (a
+    timeout, a dropped connection) the request may have gone through, so
+    the error is marked 'unknown'.
+    """
+    keys = [k for k, j in batch]
+    try:
+        response = gengo.postTranslationJobs(
+            jobs={'jobs': dict(batch)}, deadline=deadline).get('response', {})
+    except GengoJobsError, e:
+        # Jobs the API neither ordered nor blamed were turned away with
+        # the rest of the batch.
+        rejected = [{'code': None, 'msg': 'not ordered: batch rejected'}]
+        return [(k, e.succeeded.get(k),
+                 e.errors.get(k) or (None if k in e.succeeded else rejected))
+                for k in keys]
+    except GengoError, e:
+        errors = group_errors(keys, e)
+        return [(k, None, errors[k]) for k in keys]
+    except Exception, e:
+        errors = [{'code': None, 'msg': str(e), 'unknown': True}]
+        return [(k, None, errors) for k in keys]
+    already_ordered = response.get('already_ordered', {})
+    outcomes = []
+    for key in keys:
+        result = {'order_id': response.get('order_id')}
+        result.update(already_ordered.get(key, {}))
+        outcomes.append((key, result, None))
+    return outcomes
+
+
+def submit_stream(gengo, jobs, max_jobs=50, max_bytes=1 << 20,
+                  workers=None, window=None, ordered=True, deadline=None):
+    """
+    submit_stream(gengo, jobs, max_jobs = 50, max_bytes = 1MB,
+    workers = None, window = None, ordered = True, deadline = None)
+
+    Orders every job from the iterable jobs (see batch_stream()) with
+    postTranslationJobs, yielding (key, result, errors) per job: result
+    is {'order_id': ...} (plus 'job_id' for jobs idempotency mode found
+    already ordered), errors the [{'code', 'msg'}] list for a job that
+    failed. A job whose batch got no answer at all has a single error
+    with 'unknown': True: it may have been ordered, so check (e.g. with
+    getTranslationJobs) rather than resubmit it blindly; idempotency mode
+    makes resubmitting safe. With ordered = True jobs come back in input
+    order, otherwise as their batches complete.
+
+    workers defaults to the limit of gengo's AdaptiveLimiter; window, the
+    number of batches read ahead but not yet handed back, to twice that.
+    An exception raised while reading the input is re-raised here once
+    the batches read before it have been yielded; jobs read since the last
+    full batch are not ordered.
+    """
+    if workers is None:
+        limiter = getattr(gengo, 'limiter', None)
+        workers = limiter.limit if limiter is not None else DEFAULT_WORKERS
+    slots = threading.Semaphore(window or workers * 2)
+    todo = Queue()
+    done = Queue()
+    stop = threading.Event()
+
+    def produce():
+        count = 0
+        try:
+            for batch in batch_stream(jobs, max_jobs, max_bytes):
+                slots.acquire()
+                if stop.is_set():
+                    return
+                todo.put((count, batch))
+                count += 1
+        except Exception:
+            done.put(('error', count, sys.exc_info()))
+        else:
+            done.put(('end', count, None))
+        finally:
+            for i in range(workers):
+                todo.put(None)
+
+    def work():
+        while True:
+            item = todo.get()
+            if item is None or stop.is_set():
+                return
+            seq, batch = item
+            done.put(('batch', seq, _submit(gengo, batch, deadline)))
+
+    threads = [threading.Thread(target=produce)] + \
+        [threading.Thread(target=work) for i in range(workers)]
+    for t in threads:
+        t.daemon = True
+        t.start()
+
+    pending = {}
+    next_seq = 0
+    total = None
+    error = None
+    try:
+        while total is None or next_seq < total:
+            kind, seq, value = done.get()
+            if kind == 'batch':
+                pending[seq] = value
+            else:
+                total = seq
+                error = value
+            while pending and (next_seq in pending or not ordered):
+                key = next_seq if ordered else pending.keys()[0]
+                for outcome in pending.pop(key):
+                    yield outcome
+                next_seq += 1
+                slots.release()
+    finally:
+        stop.set()
+        for i in range(workers + 1):
+            slots.release()
+    if error is not None:
+        raise error[0], error[1], error[2]
@@ -0,0 +1,249 @@
+# All code provided from the http://gengo.com site, such as API example code
+# and libraries, is provided under the New BSD license unless otherwise
+# noted. Details are below.
+#
+# New BSD License
+# Copyright (c) 2009-2012, myGengo, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# Neither the name of myGengo, Inc. nor the names of its contributors may
+# be used to endorse or promote products derived from this software
+# without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Local quotes for determineTranslationCost.
+
+Prices are per unit and depend only on (lc_src, lc_tgt, tier), so once we
+know them - from getServiceLanguagePairs, or worked out from earlier
+quotes - most estimates can be done without a round trip. A real quote is
+only requested on a cache miss or when an exact figure is needed, and
+every real quote is compared with what we would have estimated, so it's
+easy to see how far the local numbers can be trusted.
+"""
+
+import threading
+
+from collections import deque
+from time import time
+
+from files import FileIndex, analyze_file
+from units import count_units_batch
+
+
+class QuoteCache(object):
+    """
+    QuoteCache(max_age = 86400, file_index = None)
+
+    max_age - seconds a learned unit price stays usable.
+    file_index - the gengo.files.FileIndex real quotes for files are kept
+    in; pass the one given to Gengo(file_index=...) so both share them.
+    Defaults to a private in-memory index with the same max_age.
+
+    Unit prices live in self.prices as {(lc_src, lc_tgt, tier):
+    (unit_price, currency, learned_at)}. self.errors keeps the relative
+    error (estimate / actual - 1) of the most recent checked estimates.
+    """
+    def __init__(self, max_age=86400, file_index=None):
+        self.max_age = max_age
+        self.prices = {}
+        if file_index is None:
+            file_index = FileIndex(max_age=max_age)
+        self.file_index = file_index
+        self.errors = deque(maxlen=1000)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def learn_language_pairs(self, results):
+        """
+        Learns unit prices from a getServiceLanguagePairs result.
+        """
+        now = time()
+        with self.lock:
+            for pair in results.get('response', []):
+                try:
+                    price = float(pair['unit_price'])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                self.prices[(pair['lc_src'], pair['lc_tgt'],
+                             pair['tier'])] = \
+                    (price, pair.get('currency'), now)
+
+    def refresh(self, gengo, deadline=None):
+        """
+        Reloads every unit price from getServiceLanguagePairs.
+        """
+        self.learn_language_pairs(
+            gengo.getServiceLanguagePairs(deadline=deadline))
+
+    def learn_quote(self, jobs, quoted):
+        """
+        Learns unit prices from a quote: {key: job} as sent, and the
+        {key: quote} that came back.
+        """
+        now = time()
+        with self.lock:
+            for key, quote in quoted.items():
+                job = jobs.get(key)
+                try:
+                    units = int(quote['unit_count'])
+                    credits = float(quote['credits'])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if job is None or units <= 0:
+                    continue
+                self.prices[(job.get('lc_src'), job.get('lc_tgt'),
+                             job.get('tier'))] = \
+                    (credits / units, quote.get('currency'), now)
+
+    def estimate_job(self, job):
+        """
+        A local quote for one job, or None if we can't make one.
+        """
+        return self._estimate_all({None: job})[None]
+
+    def estimate(self, jobs):
+        """
+        Local quotes for {key: job}, or None if any job can't be estimated.
+        """
+        estimates = self._estimate_all(jobs)
+        with self.lock:
+            if None in estimates.values():
+                self.misses += 1
+                return None
+            self.hits += 1
+        return estimates
+
+    def quote(self, gengo, jobs, exact=False, deadline=None):
+        """
+        Quotes {key: job}. Returns a dictionary shaped like the 'response'
+        part of determineTranslationCost: {'jobs': {key: quote}}, plus
+        'estimated' (True when no request was made) and, for real quotes,
+        'estimate_error' with the relative error of our local estimate per
+        job where we had one.
+
+        File jobs (type 'file' with a local file_path) are analyzed first.
+        A file the file index has a real quote for - same content, same
+        language pair and tier - is never uploaded again, even with
+        exact=True; otherwise its approximate unit count feeds the
+        estimate.
+        """
+        files = {}
+        known = {}
+        for key, job in jobs.items():
+            if job.get('type') == 'file' and job.get('file_path'):
+                files[key] = analyze_file(job['file_path'], job.get('lc_src'))
+                cached = self._file_quote(job, files[key])
+                if cached is not None:
+                    known[key] = cached
+        estimates = self._estimate_all(jobs, files)
+        estimates.update(known)
+        if not exact and None not in estimates.values():
+            with self.lock:
+                self.hits += 1
+            return {'jobs': estimates,
+                    'estimated': len(known) < len(jobs)}
+        if not exact:
+            with self.lock:
+                self.misses += 1
+        to_send = dict([(k, dict(j)) for k, j in jobs.items()
+                        if k not in known])
+        if not to_send:
+            return {'jobs': known, 'estimated': False, 'estimate_error': {}}
+        results = gengo.determineTranslationCost(jobs={'jobs': to_send},
+                                                 deadline=deadline)
+        response = results['response']
+        quoted = response.get('jobs', {})
+        errors = {}
+        for key, estimate in estimates.items():
+            actual = quoted.get(key, {}).get('credits')
+            if estimate is None or key in known or not actual:
+                continue
+            errors[key] = estimate['credits'] / float(actual) - 1
+        with self.lock:
+            self.errors.extend(errors.values())
+        for key, info in files.items():
+            if key in quoted:
+                self.file_index.record(info['sha1'], jobs[key], quoted[key])
+        self.learn_quote(jobs, quoted)
+        response['jobs'] = dict(quoted)
+        response['jobs'].update(known)
+        response['estimated'] = False
+        response['estimate_error'] = errors
+        return response
+
+    def accuracy(self):
+        """
+        Mean absolute relative error of recent estimates, or None.
+        """
+        with self.lock:
+            if not self.errors:
+                return None
+            return sum([abs(e) for e in self.errors]) / len(self.errors)
+
+    def _estimate_all(self, jobs, files=None):
+        # Unit counting is the expensive part, so count each source
+        # language's strings in one batch. File jobs use the unit count
+        # from their analysis, if there is one.
+        files = files or {}
+        estimates = dict([(key, None) for key in jobs])
+        by_language = {}
+        for key, job in jobs.items():
+            price = self._price(job)
+            if price is None:
+                continue
+            if key in files:
+                if files[key]['unit_count'] is not None:
+                    estimates[key] = self._priced(files[key]['unit_count'],
+                                                  price)
+            elif job.get('body_src'):
+                by_language.setdefault(job.get('lc_src'), []).append(
+                    (key, price))
+        for lc_src, entries in by_language.items():
+            counts = count_units_batch([jobs[k]['body_src']
+                                        for k, p in entries], lc_src)
+            for (key, price), units in zip(entries, counts):
+                estimates[key] = self._priced(units, price)
+        return estimates
+
+    def _priced(self, units, price):
+        return {'unit_count': units,
+                'credits': round(units * price[0], 2),
+                'currency': price[1],
+                'estimated': True}
+
+    def _file_quote(self, job, info):
+        quote = self.file_index.lookup(info['sha1'], job)
+        if quote is None:
+            return None
+        quote['cached'] = True
+        return quote
+
+    def _price(self, job):
+        key = (job.get('lc_src'), job.get('lc_tgt'), job.get('tier'))
+        with self.lock:
+            price = self.prices.get(key)
+        if price is None or time() - price[2] > self.max_age:
+            return None
+        return price
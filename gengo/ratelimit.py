@@ -0,0 +1,190 @@
+# All code provided from the http://gengo.com site, such as API example code
+# and libraries, is provided under the New BSD license unless otherwise
+# noted. Details are below.
+#
+# New BSD License
+# Copyright (c) 2009-2012, myGengo, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# Neither the name of myGengo, Inc. nor the names of its contributors may
+# be used to endorse or promote products derived from this software
+# without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Rate limiting shared between processes (and hosts) using the same API key.
+
+A token bucket only helps if everybody draws from the same bucket, so the
+bucket state lives in a backend that all processes can reach. To keep the
+backend off the hot path, each process leases tokens in batches and hands
+them out locally until the lease runs dry.
+
+RateLimitBackend is the interface; SQLiteRateLimitBackend implements it for
+processes on one host (SQLite's file locking does the coordination) and
+LocalRateLimitBackend for a single process. A
+networked store (Redis, memcached, a database) only needs to implement
+lease() atomically.
+"""
+
+import sqlite3
+import threading
+import time
+
+
+class RateLimitBackend(object):
+    """
+    Interface for shared token buckets.
+    """
+    def lease(self, key, wanted, rate, burst):
+        """
+        Atomically takes up to `wanted` tokens from the bucket named `key`,
+        which refills at `rate` tokens per second up to `burst`. Returns
+        (granted, wait): the number of tokens granted and, if none were,
+        how many seconds until one will be available.
+        """
+        raise NotImplementedError
+
+
+def _refill(tokens, updated, now, rate, burst):
+    return min(float(burst), tokens + max(0.0, now - updated) * rate)
+
+
+class LocalRateLimitBackend(RateLimitBackend):
+    """
+    Buckets held in this process only. Useful on its own for a single
+    process, and as a stand-in when no shared store is configured.
+    """
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def lease(self, key, wanted, rate, burst):
+        now = time.time()
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (float(burst), now))
+            tokens = _refill(tokens, updated, now, rate, burst)
+            granted = int(min(wanted, tokens))
+            self.buckets[key] = (tokens - granted, now)
+        if granted:
+            return granted, 0.0
+        return 0, (1 - tokens) / rate
+
+
+class SQLiteRateLimitBackend(RateLimitBackend):
+    """
+    SQLiteRateLimitBackend(path)
+
+    Keeps buckets in a SQLite database file; every process on the host
+    pointing at the same file shares the same buckets.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS buckets ('
+            'key TEXT PRIMARY KEY, tokens REAL, updated REAL)')
+
+    def lease(self, key, wanted, rate, burst):
+        conn = self._connection()
+        now = time.time()
+        # BEGIN IMMEDIATE takes the write lock up front, so the read and
+        # the update below can't interleave with another process.
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM buckets '
+                               'WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                tokens = float(burst)
+            else:
+                tokens = _refill(row[0], row[1], now, rate, burst)
+            granted = int(min(wanted, tokens))
+            tokens -= granted
+            conn.execute('INSERT OR REPLACE INTO buckets '
+                         '(key, tokens, updated) VALUES (?, ?, ?)',
+                         (key, tokens, now))
+            conn.execute('COMMIT')
+        except:
+            conn.execute('ROLLBACK')
+            raise
+        if granted:
+            return granted, 0.0
+        return 0, (1 - tokens) / rate
+
+    def _connection(self):
+        # sqlite3 connections can't be shared between threads.
+        # The connection runs in autocommit mode; lease() manages its own
+        # transaction.
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30,
+                                   isolation_level=None)
+            self.local.conn = conn
+        return conn
+
+
+class SharedRateLimiter(object):
+    """
+    SharedRateLimiter(backend, key, rate, burst = None, batch = 10)
+
+    backend - a RateLimitBackend.
+    key - bucket name; Gengo uses its public_key, so everything running
+    with the same key shares one allowance.
+    rate - requests per second allowed across all processes.
+    burst - bucket size, defaults to one second's worth of requests.
+    batch - tokens leased from the backend at a time. Bigger batches mean
+    fewer trips to the backend but a coarser share between processes.
+    """
+    def __init__(self, backend, key, rate, burst=None, batch=10):
+        self.backend = backend
+        self.key = key
+        self.rate = float(rate)
+        self.burst = burst if burst is not None else max(1, int(rate))
+        self.batch = max(1, min(batch, self.burst))
+        self.tokens = 0
+        self.lock = threading.Lock()
+        self.leases = 0
+        self.waited = 0.0
+
+    def acquire(self):
+        """
+        Blocks until this process may send one request.
+        """
+        with self.lock:
+            while self.tokens == 0:
+                granted, wait = self.backend.lease(self.key, self.batch,
+                                                   self.rate, self.burst)
+                self.leases += 1
+                if granted:
+                    self.tokens = granted
+                else:
+                    self.waited += wait
+                    time.sleep(wait)
+            self.tokens -= 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'leases': self.leases,
+                'tokens': self.tokens,
+                'waited': self.waited,
+            }
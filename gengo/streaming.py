@@ -0,0 +1,98 @@
+# All code provided from the http://gengo.com site, such as API example code
+# and libraries, is provided under the New BSD license unless otherwise
+# noted. Details are below.
+#
+# New BSD License
+# Copyright (c) 2009-2012, myGengo, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# Neither the name of myGengo, Inc. nor the names of its contributors may
+# be used to endorse or promote products derived from this software
+# without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Streaming request bodies for large job payloads.
+
+Sending a batch the plain way builds it several times over: json.dumps()
+makes one full-size string, and form-encoding it makes another. A
+StreamingFormBody produces the same application/x-www-form-urlencoded
+body a few kilobytes at a time, straight from the jobs dictionary, so
+memory use doesn't grow with the size of the batch.
+
+The body has a Content-Length, worked out up front by running the
+encoder once without keeping its output; encoding twice is the price of
+not needing chunked transfer encoding.
+"""
+
+from urllib import quote_plus, urlencode
+
+try:
+    import json
+    json  # silence pyflakes
+except ImportError:
+    import simplejson as json
+
+
+class StreamingFormBody(object):
+    """
+    StreamingFormBody(params, name, payload)
+
+    A file-like request body: the form fields in params, followed by
+    name=<payload as JSON>. requests sends it by calling read() until it's
+    exhausted, and len() gives its exact size. Bodies can only be sent
+    once.
+    """
+    def __init__(self, params, name, payload, separators=(',', ':')):
+        head = urlencode(sorted(params.items()))
+        self.head = '%s%s%s=' % (head, '&' if head else '', quote_plus(name))
+        self.payload = payload
+        self.encoder = json.JSONEncoder(separators=separators)
+        self.length = len(self.head)
+        for chunk in self.encoder.iterencode(payload):
+            self.length += len(quote_plus(chunk))
+        self.pieces = self._pieces()
+        self.buffer = ''
+
+    def __len__(self):
+        return self.length
+
+    def _pieces(self):
+        yield self.head
+        for chunk in self.encoder.iterencode(self.payload):
+            yield quote_plus(chunk)
+
+    def read(self, size=-1):
+        parts = [self.buffer]
+        buffered = len(self.buffer)
+        for piece in self.pieces:
+            parts.append(piece)
+            buffered += len(piece)
+            if size >= 0 and buffered >= size:
+                break
+        data = ''.join(parts)
+        if size < 0:
+            self.buffer = ''
+            return data
+        self.buffer = data[size:]
+        return data[:size]
@@ -0,0 +1,246 @@
+# All code provided from the http://gengo.com site, such as API example code
+# and libraries, is provided under the New BSD license unless otherwise
+# noted. Details are below.
+#
+# New BSD License
+# Copyright (c) 2009-2012, myGengo, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# Neither the name of myGengo, Inc. nor the names of its contributors may
+# be used to endorse or promote products derived from this software
+# without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Incremental sync of job comments, revisions and feedback.
+
+Polling a job's comments and revisions hands back the full lists every
+time. JobSync remembers what it has already seen per job, so each sync()
+reports only what is new, and only fetches getTranslationJobRevision for
+revisions it has never seen. Revision bodies are stored as deltas against
+the previous revision of the same job - a list of token ranges copied
+from the previous body and stretches of new text - which keeps a long
+revision history down to roughly the size of the edits.
+"""
+
+import re
+import sqlite3
+import threading
+
+from difflib import SequenceMatcher
+from hashlib import sha1
+
+from cache import LRU
+
+try:
+    import json
+    json  # silence pyflakes
+except ImportError:
+    import simplejson as json
+
+_TOKENS = re.compile(r'\s+|\S+', re.UNICODE)
+
+
+def make_delta(old, new):
+    """
+    A delta turning old into new: [i, j] copies tokens i..j of old
+    (words and runs of whitespace), a string is new text.
+    """
+    a = _TOKENS.findall(old)
+    b = _TOKENS.findall(new)
+    delta = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, a, b).get_opcodes():
+        if tag == 'equal':
+            delta.append([i1, i2])
+        elif j1 < j2:
+            delta.append(u''.join(b[j1:j2]))
+    return delta
+
+
+def apply_delta(old, delta):
+    a = _TOKENS.findall(old)
+    parts = []
+    for op in delta:
+        if isinstance(op, list):
+            parts.extend(a[op[0]:op[1]])
+        else:
+            parts.append(op)
+    return u''.join(parts)
+
+
+def _fingerprint(item):
+    return sha1(json.dumps(item, sort_keys=True)).hexdigest()
+
+
+class JobSync(object):
+    """
+    JobSync(path = ':memory:', max_bodies = 1000)
+
+    path - SQLite file holding what has been seen, and the revision
+    deltas. Use a real file to keep them across restarts.
+    max_bodies - how many jobs' newest revision body to keep in memory;
+    for other jobs it is rebuilt from the deltas when a new revision
+    arrives.
+
+    Note that a Gengo instance with a JobCache serves revision lists and
+    feedback from the cache while it's fresh.
+    """
+    def __init__(self, path=':memory:', max_bodies=1000):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS comments ('
+                          'job_id TEXT, fp TEXT, PRIMARY KEY (job_id, fp))')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS revisions ('
+                          'job_id TEXT, rev_id TEXT, seq INTEGER, '
+                          'ctime INTEGER, delta TEXT, '
+                          'PRIMARY KEY (job_id, rev_id))')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS feedback ('
+                          'job_id TEXT PRIMARY KEY, fp TEXT)')
+        self.conn.commit()
+        # job_id -> (seq, body) of the newest revision we stored.
+        self.latest = LRU(max_bodies)
+
+    def sync(self, gengo, job_id, deadline=None):
+        """
+        Returns {'comments': [...], 'revisions': [...], 'feedback': ...}
+        with only what's new since the last sync of this job: comments
+        as the API lists them, revisions as {'rev_id', 'ctime',
+        'body_tgt'} (oldest first), and feedback if it changed, else
+        None.
+        """
+        return {'comments': self.sync_comments(gengo, job_id, deadline),
+                'revisions': self.sync_revisions(gengo, job_id, deadline),
+                'feedback': self.sync_feedback(gengo, job_id, deadline)}
+
+    def sync_many(self, gengo, job_ids, deadline=None):
+        """
+        Syncs several jobs, yielding (job_id, kind, item) for every new
+        item; kind is 'comment', 'revision' or 'feedback'.
+        """
+        for job_id in job_ids:
+            new = self.sync(gengo, job_id, deadline)
+            for comment in new['comments']:
+                yield job_id, 'comment', comment
+            for revision in new['revisions']:
+                yield job_id, 'revision', revision
+            if new['feedback'] is not None:
+                yield job_id, 'feedback', new['feedback']
+
+    def sync_comments(self, gengo, job_id, deadline=None):
+        thread = gengo.getTranslationJobComments(id=job_id,
+                                                 deadline=deadline)
+        thread = thread.get('response', {}).get('thread') or []
+        new = []
+        with self.lock:
+            for comment in thread:
+                fp = _fingerprint(comment)
+                seen = self.conn.execute(
+                    'SELECT 1 FROM comments WHERE job_id = ? AND fp = ?',
+                    (str(job_id), fp)).fetchone()
+                if seen is None:
+                    self.conn.execute('INSERT INTO comments VALUES (?, ?)',
+                                      (str(job_id), fp))
+                    new.append(comment)
+            self.conn.commit()
+        return new
+
+    def sync_revisions(self, gengo, job_id, deadline=None):
+        listing = gengo.getTranslationJobRevisions(id=job_id,
+                                                   deadline=deadline)
+        listing = listing.get('response', {}).get('revisions') or []
+        with self.lock:
+            known = set([row[0] for row in self.conn.execute(
+                'SELECT rev_id FROM revisions WHERE job_id = ?',
+                (str(job_id),))])
+        fresh = [r for r in listing if str(r.get('rev_id')) not in known]
+        fresh.sort(key=lambda r: (int(r.get('ctime') or 0),
+                                  int(r.get('rev_id') or 0)))
+        new = []
+        for revision in fresh:
+            detail = gengo.getTranslationJobRevision(
+                id=job_id, revision_id=revision['rev_id'], deadline=deadline)
+            detail = detail.get('response', {}).get('revision', {})
+            body = detail.get('body_tgt') or u''
+            self._store(job_id, revision['rev_id'],
+                        detail.get('ctime', revision.get('ctime')), body)
+            new.append({'rev_id': revision['rev_id'],
+                        'ctime': detail.get('ctime', revision.get('ctime')),
+                        'body_tgt': body})
+        return new
+
+    def sync_feedback(self, gengo, job_id, deadline=None):
+        feedback = gengo.getTranslationJobFeedback(id=job_id,
+                                                   deadline=deadline)
+        feedback = feedback.get('response', {}).get('feedback')
+        if not feedback:
+            return None
+        fp = _fingerprint(feedback)
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT fp FROM feedback WHERE job_id = ?',
+                (str(job_id),)).fetchone()
+            if row is not None and row[0] == fp:
+                return None
+            self.conn.execute('INSERT OR REPLACE INTO feedback VALUES (?, ?)',
+                              (str(job_id), fp))
+            self.conn.commit()
+        return feedback
+
+    def revision_body(self, job_id, rev_id):
+        """
+        Rebuilds the body of a stored revision from its deltas, or returns
+        None if we never saw it.
+        """
+        for seq, row_rev_id, body in self._replay(job_id):
+            if row_rev_id == str(rev_id):
+                return body
+        return None
+
+    def _replay(self, job_id):
+        # (seq, rev_id, body) for every stored revision, oldest first.
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT seq, rev_id, delta FROM revisions WHERE job_id = ? '
+                'ORDER BY seq', (str(job_id),)).fetchall()
+        body = u''
+        for seq, rev_id, delta in rows:
+            body = apply_delta(body, json.loads(delta))
+            yield seq, rev_id, body
+
+    def _store(self, job_id, rev_id, ctime, body):
+        with self.lock:
+            latest = self.latest.get(str(job_id))
+        if latest is None:
+            # Nothing in memory (first revision, or restarted with history
+            # on disk): rebuild the newest body from the deltas.
+            latest = (-1, u'')
+            for seq, stored_rev_id, stored_body in self._replay(job_id):
+                latest = (seq, stored_body)
+        delta = make_delta(latest[1], body)
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO revisions VALUES (?, ?, ?, ?, ?)',
+                (str(job_id), str(rev_id), latest[0] + 1, ctime,
+                 json.dumps(delta, separators=(',', ':'))))
+            self.conn.commit()
+            self.latest.put(str(job_id), (latest[0] + 1, body))
@@ -51,11 +51,40 @@ except AttributeError:
                         "required skip attribute. Either use " +
                         " Python 2.7, or `pip install unittest2`")
 
+import json
 import os
 import random
+import re
+import shutil
+import tempfile
+import threading
 import time
 
-from gengo import Gengo, GengoError, GengoAuthError
+from urlparse import parse_qsl
+
+from gengo import Gengo, GengoError, GengoAuthError, GengoCircuitOpenError, \
+    GengoDeadlineExceeded, GengoInFlightError, GengoJobsError
+from cache import JobCache
+from hedging import Hedger
+from breaker import CircuitBreaker
+from deadline import Deadline
+from limiter import AdaptiveLimiter
+from ratelimit import SQLiteRateLimitBackend, SharedRateLimiter
+from journal import SubmissionJournal
+from idempotency import IdempotencyIndex
+from tm import TranslationMemory
+from quotes import QuoteCache
+from files import FileIndex, analyze_file
+from bulk import delete_jobs, order_targets, pack_jobs, quote_jobs, \
+    update_jobs
+from streaming import StreamingFormBody
+from pipeline import submit_stream
+from languages import LanguagePairIndex
+from sync import JobSync, apply_delta, make_delta
+from glossary import GlossaryManager, TermIndex
+from orders import OrderWaiter
+from units import count_units, count_units_batch
+from jobs import chunk_jobs_by_units
 
 API_PUBKEY = os.getenv('GENGO_PUBKEY')
 API_PRIVKEY = os.getenv('GENGO_PRIVKEY')
@@ -526,5 +555,1670 @@ class TestGlossaryFunctions(unittest.TestCase):
         resp
 
 
+class FakeResponse(object):
+    """
+    Stands in for a requests response in the offline tests below.
+    """
+    def __init__(self, json):
+        self.json = json
+
+
+class FakeAPI(object):
+    """
+    A tiny in-memory Gengo used by the offline tests for helpers that make
+    several calls. Install it with gengo.signAndRequestAPILatest = api.
+    """
+    def __init__(self):
+        self.jobs = {}
+        self.orders = {}
+        self.calls = []
+        self.fail_next_post = False
+
+    def __call__(self, fn, base, query_params, post_data={},
+                 file_data=False, timeout=None):
+        path = re.sub('^https?://[^/]+/v[0-9.]+', '', base)
+        self.calls.append((fn['method'], path))
+        if fn['method'] == 'POST' and path == '/translate/jobs':
+            return self._post_jobs(post_data['jobs'])
+        if fn['method'] == 'POST' and path == '/translate/job':
+            self._post_jobs({'jobs': post_data['job']})
+            return FakeResponse({'opstat': 'ok', 'response': {
+                'job': self.jobs[len(self.jobs)]}})
+        match = re.match('^/translate/jobs/([0-9,]+)$', path)
+        if fn['method'] == 'GET' and match:
+            ids = [int(i) for i in match.group(1).split(',')]
+            return FakeResponse({'opstat': 'ok', 'response': {
+                'jobs': [self.jobs[i] for i in ids if i in self.jobs]}})
+        if fn['method'] == 'GET' and path == '/translate/jobs':
+            # Newest first, at most 'count' of them, like the real thing.
+            count = int(query_params.get('count', 10))
+            return FakeResponse({'opstat': 'ok', 'response': [
+                {'job_id': i, 'ctime': 0}
+                for i in sorted(self.jobs, reverse=True)[:count]]})
+        match = re.match('^/translate/job/([0-9]+)$', path)
+        if fn['method'] == 'GET' and match:
+            return FakeResponse({'opstat': 'ok', 'response': {
+                'job': self.jobs[int(match.group(1))]}})
+        match = re.match('^/translate/order/([0-9]+)$', path)
+        if fn['method'] == 'GET' and match:
+            return FakeResponse({'opstat': 'ok', 'response': {
+                'order': self.orders[int(match.group(1))]}})
+        return FakeResponse({'opstat': 'ok', 'response': {}})
+
+    def _post_jobs(self, payload):
+        order_id = len(self.orders) + 1
+        job_ids = []
+        for key, job in sorted(payload['jobs'].items()):
+            job_id = len(self.jobs) + 1
+            self.jobs[job_id] = dict(job, job_id=job_id, order_id=order_id,
+                                     status='available')
+            job_ids.append(job_id)
+        self.orders[order_id] = {'order_id': order_id,
+                                 'total_jobs': len(job_ids),
+                                 'jobs_available': job_ids}
+        if self.fail_next_post:
+            # The order went through, but we never hear about it.
+            self.fail_next_post = False
+            raise IOError('connection reset')
+        return FakeResponse({'opstat': 'ok', 'response': {
+            'order_id': order_id, 'job_count': len(job_ids),
+            'credits_used': 0}})
+
+
+def make_jobs(count, **extra):
+    jobs = {}
+    for i in range(count):
+        job = {'type': 'text', 'slug': 'test', 'body_src': 'text %d' % i,
+               'lc_src': 'en', 'lc_tgt': 'ja', 'tier': 'standard'}
+        job.update(extra)
+        jobs['job_%03d' % i] = job
+    return jobs
+
+
+class TestRequestCoalescing(unittest.TestCase):
+    """
+    Tests that concurrent identical GETs share one request. These run
+    offline - signAndRequestAPILatest is swapped out for a slow fake.
+    """
+    def setUp(self):
+        self.gengo = Gengo(public_key='pub', private_key='priv',
+                           coalesce=True)
+        self.sent = []
+        self.release = threading.Event()
+
+        def fake_request(fn, base, query_params, post_data={},
+                         file_data=False, timeout=None):
+            self.sent.append(base)
+            self.release.wait(5)
+            if 'fail' in base:
+                return FakeResponse({'opstat': 'error', 'err':
+                                     {'msg': 'nope', 'code': 2000}})
+            return FakeResponse({'opstat': 'ok', 'response': {}})
+        self.gengo.signAndRequestAPILatest = fake_request
+
+    def _run_concurrently(self, fn, count):
+        results = []
+
+        def worker():
+            try:
+                results.append(fn())
+            except GengoError, e:
+                results.append(e)
+        threads = [threading.Thread(target=worker) for i in range(count)]
+        for t in threads:
+            t.start()
+        time.sleep(0.2)
+        self.release.set()
+        for t in threads:
+            t.join()
+        return results
+
+    def test_identicalCallsCollapse(self):
+        results = self._run_concurrently(
+            lambda: self.gengo.getTranslationJob(id=42), 5)
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual([r['opstat'] for r in results], ['ok'] * 5)
+        self.assertEqual(self.gengo.singleflight.collapsed, 4)
+        self.assertEqual(self.gengo.singleflight.in_flight(), 0)
+
+    def test_differentParamsDoNotCollapse(self):
+        self.release.set()
+        self.gengo.getTranslationJob(id=1)
+        self.gengo.getTranslationJob(id=2)
+        self.assertEqual(len(self.sent), 2)
+        self.assertEqual(self.gengo.singleflight.collapsed, 0)
+
+    def test_errorsAreShared(self):
+        results = self._run_concurrently(
+            lambda: self.gengo.getTranslationJob(id='fail'), 3)
+        self.assertEqual(len(self.sent), 1)
+        self.assertTrue(all([isinstance(r, GengoError) for r in results]))
+
+
+class TestJobCache(unittest.TestCase):
+    """
+    Tests the status-aware job cache, offline.
+    """
+    def setUp(self):
+        self.spill_dir = tempfile.mkdtemp()
+        self.cache = JobCache(max_entries=2, ttl=60,
+                              spill_dir=self.spill_dir)
+        self.gengo = Gengo(public_key='pub', private_key='priv',
+                           job_cache=self.cache)
+        self.status = 'reviewable'
+        self.sent = []
+
+        def fake_request(fn, base, query_params, post_data={},
+                         file_data=False, timeout=None):
+            self.sent.append((fn['method'], base))
+            return FakeResponse({'opstat': 'ok', 'response': {
+                'job': {'job_id': 1, 'status': self.status}}})
+        self.gengo.signAndRequestAPILatest = fake_request
+
+    def tearDown(self):
+        shutil.rmtree(self.spill_dir)
+
+    def test_cachedWithinTTL(self):
+        self.gengo.getTranslationJob(id=1)
+        job = self.gengo.getTranslationJob(id=1)
+        self.assertEqual(job['response']['job']['status'], 'reviewable')
+        self.assertEqual(len(self.sent), 1)
+
+    def test_inFlightJobsExpire(self):
+        self.cache.ttl = 0
+        self.gengo.getTranslationJob(id=1)
+        self.gengo.getTranslationJob(id=1)
+        self.assertEqual(len(self.sent), 2)
+
+    def test_terminalJobsNeverExpire(self):
+        self.cache.ttl = 0
+        self.status = 'approved'
+        self.gengo.getTranslationJob(id=1)
+        self.gengo.getTranslationJob(id=1)
+        self.assertEqual(len(self.sent), 1)
+
+    def test_statusChangeInvalidatesSubResources(self):
+        self.gengo.getTranslationJob(id=1)
+        self.gengo.getTranslationJobRevisions(id=1)
+        self.gengo.getTranslationJobRevisions(id=1)
+        self.assertEqual(len(self.sent), 2)
+        self.cache.put('getTranslationJob', 1, {'opstat': 'ok', 'response':
+                       {'job': {'job_id': 1, 'status': 'approved'}}})
+        self.gengo.getTranslationJobRevisions(id=1)
+        self.assertEqual(len(self.sent), 3)
+
+    def test_writesInvalidate(self):
+        self.gengo.getTranslationJob(id=1)
+        self.gengo.deleteTranslationJob(id=1)
+        self.gengo.getTranslationJob(id=1)
+        self.assertEqual(len(self.sent), 3)
+
+    def test_terminalEntriesSpillToDisk(self):
+        self.status = 'approved'
+        for job_id in (1, 2, 3):
+            self.gengo.getTranslationJob(id=job_id)
+        self.assertEqual(self.cache.spilled, 1)
+        self.gengo.getTranslationJob(id=1)
+        self.assertEqual(len(self.sent), 3)
+
+    def test_returnsFreshCopies(self):
+        self.gengo.getTranslationJob(id=1)
+        job = self.gengo.getTranslationJob(id=1)
+        job['response']['job']['status'] = 'bogus'
+        job = self.gengo.getTranslationJob(id=1)
+        self.assertEqual(job['response']['job']['status'], 'reviewable')
+
+
+class TestHedgedRequests(unittest.TestCase):
+    """
+    Tests hedging of slow GET requests, offline.
+    """
+    def setUp(self):
+        self.hedger = Hedger(max_delay=0.05)
+        self.gengo = Gengo(public_key='pub', private_key='priv',
+                           hedger=self.hedger)
+        self.delays = [0.5, 0]
+        self.lock = threading.Lock()
+
+        def fake_request(fn, base, query_params, post_data={},
+                         file_data=False, timeout=None):
+            with self.lock:
+                delay = self.delays.pop(0)
+            time.sleep(delay)
+            return FakeResponse({'opstat': 'ok', 'response':
+                                 {'delay': delay}})
+        self.gengo.signAndRequestAPILatest = fake_request
+
+    def test_slowRequestIsHedged(self):
+        resp = self.gengo.getTranslationJob(id=1)
+        self.assertEqual(resp['response']['delay'], 0)
+        self.assertEqual(self.hedger.hedged, 1)
+        self.assertEqual(self.hedger.hedge_won, 1)
+
+    def test_fastRequestIsNotHedged(self):
+        self.delays = [0]
+        self.gengo.getTranslationJob(id=1)
+        self.assertEqual(self.hedger.hedged, 0)
+
+    def test_budgetCapsHedges(self):
+        self.hedger.tokens = 0
+        self.hedger.budget = 0
+        resp = self.gengo.getTranslationJob(id=1)
+        self.assertEqual(resp['response']['delay'], 0.5)
+        self.assertEqual(self.hedger.suppressed, 1)
+
+    def test_postsAreNeverHedged(self):
+        self.delays = [0.2]
+        self.gengo.postTranslationJob(job={})
+        self.assertEqual(self.hedger.requests, 0)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """
+    Tests the per-group circuit breaker, offline.
+    """
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=2,
+                                      reset_timeout=0.1,
+                                      groups={'quote': {'failure_threshold':
+                                                        1}})
+        self.gengo = Gengo(public_key='pub', private_key='priv',
+                           breaker=self.breaker)
+        self.failing = True
+        self.sent = []
+
+        def fake_request(fn, base, query_params, post_data={},
+                         file_data=False, timeout=None):
+            self.sent.append(base)
+            if self.failing:
+                raise IOError('connection reset')
+            return FakeResponse({'opstat': 'ok', 'response': {}})
+        self.gengo.signAndRequestAPILatest = fake_request
+
+    def test_tripsAndFailsFast(self):
+        self.assertRaises(IOError, self.gengo.getTranslationJob, id=1)
+        self.assertRaises(IOError, self.gengo.getTranslationJob, id=1)
+        self.assertRaises(GengoCircuitOpenError,
+                          self.gengo.getTranslationJob, id=1)
+        self.assertEqual(len(self.sent), 2)
+        # Other groups are unaffected.
+        self.assertRaises(IOError, self.gengo.getAccountBalance)
+
+    def test_perGroupOverrides(self):
+        self.assertRaises(IOError, self.gengo.determineTranslationCost,
+                          jobs={'jobs': {}})
+        self.assertEqual(self.breaker.state('quote'), 'open')
+
+    def test_halfOpenProbeCloses(self):
+        for i in range(2):
+            self.assertRaises(IOError, self.gengo.getTranslationJob, id=1)
+        time.sleep(0.15)
+        self.failing = False
+        self.assertEqual(self.gengo.getTranslationJob(id=1)['opstat'], 'ok')
+        self.assertEqual(self.breaker.state('jobs'), 'closed')
+
+    def test_failedProbeReopens(self):
+        for i in range(2):
+            self.assertRaises(IOError, self.gengo.getTranslationJob, id=1)
+        time.sleep(0.15)
+        self.assertRaises(IOError, self.gengo.getTranslationJob, id=1)
+        self.assertEqual(self.breaker.state('jobs'), 'open')
+
+    def test_apiErrorsDoNotTrip(self):
+        self.failing = False
+        error = FakeResponse({'opstat': 'error', 'err':
+                              {'msg': 'bad job', 'code': 2000}})
+        self.gengo.signAndRequestAPILatest = lambda *args, **kwargs: error
+        for i in range(3):
+            self.assertRaises(GengoError, self.gengo.getTranslationJob, id=1)
+        self.assertEqual(self.breaker.state('jobs'), 'closed')
+
+
+class TestTimeoutsAndDeadlines(unittest.TestCase):
+    """
+    Tests that timeouts reach the request layer and deadlines cap them,
+    offline.
+    """
+    def setUp(self):
+        self.gengo = Gengo(public_key='pub', private_key='priv',
+                           timeout=(3.05, 30))
+        self.timeouts = []
+
+        def fake_request(fn, base, query_params, post_data={},
+                         file_data=False, timeout=None):
+            self.timeouts.append(timeout)
+            return FakeResponse({'opstat': 'ok', 'response': {}})
+        self.gengo.signAndRequestAPILatest = fake_request
+
+    def test_clientAndPerCallTimeouts(self):
+        self.gengo.getAccountBalance()
+        self.gengo.getAccountBalance(timeout=5)
+        self.assertEqual(self.timeouts, [(3.05, 30), 5])
+
+    def test_deadlineCapsTimeout(self):
+        self.gengo.getAccountBalance(deadline=Deadline(1))
+        connect, read = self.timeouts[0]
+        self.assertTrue(connect <= 1 and read <= 1)
+
+    def test_expiredDeadlineStopsCalls(self):
+        deadline = Deadline(0)
+        self.assertRaises(GengoDeadlineExceeded,
+                          self.gengo.getAccountBalance, deadline=deadline)
+        self.assertEqual(self.timeouts, [])
+
+    def test_childDeadlineNeverOutlivesParent(self):
+        parent = Deadline(1)
+        self.assertTrue(parent.child(60).remaining() <= 1)
+
+
+class TestAdaptiveLimiter(unittest.TestCase):
+    """
+    Tests the latency-driven concurrency limiter, offline.
+    """
+    def test_growsWhileLatencyIsFlat(self):
+        limiter = AdaptiveLimiter(initial=4)
+        for i in range(50):
+            limiter.acquire()
+            limiter.release('get', 0.1)
+        self.assertTrue(limiter.limit > 4)
+
+    def test_shrinksWhenLatencyClimbs(self):
+        limiter = AdaptiveLimiter(initial=32)
+        limiter.acquire()
+        limiter.release('get', 0.1)
+        for i in range(50):
+            limiter.acquire()
+            limiter.release('get', 2.0)
+        self.assertTrue(limiter.limit < 32)
+
+    def test_backsOffOnErrors(self):
+        limiter = AdaptiveLimiter(initial=10)
+        limiter.acquire()
+        limiter.release('get', 0.1, ok=False)
+        self.assertEqual(limiter.limit, 9)
+
+    def test_boundsInFlightRequests(self):
+        limiter = AdaptiveLimiter(initial=2, max_limit=2)
+        gengo = Gengo(public_key='pub', private_key='priv',
+                      limiter=limiter)
+        peak = []
+
+        def fake_request(fn, base, query_params, post_data={},
+                         file_data=False, timeout=None):
+            peak.append(limiter.in_flight)
+            time.sleep(0.05)
+            return FakeResponse({'opstat': 'ok', 'response': {}})
+        gengo.signAndRequestAPILatest = fake_request
+        threads = [threading.Thread(target=gengo.getAccountBalance)
+                   for i in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(peak), 6)
+        self.assertTrue(max(peak) <= 2)
+        self.assertEqual(limiter.in_flight, 0)
+
+
+class TestSharedRateLimit(unittest.TestCase):
+    """
+    Tests the shared token bucket, offline.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'buckets.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_backendEnforcesBurst(self):
+        backend = SQLiteRateLimitBackend(self.path)
+        self.assertEqual(backend.lease('k', 4, 1, 5), (4, 0.0))
+        self.assertEqual(backend.lease('k', 4, 1, 5)[0], 1)
+        granted, wait = backend.lease('k', 4, 1, 5)
+        self.assertEqual(granted, 0)
+        self.assertTrue(0 < wait <= 1)
+
+    def test_limitersShareOneBucket(self):
+        # Two "processes" pointing at the same file.
+        # A slow refill, so the bucket is still empty when we look.
+        first = SharedRateLimiter(SQLiteRateLimitBackend(self.path),
+                                  'pub', rate=1, burst=10, batch=5)
+        second = SharedRateLimiter(SQLiteRateLimitBackend(self.path),
+                                   'pub', rate=1, burst=10, batch=5)
+        for i in range(5):
+            first.acquire()
+            second.acquire()
+        self.assertEqual(first.leases + second.leases, 2)
+        granted, wait = SQLiteRateLimitBackend(self.path).lease(
+            'pub', 1, 1, 10)
+        self.assertEqual(granted, 0)
+        self.assertTrue(0 < wait <= 1)
+
+    def test_refusedLeasesWait(self):
+        first = SharedRateLimiter(SQLiteRateLimitBackend(self.path),
+                                  'pub', rate=20, burst=2, batch=2)
+        second = SharedRateLimiter(SQLiteRateLimitBackend(self.path),
+                                   'pub', rate=20, burst=2, batch=2)
+        first.acquire()
+        first.acquire()
+        # The bucket is empty: second is refused until a token drips in.
+        second.acquire()
+        self.assertTrue(second.leases >= 2)
+        self.assertTrue(second.waited > 0)
+
+    def test_clientUsesPublicKeyBucket(self):
+        gengo = Gengo(public_key='pub', private_key='priv', rate_limit=100,
+                      rate_limit_backend=SQLiteRateLimitBackend(self.path))
+        gengo.signAndRequestAPILatest = \
+            lambda *args, **kwargs: FakeResponse({'opstat': 'ok'})
+        gengo.getAccountBalance()
+        self.assertEqual(gengo.rate_limiter.key, 'gengo:pub')
+        self.assertEqual(gengo.rate_limiter.leases, 1)
+
+
+class TestPartialJobErrors(unittest.TestCase):
+    """
+    Tests that per-job errors come back structured instead of being
+    flattened into the first error. Offline.
+    """
+    def setUp(self):
+        self.gengo = Gengo(public_key='pub', private_key='priv')
+        self.reply = {}
+        self.gengo.signAndRequestAPILatest = \
+            lambda *args, **kwargs: FakeResponse(self.reply)
+        self.jobs = {
+            'job_1': {'type': 'text', 'body_src': 'one', 'lc_src': 'en',
+                      'lc_tgt': 'ja', 'tier': 'standard'},
+            'job_2': {'type': 'text', 'body_src': 'two', 'lc_src': 'en',
+                      'lc_tgt': 'xx', 'tier': 'standard'},
+        }
+
+    def test_perJobErrors(self):
+        self.reply = {
+            'opstat': 'error',
+            'err': {'job_2': [{'code': 1551, 'msg': 'bad language pair'}]},
+            'response': {'jobs': {'job_1': {'credits': 0.5}}},
+        }
+        try:
+            self.gengo.determineTranslationCost(jobs={'jobs': self.jobs})
+        except GengoJobsError, e:
+            self.assertEqual(e.error_code, 1551)
+            self.assertEqual(e.errors.keys(), ['job_2'])
+            self.assertEqual(e.succeeded, {'job_1': {'credits': 0.5}})
+            self.assertEqual(e.failed_jobs().keys(), ['job_2'])
+        else:
+            self.fail('GengoJobsError not raised')
+
+    def test_plainErrorsStayPlain(self):
+        self.reply = {'opstat': 'error',
+                      'err': {'code': 2000, 'msg': 'nope'}}
+        try:
+            self.gengo.postTranslationJobs(jobs={'jobs': self.jobs})
+        except GengoError, e:
+            self.assertFalse(isinstance(e, GengoJobsError))
+        else:
+            self.fail('GengoError not raised')
+
+
+class TestSubmissionJournal(unittest.TestCase):
+    """
+    Tests crash-safe resumable submission against the fake API.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'journal.log')
+        self.api = FakeAPI()
+        self.gengo = Gengo(public_key='pub', private_key='priv')
+        self.gengo.signAndRequestAPILatest = self.api
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_submitsInChunks(self):
+        journal = SubmissionJournal(self.path)
+        done = journal.submit(self.gengo, make_jobs(5), chunk_size=2)
+        journal.close()
+        self.assertEqual(len(done), 3)
+        self.assertEqual(len(self.api.jobs), 5)
+        self.assertEqual(journal.order_ids(), [1, 2, 3])
+
+    def test_chunksByUnits(self):
+        jobs = make_jobs(4)
+        jobs['big'] = dict(jobs['job_000'], body_src=' '.join(['word'] * 40))
+        journal = SubmissionJournal(self.path)
+        done = journal.submit(self.gengo, jobs, chunk_size=3, max_units=40)
+        journal.close()
+        self.assertEqual([d['keys'] for d in done],
+                         [['big'], ['job_000', 'job_001', 'job_002'],
+                          ['job_003']])
+
+    def test_resumesAfterCrash(self):
+        jobs = make_jobs(6)
+        journal = SubmissionJournal(self.path, group_size=2)
+        journal.submit(self.gengo, jobs, chunk_size=2)
+        self.assertEqual(len(self.api.jobs), 6)
+
+        # Start over, this time losing the reply to the second chunk.
+        self.api = FakeAPI()
+        self.gengo.signAndRequestAPILatest = self.api
+        os.remove(self.path)
+        journal = SubmissionJournal(self.path, group_size=2)
+        first = journal.submit(self.gengo, make_jobs(2), chunk_size=2)
+        self.assertEqual(len(first), 1)
+        self.api.fail_next_post = True
+        self.assertRaises(IOError, journal.submit, self.gengo, jobs,
+                          chunk_size=2)
+        journal.close()
+        self.assertEqual(len(self.api.jobs), 4)
+
+        # A fresh process reads the journal, reconciles, and only sends
+        # what never made it.
+        journal = SubmissionJournal(self.path, group_size=2)
+        self.assertEqual(len(journal.pending), 1)
+        journal.submit(self.gengo, jobs, chunk_size=2)
+        journal.close()
+        self.assertEqual(len(self.api.jobs), 6)
+        self.assertEqual(sorted(journal.landed), sorted(jobs))
+
+    def test_reconcilesMoreThanOnePage(self):
+        jobs = make_jobs(300)
+        journal = SubmissionJournal(self.path)
+        self.api.fail_next_post = True
+        self.assertRaises(IOError, journal.submit, self.gengo, jobs,
+                          chunk_size=300)
+        journal.close()
+        journal = SubmissionJournal(self.path)
+        self.assertEqual(len(journal.pending), 1)
+        journal.submit(self.gengo, jobs, chunk_size=50)
+        journal.close()
+        self.assertEqual(len(self.api.jobs), 300)
+        self.assertEqual(sorted(journal.landed), sorted(jobs))
+
+    def test_recordsAfterATornLineSurvive(self):
+        journal = SubmissionJournal(self.path)
+        self.api.fail_next_post = True
+        self.assertRaises(IOError, journal.submit, self.gengo, make_jobs(1))
+        journal.close()
+        f = open(self.path, 'ab')
+        f.write('{"event":"done","chu')
+        f.close()
+        # The first record written is the outcome of reconciling.
+        journal = SubmissionJournal(self.path)
+        journal.reconcile(self.gengo)
+        journal.close()
+        journal = SubmissionJournal(self.path)
+        self.assertEqual(journal.landed.keys(), ['job_000'])
+        self.assertEqual(journal.pending, {})
+
+    def test_reconcileMatchesEachRemoteJobOnce(self):
+        jobs = make_jobs(2)
+        jobs['job_001'] = dict(jobs['job_000'])
+        # The same content ordered earlier, outside the journal.
+        self.gengo.postTranslationJobs(jobs={'jobs': {
+            'old': jobs['job_000']}})
+        journal = SubmissionJournal(self.path)
+        self.api.fail_next_post = True
+        self.assertRaises(IOError, journal.submit, self.gengo, jobs)
+        journal.close()
+        journal = SubmissionJournal(self.path)
+        journal.reconcile(self.gengo)
+        self.assertEqual(sorted([v['job_id'] for v in
+                                 journal.landed.values()]), [2, 3])
+
+    def test_expiredDeadlineSendsNothing(self):
+        journal = SubmissionJournal(self.path)
+        done = journal.submit(self.gengo, make_jobs(3), chunk_size=1,
+                              deadline=Deadline(0))
+        self.assertEqual(done, [])
+        self.assertEqual(self.api.jobs, {})
+        self.assertEqual(journal.pending, {})
+
+
+class TestIdempotentSubmission(unittest.TestCase):
+    """
+    Tests that resubmitting jobs never orders them twice. Offline.
+    """
+    def setUp(self):
+        self.api = FakeAPI()
+        self.index = IdempotencyIndex()
+        self.gengo = Gengo(public_key='pub', private_key='priv',
+                           idempotency=self.index)
+        self.gengo.signAndRequestAPILatest = self.api
+
+    def test_resubmissionIsAnsweredFromIndex(self):
+        jobs = make_jobs(3, custom_data='mine')
+        self.gengo.postTranslationJobs(jobs={'jobs': jobs})
+        self.assertEqual(len(self.api.jobs), 3)
+        self.assertTrue(self.api.jobs[1]['custom_data'].endswith(';mine'))
+        jobs.update(make_jobs(4, custom_data='mine'))
+        resp = self.gengo.postTranslationJobs(jobs={'jobs': jobs})
+        self.assertEqual(len(self.api.jobs), 4)
+        self.assertEqual(len(resp['response']['already_ordered']), 3)
+
+    def test_timedOutSubmissionIsVerified(self):
+        jobs = make_jobs(2)
+        self.api.fail_next_post = True
+        self.assertRaises(IOError, self.gengo.postTranslationJobs,
+                          jobs={'jobs': jobs})
+        resp = self.gengo.postTranslationJobs(jobs={'jobs': jobs})
+        self.assertEqual(len(self.api.jobs), 2)
+        self.assertEqual(resp['response']['order_id'], None)
+        self.assertEqual(sorted([v['job_id'] for v in
+                         resp['response']['already_ordered'].values()]),
+                         [1, 2])
+
+    def test_largeTimedOutBatchIsVerified(self):
+        jobs = make_jobs(300)
+        self.api.fail_next_post = True
+        self.assertRaises(IOError, self.gengo.postTranslationJobs,
+                          jobs={'jobs': jobs})
+        resp = self.gengo.postTranslationJobs(jobs={'jobs': jobs})
+        self.assertEqual(len(self.api.jobs), 300)
+        self.assertEqual(len(resp['response']['already_ordered']), 300)
+
+    def test_concurrentSubmissionsOrderOnce(self):
+        release = threading.Event()
+
+        def slow_api(*args, **kwargs):
+            release.wait(5)
+            return self.api(*args, **kwargs)
+        self.gengo.signAndRequestAPILatest = slow_api
+        jobs = make_jobs(3)
+        first = threading.Thread(target=self.gengo.postTranslationJobs,
+                                 kwargs={'jobs': {'jobs': jobs}})
+        first.start()
+        while not self.index.in_flight:
+            time.sleep(0.001)
+        try:
+            self.gengo.postTranslationJobs(jobs={'jobs': jobs})
+            self.fail('expected GengoInFlightError')
+        except GengoInFlightError, e:
+            self.assertTrue(e.already_ordered['job_000']['in_flight'])
+        release.set()
+        first.join()
+        self.assertEqual(len(self.api.jobs), 3)
+
+    def test_failedVerificationReleasesClaims(self):
+        jobs = make_jobs(2)
+        self.api.fail_next_post = True
+        self.assertRaises(IOError, self.gengo.postTranslationJobs,
+                          jobs={'jobs': jobs})
+
+        def unreachable(fn, base, *args, **kwargs):
+            if fn['method'] == 'GET':
+                raise IOError('read timed out')
+            return self.api(fn, base, *args, **kwargs)
+        self.gengo.signAndRequestAPILatest = unreachable
+        jobs.update(make_jobs(3))
+        self.assertRaises(IOError, self.gengo.postTranslationJobs,
+                          jobs={'jobs': jobs})
+        self.assertEqual(self.index.in_flight, set())
+        self.gengo.signAndRequestAPILatest = self.api
+        resp = self.gengo.postTranslationJobs(jobs={'jobs': jobs})
+        self.assertEqual(len(self.api.jobs), 3)
+        self.assertEqual(len(resp['response']['already_ordered']), 2)
+
+    def test_singleJobReplay(self):
+        job = make_jobs(1)['job_000']
+        first = self.gengo.postTranslationJob(job=job)
+        again = self.gengo.postTranslationJob(job=job)
+        self.assertEqual(len(self.api.jobs), 1)
+        self.assertEqual(again['response']['job']['job_id'],
+                         first['response']['job']['job_id'])
+
+    def test_rejectedSubmissionCanBeRetried(self):
+        self.gengo.signAndRequestAPILatest = \
+            lambda *args, **kwargs: FakeResponse(
+                {'opstat': 'error', 'err': {'code': 2000, 'msg': 'no'}})
+        self.assertRaises(GengoError, self.gengo.postTranslationJobs,
+                          jobs={'jobs': make_jobs(1)})
+        self.gengo.signAndRequestAPILatest = self.api
+        self.gengo.postTranslationJobs(jobs={'jobs': make_jobs(1)})
+        self.assertEqual(self.api.calls, [('POST', '/translate/jobs')])
+
+
+class TestBatchDeduplication(unittest.TestCase):
+    """
+    Tests collapsing identical jobs within one batch. Offline.
+    """
+    def setUp(self):
+        self.api = FakeAPI()
+        self.gengo = Gengo(public_key='pub', private_key='priv')
+        self.gengo.signAndRequestAPILatest = self.api
+        self.jobs = make_jobs(3)
+        self.jobs['dup_a'] = dict(self.jobs['job_000'], slug='elsewhere')
+        self.jobs['dup_b'] = dict(self.jobs['job_000'])
+
+    def test_duplicatesAreSentOnce(self):
+        resp = self.gengo.postTranslationJobs(jobs={'jobs': self.jobs},
+                                              dedupe=True)
+        self.assertEqual(len(self.api.jobs), 3)
+        self.assertEqual(resp['response']['collapsed'],
+                         {'dup_a': ['dup_a', 'dup_b', 'job_000']})
+
+    def test_quotesAreFannedOut(self):
+        def fake_quote(fn, base, query_params, post_data={},
+                       file_data=False, timeout=None):
+            sent = post_data['jobs']['jobs']
+            return FakeResponse({'opstat': 'ok', 'response': {'jobs': dict(
+                [(k, {'credits': 1.0}) for k in sent])}})
+        self.gengo.signAndRequestAPILatest = fake_quote
+        resp = self.gengo.determineTranslationCost(jobs={'jobs': self.jobs},
+                                                   dedupe=True)
+        self.assertEqual(sorted(resp['response']['jobs']),
+                         sorted(self.jobs))
+
+    def test_failedJobsIncludeDuplicates(self):
+        self.gengo.signAndRequestAPILatest = \
+            lambda *args, **kwargs: FakeResponse({'opstat': 'error', 'err': {
+                'dup_a': [{'code': 1551, 'msg': 'bad language'}]}})
+        try:
+            self.gengo.postTranslationJobs(jobs={'jobs': self.jobs},
+                                           dedupe=True)
+            self.fail('expected GengoJobsError')
+        except GengoJobsError, e:
+            self.assertEqual(sorted(e.errors), ['dup_a', 'dup_b', 'job_000'])
+            self.assertEqual(e.failed_jobs(),
+                             dict([(k, self.jobs[k]) for k in e.errors]))
+
+    def test_fileJobsAreLeftAlone(self):
+        jobs = {'a': {'type': 'file', 'file_path': 'a.txt'},
+                'b': {'type': 'file', 'file_path': 'b.txt'}}
+        self.gengo.postTranslationJobs(jobs={'jobs': jobs}, dedupe=True)
+        self.assertEqual(len(self.api.jobs), 2)
+
+
+class TestTranslationMemory(unittest.TestCase):
+    """
+    Tests exact and fuzzy translation memory lookups. Offline.
+    """
+    def setUp(self):
+        self.tm = TranslationMemory()
+        self.tm.add('Add to cart', u'\u30ab\u30fc\u30c8\u306b\u8ffd\u52a0',
+                    'en', 'ja', 1)
+        self.tm.add('The quick brown fox jumps over the lazy dog',
+                    'fox ja', 'en', 'ja', 2)
+
+    def test_exactMatchIgnoresCaseAndSpacing(self):
+        matches = self.tm.lookup('add  to Cart ', 'en', 'ja')
+        self.assertEqual(matches[0]['score'], 1.0)
+        self.assertEqual(matches[0]['job_id'], 1)
+
+    def test_fuzzyMatch(self):
+        matches = self.tm.lookup('The quick brown fox jumped over the lazy '
+                                 'dog', 'en', 'ja')
+        self.assertEqual(matches[0]['job_id'], 2)
+        self.assertTrue(0.8 <= matches[0]['score'] < 1.0)
+        self.assertEqual(self.tm.lookup('Something else entirely', 'en',
+                                        'ja'), [])
+
+    def test_languagePairMatters(self):
+        self.assertEqual(self.tm.lookup('Add to cart', 'en', 'de'), [])
+
+    def test_onlyApprovedJobsAreStored(self):
+        self.assertFalse(self.tm.add_job({'status': 'reviewable',
+                                          'body_src': 'a', 'body_tgt': 'b',
+                                          'lc_src': 'en', 'lc_tgt': 'ja'}))
+        self.assertEqual(len(self.tm), 2)
+
+    def test_preSubmitHookSkipsKnownStrings(self):
+        api = FakeAPI()
+        gengo = Gengo(public_key='pub', private_key='priv',
+                      pre_submit=self.tm.pre_submit_hook())
+        gengo.signAndRequestAPILatest = api
+        jobs = make_jobs(2)
+        jobs['known'] = dict(jobs['job_000'], body_src='Add to cart')
+        resp = gengo.postTranslationJobs(jobs={'jobs': jobs})
+        self.assertEqual(len(api.jobs), 2)
+        self.assertEqual(resp['response']['pre_submit'].keys(), ['known'])
+
+    def test_importCommitsInBatches(self):
+        api = FakeAPI()
+        gengo = Gengo(public_key='pub', private_key='priv')
+        gengo.signAndRequestAPILatest = api
+        gengo.postTranslationJobs(jobs={'jobs': make_jobs(120)})
+        for job in api.jobs.values():
+            job.update(status='approved', body_tgt='ja',
+                       lc_src='en', lc_tgt='ja')
+        api.jobs[5]['status'] = 'reviewable'
+        tm = TranslationMemory()
+        tm.commit_every = 50
+        sizes = []
+        add_many = tm.add_many
+        tm.add_many = lambda segments: (sizes.append(len(segments)),
+                                        add_many(segments))
+        self.assertEqual(tm.import_jobs(gengo, range(1, 121)), 119)
+        self.assertEqual(len(tm), 119)
+        self.assertEqual(sizes, [99, 20])
+
+    def test_commonTrigramsAreSkipped(self):
+        tm = TranslationMemory(max_postings=5)
+        for i in range(20):
+            tm.add('the cat number %d' % i, 'ja', 'en', 'ja', i)
+        tm.add('Zebras quickly vanish', 'ja', 'en', 'ja', 99)
+        tm.add('Zebras quickly vanish', 'de', 'en', 'de', 100)
+        matches = tm.lookup('zebras quickly vanished', 'en', 'ja')
+        self.assertEqual([m['job_id'] for m in matches], [99])
+        self.assertEqual(tm.lookup('the cat number 7!', 'en', 'ja', limit=1)
+                         [0]['job_id'], 7)
+
+
+class TestQuoteCache(unittest.TestCase):
+    """
+    Tests local cost estimates. Offline.
+    """
+    def setUp(self):
+        self.gengo = Gengo(public_key='pub', private_key='priv')
+        self.sent = []
+
+        def fake_request(fn, base, query_params, post_data={},
+                         file_data=False, timeout=None):
+            self.sent.append(base)
+            if base.endswith('language_pairs'):
+                return FakeResponse({'opstat': 'ok', 'response': [
+                    {'lc_src': 'en', 'lc_tgt': 'ja', 'tier': 'standard',
+                     'unit_price': '0.05', 'currency': 'USD'}]})
+            jobs = post_data['jobs']['jobs']
+            return FakeResponse({'opstat': 'ok', 'response': {'jobs': dict(
+                [(k, {'unit_count': count_units(j['body_src'], 'en'),
+                      'credits': 0.1 * count_units(j['body_src'], 'en'),
+                      'currency': 'USD'}) for k, j in jobs.items()])}})
+        self.gengo.signAndRequestAPILatest = fake_request
+        self.quotes = QuoteCache()
+
+    def test_countUnits(self):
+        self.assertEqual(count_units('Add to  cart', 'en'), 3)
+        self.assertEqual(count_units(u'\u30ab\u30fc \u30c8', 'ja'), 3)
+        self.assertEqual(count_units('\xe4\xb8\xad\xe6\x96\x87',
+                                     'zh-tw'), 2)
+
+    def test_missFallsBackToRealQuote(self):
+        resp = self.quotes.quote(self.gengo, make_jobs(2))
+        self.assertFalse(resp['estimated'])
+        self.assertEqual(len(self.sent), 1)
+        resp = self.quotes.quote(self.gengo, make_jobs(2))
+        self.assertTrue(resp['estimated'])
+        self.assertEqual(len(self.sent), 1)
+        self.assertAlmostEqual(resp['jobs']['job_000']['credits'], 0.2)
+
+    def test_reportsEstimateAccuracy(self):
+        self.quotes.refresh(self.gengo)
+        resp = self.quotes.quote(self.gengo, make_jobs(1), exact=True)
+        self.assertAlmostEqual(resp['estimate_error']['job_000'], -0.5)
+        self.assertAlmostEqual(self.quotes.accuracy(), 0.5)
+        # The real quote replaced the list price.
+        self.assertAlmostEqual(self.quotes.estimate(make_jobs(1))
+                               ['job_000']['credits'], 0.2)
+
+
+class TestFileAnalysis(unittest.TestCase):
+    """
+    Tests pre-flight analysis of local files and quote reuse. Offline.
+    """
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.gengo = Gengo(public_key='pub', private_key='priv')
+        self.uploads = []
+
+        def fake_request(fn, base, query_params, post_data={},
+                         file_data=False, timeout=None):
+            self.uploads.extend((file_data or {}).keys())
+            return FakeResponse({'opstat': 'ok', 'response': {'jobs': dict(
+                [(k, {'unit_count': 400, 'credits': 20.0,
+                      'currency': 'USD', 'identifier': 'id-%s' % k})
+                 for k in post_data['jobs']['jobs']])}})
+        self.gengo.signAndRequestAPILatest = fake_request
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, data):
+        path = os.path.join(self.dir, name)
+        f = open(path, 'wb')
+        f.write(data)
+        f.close()
+        return path
+
+    def test_countsAcrossBlocks(self):
+        text = u'caf\xe9 au lait ' * 100000
+        path = self.write('en.txt', text.encode('utf-8'))
+        info = analyze_file(path, 'en')
+        self.assertEqual(info['encoding'], 'utf-8')
+        self.assertEqual(info['size'], len(text.encode('utf-8')))
+        self.assertEqual(info['unit_count'], 300000)
+        text = u'\u30ab\u30fc\u30c8\n' * 100000
+        info = analyze_file(self.write('ja.txt', text.encode('shift_jis')),
+                            'ja')
+        self.assertEqual(info['encoding'], 'shift_jis')
+        self.assertEqual(info['unit_count'], 300000)
+
+    def test_knownFileIsNotUploadedAgain(self):
+        path = self.write('doc.txt', 'Add to cart\n' * 100)
+        job = {'type': 'file', 'file_path': path, 'lc_src': 'en',
+               'lc_tgt': 'ja', 'tier': 'standard'}
+        quotes = QuoteCache()
+        resp = quotes.quote(self.gengo, {'doc': job}, exact=True)
+        self.assertEqual(self.uploads, ['file_doc'])
+        self.assertEqual(resp['jobs']['doc']['credits'], 20.0)
+        self.assertEqual(job['file_path'], path)
+        resp = quotes.quote(self.gengo, {'doc': dict(job)}, exact=True)
+        self.assertEqual(self.uploads, ['file_doc'])
+        self.assertTrue(resp['jobs']['doc']['cached'])
+        # Changed content is a different file.
+        self.write('doc.txt', 'Remove from cart\n' * 100)
+        quotes.quote(self.gengo, {'doc': dict(job)}, exact=True)
+        self.assertEqual(len(self.uploads), 2)
+
+    def test_sharesQuotesWithFileIndex(self):
+        path = self.write('doc.txt', 'Add to cart\n' * 100)
+        job = {'type': 'file', 'file_path': path, 'lc_src': 'en',
+               'lc_tgt': 'ja', 'tier': 'standard'}
+        index = FileIndex()
+        self.gengo.file_index = index
+        self.gengo.determineTranslationCost(jobs={'jobs': {'doc': job}})
+        self.assertEqual(self.uploads, ['file_doc'])
+        quotes = QuoteCache(file_index=index)
+        resp = quotes.quote(self.gengo, {'doc': dict(job)}, exact=True)
+        self.assertEqual(self.uploads, ['file_doc'])
+        self.assertEqual(resp['jobs']['doc']['identifier'], 'id-doc')
+        self.assertTrue(resp['jobs']['doc']['cached'])
+
+
+class TestFileIndex(unittest.TestCase):
+    """
+    Tests that unchanged files are uploaded once. Offline.
+    """
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'doc.txt')
+        f = open(self.path, 'wb')
+        f.write('Add to cart\n' * 100)
+        f.close()
+        self.gengo = Gengo(public_key='pub', private_key='priv',
+                           file_index=FileIndex())
+        self.calls = []
+
+        def fake_request(fn, base, query_params, post_data={},
+                         file_data=False, timeout=None):
+            self.calls.append((base, post_data, file_data))
+            if base.endswith('quote'):
+                return FakeResponse({'opstat': 'ok', 'response': {
+                    'jobs': dict([(k, {'unit_count': 300, 'credits': 15.0,
+                                       'identifier': 'id-%s' % k})
+                                  for k in post_data['jobs']['jobs']])}})
+            return FakeResponse({'opstat': 'ok', 'response': {
+                'order_id': 1, 'job_count': 1}})
+        self.gengo.signAndRequestAPILatest = fake_request
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def job(self, tier='standard'):
+        return {'type': 'file', 'file_path': self.path, 'lc_src': 'en',
+                'lc_tgt': 'ja', 'tier': tier}
+
+    def test_requoteSkipsUpload(self):
+        job = self.job()
+        self.gengo.determineTranslationCost(jobs={'jobs': {'a': job}})
+        self.assertEqual(job['file_path'], self.path)
+        resp = self.gengo.determineTranslationCost(jobs={'jobs': {
+            'b': self.job()}})
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(resp['response']['jobs']['b']['identifier'],
+                         'id-a')
+        # Another tier needs a quote of its own.
+        self.gengo.determineTranslationCost(jobs={'jobs': {
+            'c': self.job('pro')}})
+        self.assertEqual(self.calls[-1][2].keys(), ['file_c'])
+
+    def test_orderUsesIdentifier(self):
+        self.assertRaises(GengoError, self.gengo.postTranslationJobs,
+                          jobs={'jobs': {'a': self.job()}})
+        self.gengo.determineTranslationCost(jobs={'jobs': {'a': self.job()}})
+        self.gengo.postTranslationJobs(jobs={'jobs': {'a': self.job()}})
+        sent = self.calls[-1][1]['jobs']['jobs']['a']
+        self.assertEqual(sent['identifier'], 'id-a')
+        self.assertFalse('file_path' in sent)
+
+    def test_entriesExpire(self):
+        index = FileIndex(max_age=-1)
+        index.record('abc', self.job(), {'identifier': 'x'})
+        self.assertEqual(index.lookup('abc', self.job()), None)
+        self.assertEqual(index.identifier('abc'), None)
+
+
+class TestBulkQuoting(unittest.TestCase):
+    """
+    Tests size-balanced, concurrent quoting. Offline.
+    """
+    def setUp(self):
+        self.gengo = Gengo(public_key='pub', private_key='priv')
+        self.lock = threading.Lock()
+        self.requests = []
+
+        def fake_request(fn, base, query_params, post_data={},
+                         file_data=False, timeout=None):
+            jobs = post_data['jobs']['jobs']
+            with self.lock:
+                self.requests.append(sorted(jobs))
+            if 'job_013' in jobs:
+                return FakeResponse({'opstat': 'error', 'err': {
+                    'code': 1350, 'msg': 'unavailable'}})
+            if self.unreachable in jobs:
+                raise IOError('connection reset')
+            return FakeResponse({'opstat': 'ok', 'response': {'jobs': dict(
+                [(k, {'credits': len(j['body_src'])})
+                 for k, j in jobs.items()])}})
+        self.gengo.signAndRequestAPILatest = fake_request
+        self.unreachable = None
+
+    def test_packsBalancedGroups(self):
+        jobs = dict([('job_%02d' % i, {'body_src': 'x' * (i + 1) * 10})
+                     for i in range(20)])
+        groups = pack_jobs(jobs, 1000, 8)
+        self.assertEqual(len(groups), 3)
+        self.assertEqual(sorted(sum([g.keys() for g in groups], [])),
+                         sorted(jobs))
+        loads = [sum([len(j['body_src']) for j in g.values()])
+                 for g in groups]
+        self.assertTrue(max(loads) <= 1000)
+        self.assertTrue(max(loads) - min(loads) <= 200)
+        # An oversized job still gets quoted, on its own.
+        jobs['huge'] = {'body_src': 'x' * 5000}
+        self.assertTrue({'huge': jobs['huge']} in pack_jobs(jobs, 1000, 8))
+
+    def test_mergesQuotesAndGroupFailures(self):
+        jobs = make_jobs(30)
+        resp = quote_jobs(self.gengo, jobs, max_jobs=10, workers=3)
+        self.assertEqual(len(self.requests), 3)
+        failed = [r for r in self.requests if 'job_013' in r][0]
+        self.assertEqual(sorted(resp['errors']), failed)
+        self.assertEqual(resp['errors']['job_013'][0]['msg'], 'unavailable')
+        self.assertEqual(len(resp['jobs']), 20)
+        self.assertEqual(resp['jobs']['job_000']['credits'],
+                         len(jobs['job_000']['body_src']))
+
+    def test_networkErrorsFailTheirGroup(self):
+        jobs = make_jobs(31)
+        del jobs['job_013']
+        self.unreachable = 'job_025'
+        resp = quote_jobs(self.gengo, jobs, max_jobs=10, workers=3)
+        failed = [r for r in self.requests if 'job_025' in r][0]
+        self.assertEqual(sorted(resp['errors']), failed)
+        self.assertEqual(resp['errors']['job_025'],
+                         [{'code': None, 'msg': 'connection reset'}])
+        self.assertEqual(len(resp['jobs']), 20)
+
+
+class TestStreamingBody(unittest.TestCase):
+    """
+    Tests that streamed request bodies match the in-memory encoding.
+    """
+    def setUp(self):
+        self.jobs = make_jobs(200)
+        self.jobs['job_000']['body_src'] = u'caf\xe9 & cr\xe8me = 100%'
+        self.params = {'api_key': 'pub', 'ts': '1', 'api_sig': 'abc'}
+
+    def expected(self):
+        params = dict(self.params)
+        params['data'] = json.dumps({'jobs': self.jobs},
+                                    separators=(',', ':'))
+        return params
+
+    def test_matchesFormEncoding(self):
+        body = StreamingFormBody(self.params, 'data', {'jobs': self.jobs})
+        data = []
+        while True:
+            block = body.read(1000)
+            if not block:
+                break
+            self.assertTrue(len(block) <= 1000)
+            data.append(block)
+        data = ''.join(data)
+        self.assertEqual(len(data), len(body))
+        self.assertEqual(dict(parse_qsl(data)), self.expected())
+
+    def test_gengoStreamsJobs(self):
+        sent = {}
+
+        class FakeSession(object):
+            def post(self, url, headers=None, data=None, timeout=None):
+                sent['headers'] = headers
+                sent['data'] = data.read()
+                return FakeResponse({'opstat': 'ok', 'response': {}})
+
+        gengo = Gengo(public_key='pub', private_key='priv', stream_body=True)
+        gengo.session = FakeSession()
+        gengo.postTranslationJobs(jobs={'jobs': self.jobs})
+        self.assertEqual(sent['headers']['Content-Type'],
+                         'application/x-www-form-urlencoded')
+        data = json.loads(dict(parse_qsl(sent['data']))['data'])
+        self.assertEqual(data, json.loads(self.expected()['data']))
+
+
+class TestSubmissionPipeline(unittest.TestCase):
+    """
+    Tests streaming submission with a bounded window. Offline.
+    """
+    def setUp(self):
+        self.gengo = Gengo(public_key='pub', private_key='priv')
+        self.lock = threading.Lock()
+        self.orders = []
+        self.read = 0
+
+        def fake_request(fn, base, query_params, post_data={},
+                         file_data=False, timeout=None):
+            jobs = post_data['jobs']['jobs']
+            # Make later batches finish first.
+            time.sleep(0.01 * random.random())
+            if 'job_42' in jobs:
+                return FakeResponse({'opstat': 'error', 'err': {
+                    'job_42': [{'code': 1551, 'msg': 'bad language'}]}})
+            with self.lock:
+                self.orders.append(sorted(jobs))
+                order_id = len(self.orders)
+            return FakeResponse({'opstat': 'ok', 'response': {
+                'order_id': order_id, 'job_count': len(jobs)}})
+        self.gengo.signAndRequestAPILatest = fake_request
+
+    def jobs(self, count):
+        for job in make_jobs(count).values():
+            self.read += 1
+            yield dict(job)
+
+    def test_yieldsInInputOrder(self):
+        results = list(submit_stream(self.gengo, self.jobs(100),
+                                     max_jobs=10, workers=4))
+        self.assertEqual([k for k, r, e in results],
+                         ['job_%d' % i for i in range(100)])
+        errors = dict([(k, e) for k, r, e in results if e])
+        # The whole batch of ten is turned away for one bad job.
+        self.assertEqual(sorted(errors), ['job_%d' % i for i in range(40, 50)])
+        self.assertEqual(errors['job_42'], [{'code': 1551,
+                                             'msg': 'bad language'}])
+        self.assertEqual(errors['job_41'][0]['code'], None)
+        self.assertEqual(len(self.orders), 9)
+
+    def test_networkErrorsLeaveBatchUnknown(self):
+        def unreachable(*args, **kwargs):
+            raise IOError('connection reset')
+        self.gengo.signAndRequestAPILatest = unreachable
+        results = list(submit_stream(self.gengo, self.jobs(30), max_jobs=10))
+        self.assertEqual(len(results), 30)
+        # The batches may have been ordered before the connection died.
+        self.assertEqual(set([(r, e[0]['msg'], e[0].get('unknown'))
+                              for k, r, e in results]),
+                         set([(None, 'connection reset', True)]))
+
+    def test_readsAheadOnlyAWindow(self):
+        results = submit_stream(self.gengo, self.jobs(1000), max_jobs=10,
+                                workers=2, window=3, ordered=False)
+        results.next()
+        time.sleep(0.1)
+        # Three batches in the window, one waiting for a slot.
+        self.assertTrue(self.read <= 41)
+        self.assertEqual(len(list(results)), 999)
+        self.assertEqual(self.read, 1000)
+
+    def test_reraisesInputErrors(self):
+        def broken():
+            for job in self.jobs(25):
+                yield job
+            raise ValueError('bad line')
+        results = submit_stream(self.gengo, broken(), max_jobs=10)
+        self.assertRaises(ValueError, list, results)
+        self.assertEqual(len(self.orders), 2)
+
+
+class TestTargetFanOut(unittest.TestCase):
+    """
+    Tests ordering one source in many target languages. Offline.
+    """
+    def setUp(self):
+        self.gengo = Gengo(public_key='pub', private_key='priv')
+        self.calls = []
+
+        def fake_request(fn, base, query_params, post_data={},
+                         file_data=False, timeout=None):
+            self.calls.append((base.rsplit('/', 1)[-1], post_data))
+            if base.endswith('language_pairs'):
+                return FakeResponse({'opstat': 'ok', 'response': [
+                    {'lc_src': 'en', 'lc_tgt': t, 'tier': 'standard'}
+                    for t in ('ja', 'de', 'fr')] + [
+                    {'lc_src': 'en', 'lc_tgt': 'ja', 'tier': 'pro'}]})
+            if base.endswith('languages'):
+                return FakeResponse({'opstat': 'ok', 'response': [
+                    {'lc': lc} for lc in ('en', 'ja', 'de', 'fr')]})
+            jobs = post_data['jobs']['jobs']
+            return FakeResponse({'opstat': 'ok', 'response': {
+                'order_id': 7, 'jobs': dict(
+                    [(k, {'credits': 1.0}) for k in jobs])}})
+        self.gengo.signAndRequestAPILatest = fake_request
+        self.job = make_jobs(1)['job_000']
+        del self.job['lc_tgt']
+
+    def test_quotesAndOrdersOnce(self):
+        pairs = LanguagePairIndex()
+        resp = order_targets(self.gengo, self.job, ['ja', 'de', 'fr'],
+                             pairs, options={'as_group': 1})
+        self.assertEqual([c[0] for c in self.calls],
+                         ['languages', 'language_pairs', 'quote', 'jobs'])
+        self.assertEqual(sorted(resp['jobs']), ['de', 'fr', 'ja'])
+        self.assertEqual(resp['order']['order_id'], 7)
+        sent = self.calls[-1][1]['jobs']
+        self.assertEqual(sent['as_group'], 1)
+        self.assertEqual(sent['jobs']['de']['lc_tgt'], 'de')
+        self.assertTrue(sent['jobs']['de']['body_src'] is
+                        self.job['body_src'])
+        # The pairs stay cached.
+        order_targets(self.gengo, self.job, ['ja'], pairs, quote=False)
+        self.assertEqual(len(self.calls), 5)
+
+    def test_rejectsUnsupportedTargets(self):
+        self.job['tier'] = 'pro'
+        self.assertRaises(GengoJobsError, order_targets, self.gengo,
+                          self.job, ['ja', 'de'], LanguagePairIndex())
+        self.assertEqual(len(self.calls), 2)
+
+
+class TestJobValidation(unittest.TestCase):
+    """
+    Tests local validation against the language pair index.
+    """
+    def setUp(self):
+        self.pairs = LanguagePairIndex()
+        self.pairs.learn_languages({'response': [
+            {'lc': 'en'}, {'lc': 'ja'}, {'lc': 'de'}]})
+        self.pairs.learn_language_pairs({'response': [
+            {'lc_src': 'en', 'lc_tgt': 'ja', 'tier': 'standard'},
+            {'lc_src': 'en', 'lc_tgt': 'ja', 'tier': 'pro'},
+            {'lc_src': 'en', 'lc_tgt': 'de', 'tier': 'standard'}]})
+
+    def test_findsEveryProblem(self):
+        jobs = make_jobs(6)
+        jobs['job_001']['tier'] = 'ultra'
+        jobs['job_002']['lc_tgt'] = 'xx'
+        del jobs['job_003']['slug']
+        jobs['job_004']['type'] = 'file'
+        jobs['job_005'].update({'type': 'file', 'file_path': '/tmp/a.txt'})
+        errors = self.pairs.validate(jobs)
+        self.assertEqual(sorted(errors), ['job_001', 'job_002', 'job_003',
+                                          'job_004'])
+        self.assertEqual([e['msg'] for e in errors['job_002']],
+                         ["unknown language 'xx'", 'en to xx is not offered'])
+        self.assertEqual(errors['job_003'][0]['msg'], 'missing slug')
+
+    def test_hookStopsInvalidBatches(self):
+        gengo = Gengo(public_key='pub', private_key='priv',
+                      pre_submit=self.pairs.pre_submit_hook())
+        api = FakeAPI()
+        gengo.signAndRequestAPILatest = api
+        jobs = make_jobs(3)
+        jobs['job_001']['lc_tgt'] = 'de'
+        jobs['job_001']['tier'] = 'pro'
+        try:
+            gengo.postTranslationJobs(jobs={'jobs': jobs})
+            self.fail('expected GengoJobsError')
+        except GengoJobsError, e:
+            self.assertEqual(e.failed_jobs().keys(), ['job_001'])
+        self.assertEqual(api.calls, [])
+        del jobs['job_001']
+        gengo.postTranslationJobs(jobs={'jobs': jobs})
+        self.assertEqual(len(api.jobs), 2)
+
+    def test_hookChainsWithTranslationMemory(self):
+        tm = TranslationMemory()
+        tm.add('Add to cart', 'ja', 'en', 'ja', 1)
+        gengo = Gengo(public_key='pub', private_key='priv',
+                      pre_submit=[self.pairs.pre_submit_hook(),
+                                  tm.pre_submit_hook()])
+        api = FakeAPI()
+        gengo.signAndRequestAPILatest = api
+        jobs = make_jobs(3)
+        jobs['known'] = dict(jobs['job_000'], body_src='Add to cart')
+        jobs['job_001']['lc_tgt'] = 'xx'
+        self.assertRaises(GengoJobsError, gengo.postTranslationJobs,
+                          jobs={'jobs': jobs})
+        self.assertEqual(api.calls, [])
+        del jobs['job_001']
+        resp = gengo.postTranslationJobs(jobs={'jobs': jobs})
+        self.assertEqual(sorted(api.jobs[i]['slug'] for i in api.jobs),
+                         sorted([jobs['job_000']['slug'],
+                                 jobs['job_002']['slug']]))
+        validated, matched = resp['response']['pre_submit']
+        self.assertEqual(validated, None)
+        self.assertEqual(matched.keys(), ['known'])
+
+    def test_validatesLargeBatches(self):
+        self.assertEqual(self.pairs.validate(make_jobs(100000)), {})
+
+
+class TestBulkUpdates(unittest.TestCase):
+    """
+    Tests chunked, concurrent bulk updates and deletes. Offline.
+    """
+    def setUp(self):
+        self.gengo = Gengo(public_key='pub', private_key='priv',
+                           job_cache=JobCache())
+        self.lock = threading.Lock()
+        self.calls = []
+
+        def fake_request(fn, base, query_params, post_data={},
+                         file_data=False, timeout=None):
+            with self.lock:
+                self.calls.append((fn['method'], base, post_data))
+            if base.endswith('/job/13'):
+                return FakeResponse({'opstat': 'error', 'err': {
+                    'code': 2450, 'msg': 'job is being translated'}})
+            ids = [_id(e) for e in post_data.get('job_ids', [])]
+            if 7 in ids:
+                return FakeResponse({'opstat': 'error', 'err': {
+                    '7': [{'code': 2650, 'msg': 'not reviewable'}]},
+                    'response': {'jobs': {'8': {'status': 'approved'}}}})
+            return FakeResponse({'opstat': 'ok', 'response': {}})
+
+        def _id(entry):
+            return entry['job_id'] if isinstance(entry, dict) else entry
+        self.gengo.signAndRequestAPILatest = fake_request
+
+    def test_updatesInChunks(self):
+        ids = range(1, 121)
+        ids[6] = {'job_id': 7, 'rating': 5}
+        resp = update_jobs(self.gengo, 'approve', ids, chunk_size=50)
+        self.assertEqual(len(self.calls), 3)
+        self.assertEqual(resp['errors'], {7: [{'code': 2650,
+                                               'msg': 'not reviewable'}]})
+        # Of the chunk that failed, only 8 is known to be approved.
+        self.assertEqual(sorted(resp['jobs']), [8] + range(51, 121))
+        self.assertEqual(resp['jobs'][8], {'status': 'approved'})
+        self.assertEqual(sorted(resp['unknown']),
+                         range(1, 7) + range(9, 51))
+
+    def test_encodesActionWithJobIds(self):
+        sent = {}
+
+        class FakeSession(object):
+            def put(self, url, headers=None, data=None, timeout=None):
+                sent['url'] = url
+                sent['data'] = json.loads(data['data'])
+                return FakeResponse({'opstat': 'ok', 'response': {}})
+
+        gengo = Gengo(public_key='pub', private_key='priv')
+        gengo.session = FakeSession()
+        gengo.updateTranslationJobs(action={'action': 'reject',
+                                            'reason': 'quality'},
+                                    job_ids=[1, 2])
+        self.assertTrue(sent['url'].endswith('/translate/jobs'))
+        self.assertEqual(sent['data'], {'action': 'reject',
+                                        'reason': 'quality',
+                                        'job_ids': [1, 2]})
+
+    def test_deletesConcurrently(self):
+        self.gengo.job_cache.put('getTranslationJob', 12, {'response': {
+            'job': {'job_id': 12, 'status': 'available'}}})
+        resp = delete_jobs(self.gengo, [11, 12, 13], workers=3)
+        self.assertEqual(sorted(resp['jobs']), [11, 12])
+        self.assertEqual(resp['errors'][13][0]['msg'],
+                         'job is being translated')
+        self.assertEqual(self.gengo.job_cache.get('getTranslationJob', 12),
+                         None)
+
+
+class TestIncrementalSync(unittest.TestCase):
+    """
+    Tests that syncing a job only reports (and fetches) what's new.
+    """
+    def setUp(self):
+        self.gengo = Gengo(public_key='pub', private_key='priv')
+        self.comments = []
+        self.revisions = {}
+        self.feedback = None
+        self.fetched = []
+
+        def fake_request(fn, base, query_params, post_data={},
+                         file_data=False, timeout=None):
+            match = re.search('/revisions/([0-9]+)$', base)
+            if match:
+                self.fetched.append(int(match.group(1)))
+                return FakeResponse({'opstat': 'ok', 'response': {
+                    'revision': self.revisions[int(match.group(1))]}})
+            if base.endswith('/revisions'):
+                return FakeResponse({'opstat': 'ok', 'response': {
+                    'revisions': [{'rev_id': r, 'ctime': v['ctime']}
+                                  for r, v in self.revisions.items()]}})
+            if base.endswith('/comments'):
+                return FakeResponse({'opstat': 'ok', 'response': {
+                    'thread': list(self.comments)}})
+            return FakeResponse({'opstat': 'ok', 'response': {
+                'feedback': self.feedback}})
+        self.gengo.signAndRequestAPILatest = fake_request
+
+    def revise(self, rev_id, body):
+        self.revisions[rev_id] = {'ctime': rev_id, 'body_tgt': body}
+
+    def test_reportsOnlyNewItems(self):
+        sync = JobSync()
+        self.comments.append({'body': 'hi', 'author': 'customer',
+                              'ctime': 1})
+        self.revise(1, u'Add to cart')
+        new = sync.sync(self.gengo, 42)
+        self.assertEqual(len(new['comments']), 1)
+        self.assertEqual([r['body_tgt'] for r in new['revisions']],
+                         [u'Add to cart'])
+        self.assertEqual(new['feedback'], None)
+        self.assertEqual(sync.sync(self.gengo, 42),
+                         {'comments': [], 'revisions': [], 'feedback': None})
+        self.comments.append({'body': 'thanks', 'author': 'translator',
+                              'ctime': 2})
+        self.revise(2, u'Add to shopping cart')
+        self.feedback = {'rating': '5', 'for_translator': 'great'}
+        items = list(sync.sync_many(self.gengo, [42]))
+        self.assertEqual([kind for job_id, kind, item in items],
+                         ['comment', 'revision', 'feedback'])
+        self.assertEqual(self.fetched, [1, 2])
+
+    def test_storesRevisionsAsDeltas(self):
+        path = os.path.join(tempfile.mkdtemp(), 'sync.db')
+        sync = JobSync(path)
+        body = u' '.join([u'word%d' % i for i in range(500)])
+        self.revise(1, body)
+        self.revise(2, body.replace(u'word250', u'\u5358\u8a9e'))
+        sync.sync_revisions(self.gengo, 42)
+        delta = json.loads(sync.conn.execute(
+            'SELECT delta FROM revisions WHERE rev_id = ?',
+            ('2',)).fetchone()[0])
+        self.assertEqual(len(delta), 3)
+        # A fresh instance rebuilds the history from disk.
+        sync = JobSync(path)
+        self.revise(3, body)
+        sync.sync_revisions(self.gengo, 42)
+        self.assertEqual(sync.revision_body(42, 2),
+                         self.revisions[2]['body_tgt'])
+        self.assertEqual(sync.revision_body(42, 3), body)
+        shutil.rmtree(os.path.dirname(path))
+
+    def test_deltaRoundTrip(self):
+        old = u'The quick  brown fox\njumps'
+        new = u'A quick brown\tfox jumps high'
+        self.assertEqual(apply_delta(old, make_delta(old, new)), new)
+
+
+class TestGlossaryManager(unittest.TestCase):
+    """
+    Tests the glossary cache and term matching. Offline.
+    """
+    def setUp(self):
+        self.gengo = Gengo(public_key='pub', private_key='priv')
+        self.calls = []
+        self.listing = [
+            {'id': 1, 'source_language_code': 'en', 'unit_count': 2,
+             'target_languages': [[10, 'ja'], [11, 'de']]},
+            {'id': 2, 'source_language_code': 'en', 'unit_count': 1,
+             'target_languages': ['ja']},
+            {'id': 3, 'source_language_code': 'ja', 'unit_count': 1,
+             'target_languages': ['en']}]
+        self.terms = {
+            1: [{'source': 'shopping cart'}, {'en': 'Checkout'}],
+            2: ['cart'],
+            3: [u'\u30ab\u30fc\u30c8']}
+
+        def fake_request(fn, base, query_params, post_data={},
+                         file_data=False, timeout=None):
+            self.calls.append(base.rsplit('/', 1)[-1])
+            if base.endswith('/glossary'):
+                return FakeResponse({'opstat': 'ok',
+                                     'response': self.listing})
+            glossary_id = int(base.rsplit('/', 1)[-1])
+            return FakeResponse({'opstat': 'ok', 'response': {
+                'id': glossary_id, 'terms': self.terms[glossary_id]}})
+        self.gengo.signAndRequestAPILatest = fake_request
+
+    def test_termIndex(self):
+        terms = [('he', 1), ('she', 2), ('his', 3), ('hers', 4),
+                 ('cart', 5)]
+        index = TermIndex(terms, whole_words=False)
+        self.assertEqual([(s, e, v) for s, e, t, v in
+                          index.find('ushers')],
+                         [(1, 4, 2), (2, 4, 1), (2, 6, 4)])
+        index = TermIndex(terms)
+        self.assertEqual(index.find('ushers'), [])
+        self.assertEqual([v for s, e, t, v in index.find('She, HIS cart')],
+                         [2, 3, 5])
+        self.assertEqual(index.find('carts'), [])
+        index = TermIndex([(u'\u30ab\u30fc\u30c8', 1)], whole_words=False)
+        self.assertEqual(len(index.find(u'\u30ab\u30fc\u30c8\u306b')), 1)
+
+    def test_assignsBestGlossary(self):
+        manager = GlossaryManager()
+        jobs = make_jobs(3)
+        jobs['job_000']['body_src'] = 'Add to shopping cart, then Checkout'
+        jobs['job_001']['body_src'] = 'View cart'
+        jobs['job_002']['body_src'] = 'View cart'
+        jobs['job_002']['lc_tgt'] = 'de'
+        assigned = manager.assign_glossaries(self.gengo, jobs)
+        self.assertEqual(assigned['job_000']['glossary_id'], 1)
+        self.assertEqual(assigned['job_001']['glossary_id'], 2)
+        self.assertFalse('glossary_id' in assigned['job_002'])
+        self.assertFalse('glossary_id' in jobs['job_000'])
+        self.assertEqual(sorted(self.calls), ['1', '2', 'glossary'])
+
+    def test_invalidatesChangedGlossaries(self):
+        manager = GlossaryManager(list_max_age=0)
+        jobs = {'a': dict(make_jobs(1)['job_000'], body_src='View cart')}
+        manager.match_jobs(self.gengo, jobs)
+        self.terms[2] = ['view']
+        self.listing[1] = dict(self.listing[1], unit_count=2)
+        time.sleep(0.01)
+        self.assertEqual(manager.match_jobs(self.gengo, jobs),
+                         {'a': {2: ['view']}})
+        self.assertEqual(self.calls.count('2'), 2)
+        self.assertEqual(self.calls.count('1'), 1)
+
+
+class TestOrderWaiter(unittest.TestCase):
+    """
+    Tests waiting for orders to complete. Offline.
+    """
+    def setUp(self):
+        self.gengo = Gengo(public_key='pub', private_key='priv')
+        self.lock = threading.Lock()
+        # Successive states of each order; the last one repeats.
+        self.states = {
+            '1': [{'jobs_available': [1, 2]},
+                  {'jobs_available': [1, 2]},
+                  {'jobs_approved': [1], 'jobs_reviewable': [2]},
+                  {'jobs_approved': [1, 2]}],
+            '2': [{'jobs_approved': [3]}],
+            '3': [{'jobs_queued': 1}]}
+        self.polls = {}
+        self.batches = []
+
+        def fake_request(fn, base, query_params, post_data={},
+                         file_data=False, timeout=None):
+            order_id = base.rsplit('/', 1)[-1]
+            with self.lock:
+                self.timeouts.append(timeout)
+                if '/order/' in base:
+                    n = self.polls[order_id] = \
+                        self.polls.get(order_id, -1) + 1
+                    states = self.states[order_id]
+                    order = dict(states[min(n, len(states) - 1)])
+                    order['total_jobs'] = 1 if order_id != '1' else 2
+                    return FakeResponse({'opstat': 'ok', 'response': {
+                        'order': order}})
+                self.batches.append(order_id)
+                return FakeResponse({'opstat': 'ok', 'response': {'jobs': [
+                    {'job_id': int(i), 'status': 'x'}
+                    for i in order_id.split(',')]}})
+        self.gengo.signAndRequestAPILatest = fake_request
+        self.timeouts = []
+        self.transitions = []
+        self.waiter = OrderWaiter(
+            self.gengo, min_interval=0.01, max_interval=0.05,
+            on_transition=lambda *args: self.transitions.append(args[:4]))
+
+    def test_waitsForManyOrders(self):
+        handles = self.waiter.wait([1, 2], deadline=Deadline(5))
+        self.assertTrue(handles[1].done and handles[2].done)
+        self.assertEqual(self.polls, {'1': 3, '2': 0})
+        self.assertEqual(sorted(self.batches), ['1,2', '2'])
+        self.assertEqual(sorted(self.transitions),
+                         [(1, '1', 'available', 'approved'),
+                          (1, '2', 'available', 'reviewable'),
+                          (1, '2', 'reviewable', 'approved')])
+        self.assertEqual(handles[1].progress['counts'], {'approved': 2})
+        # Every call got what was left of the budget as its timeout.
+        self.assertFalse(None in self.timeouts)
+        self.assertTrue(0 < min(self.timeouts) <= max(self.timeouts) <= 5)
+
+    def test_backsOffWhileUnchanged(self):
+        handle = self.waiter.add(3)
+        for i in range(5):
+            handle.next_poll = 0
+            self.waiter.poll_due()
+        self.assertEqual(handle.interval, 0.05)
+        self.assertFalse(handle.done)
+        self.assertRaises(GengoDeadlineExceeded, self.waiter.wait, [3],
+                          Deadline(0.1))
+
+    def test_backgroundLoop(self):
+        done = []
+        self.waiter.start()
+        try:
+            handle = self.waiter.add(1, callback=done.append)
+            self.assertTrue(handle.wait(5))
+        finally:
+            self.waiter.stop()
+        self.assertEqual(done, [handle])
+        self.assertEqual(self.waiter.orders, {})
+
+
+class TestBatchUnitCounting(unittest.TestCase):
+    """
+    Tests that batched unit counts match the per-string counts.
+    """
+    def setUp(self):
+        words = [u'Add', u'to', u'cart', u'\u3000', u'\n\t', u'',
+                 u'\u30ab\u30fc\u30c8', u'\U0001f600', 'S/M/L']
+        rand = random.Random(42)
+        self.texts = [u' '.join([rand.choice(words)
+                                 for i in range(rand.randint(0, 12))])
+                      for j in range(500)] + [u'', u' ', 'plain str']
+
+    def test_matchesNaiveCounting(self):
+        for lc_src in ('en', 'ja', 'zh-tw', 'ko', 'fr'):
+            self.assertEqual(count_units_batch(self.texts, lc_src),
+                             [count_units(t, lc_src) for t in self.texts])
+
+    def test_chunkByUnits(self):
+        jobs = make_jobs(5)
+        jobs['big'] = dict(jobs['job_000'], body_src='one two three four')
+        chunks = chunk_jobs_by_units(jobs, max_units=4, max_jobs=3)
+        self.assertEqual([sorted(c) for c in chunks],
+                         [['big'], ['job_000', 'job_001'],
+                          ['job_002', 'job_003'], ['job_004']])
+
+
 if __name__ == '__main__':
     unittest.main()
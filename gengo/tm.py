@@ -0,0 +1,289 @@
+# All code provided from the http://gengo.com site, such as API example code
+# and libraries, is provided under the New BSD license unless otherwise
+# noted. Details are below.
+#
+# New BSD License
+# Copyright (c) 2009-2012, myGengo, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# Neither the name of myGengo, Inc. nor the names of its contributors may
+# be used to endorse or promote products derived from this software
+# without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A local translation memory built from jobs we already paid for.
+
+Approved jobs (from getTranslationJob / getTranslationJobBatch) are stored
+in SQLite together with a trigram index. Lookups first try an exact match
+on a hash of the normalised source text, then fall back to fuzzy matching:
+candidate segments are those sharing trigrams with the query, scored with
+the Dice coefficient over trigram sets.
+
+Trigrams are stored as 32 bit CRCs rather than text, in a WITHOUT ROWID
+table keyed by language pair first, so a lookup only ever reads the
+postings of its own pair and the index is the table. Trigrams found in
+more than max_postings segments of a pair (think " th" in English) say
+little about similarity and are left out of candidate selection.
+"""
+
+import re
+import sqlite3
+import threading
+
+from hashlib import sha1
+from zlib import crc32
+
+_whitespace = re.compile(r'\s+', re.UNICODE)
+
+
+def normalize(text):
+    """
+    Lower-cased, whitespace-collapsed unicode; what matching works on.
+    """
+    if not isinstance(text, unicode):
+        text = text.decode('utf-8')
+    return _whitespace.sub(u' ', text).strip().lower()
+
+
+def trigrams(text):
+    """
+    The set of (hashed) character trigrams of normalised text.
+    """
+    padded = u'  %s ' % text
+    return set([crc32(padded[i:i + 3].encode('utf-8')) & 0xffffffff
+                for i in range(len(padded) - 2)])
+
+
+class TranslationMemory(object):
+    """
+    TranslationMemory(path = ':memory:', max_postings = 2000)
+
+    Methods:
+    add(src, tgt, lc_src, lc_tgt, job_id = None) - store a segment.
+    add_many(segments) - store (src, tgt, lc_src, lc_tgt, job_id) tuples in
+    one transaction.
+    add_job(job) - store an approved job dictionary as returned by the API.
+    import_jobs(gengo, job_ids) - fetch jobs and store the approved ones.
+    lookup(text, lc_src, lc_tgt, threshold = 0.8, limit = 3) - matches as
+    a list of dicts with 'score', 'source', 'target' and 'job_id'.
+    pre_submit_hook(threshold, action) - a filter for postTranslationJobs.
+    """
+    # Candidates are rescored exactly; this bounds how many per lookup.
+    max_candidates = 200
+    # Segments import_jobs stores per transaction.
+    commit_every = 1000
+
+    def __init__(self, path=':memory:', max_postings=2000):
+        self.lock = threading.Lock()
+        self.max_postings = max_postings
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS segments (
+                id INTEGER PRIMARY KEY,
+                hash BLOB, lc_src TEXT, lc_tgt TEXT,
+                source TEXT, target TEXT, job_id INTEGER,
+                grams INTEGER);
+            CREATE UNIQUE INDEX IF NOT EXISTS segments_hash
+                ON segments (lc_src, lc_tgt, hash);
+            CREATE TABLE IF NOT EXISTS grams (
+                lc_src TEXT, lc_tgt TEXT, gram INTEGER, segment INTEGER,
+                PRIMARY KEY (lc_src, lc_tgt, gram, segment))
+                WITHOUT ROWID;
+        ''')
+        self.conn.commit()
+
+    def add(self, source, target, lc_src, lc_tgt, job_id=None):
+        """
+        Stores one segment; a segment with the same normalised source and
+        language pair is replaced.
+        """
+        self.add_many([(source, target, lc_src, lc_tgt, job_id)])
+
+    def add_many(self, segments):
+        """
+        Stores (source, target, lc_src, lc_tgt, job_id) tuples with a
+        single commit, which is what makes bulk imports fast.
+        """
+        with self.lock:
+            for source, target, lc_src, lc_tgt, job_id in segments:
+                text = normalize(source)
+                grams = trigrams(text)
+                digest = buffer(sha1(text.encode('utf-8')).digest())
+                row = self.conn.execute(
+                    'SELECT id FROM segments WHERE lc_src = ? AND '
+                    'lc_tgt = ? AND hash = ?',
+                    (lc_src, lc_tgt, digest)).fetchone()
+                if row is not None:
+                    self.conn.executemany(
+                        'DELETE FROM grams WHERE lc_src = ? AND '
+                        'lc_tgt = ? AND gram = ? AND segment = ?',
+                        [(lc_src, lc_tgt, g, row[0]) for g in grams])
+                    self.conn.execute('DELETE FROM segments WHERE id = ?',
+                                      row)
+                cur = self.conn.execute(
+                    'INSERT INTO segments (hash, lc_src, lc_tgt, source, '
+                    'target, job_id, grams) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (digest, lc_src, lc_tgt, _text(source), _text(target),
+                     job_id, len(grams)))
+                segment = cur.lastrowid
+                self.conn.executemany(
+                    'INSERT INTO grams VALUES (?, ?, ?, ?)',
+                    [(lc_src, lc_tgt, g, segment) for g in grams])
+            self.conn.commit()
+
+    def add_job(self, job):
+        """
+        Stores a job dictionary from the API if it is approved and has a
+        translation. Returns True if it was stored.
+        """
+        segment = _segment(job)
+        if segment is None:
+            return False
+        self.add_many([segment])
+        return True
+
+    def import_jobs(self, gengo, job_ids, deadline=None):
+        """
+        Fetches the given jobs (50 per getTranslationJobBatch call) and
+        stores the approved ones, committing every commit_every segments
+        rather than per job. Returns how many were stored.
+        """
+        job_ids = [str(i) for i in job_ids]
+        pending = []
+        stored = 0
+        try:
+            for i in range(0, len(job_ids), 50):
+                batch = gengo.getTranslationJobBatch(
+                    id=','.join(job_ids[i:i + 50]), deadline=deadline)
+                for job in batch['response'].get('jobs', []):
+                    segment = _segment(job)
+                    if segment is not None:
+                        pending.append(segment)
+                if len(pending) >= self.commit_every:
+                    self.add_many(pending)
+                    stored += len(pending)
+                    pending = []
+        finally:
+            # Whatever was fetched before a failure is still worth keeping.
+            self.add_many(pending)
+        return stored + len(pending)
+
+    def lookup(self, text, lc_src, lc_tgt, threshold=0.8, limit=3):
+        """
+        Best matches for text, highest score first. An exact match (after
+        normalisation) scores 1.0.
+        """
+        query = normalize(text)
+        digest = buffer(sha1(query.encode('utf-8')).digest())
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT source, target, job_id FROM segments WHERE '
+                'lc_src = ? AND lc_tgt = ? AND hash = ?',
+                (lc_src, lc_tgt, digest)).fetchone()
+            if row is not None:
+                return [_match(1.0, row)]
+            grams = trigrams(query)
+            if not grams:
+                return []
+            # Each trigram's postings are one range of the primary key.
+            # Reading one row past max_postings tells a common trigram
+            # apart without counting all of it.
+            shared = {}
+            skipped = 0
+            for gram in grams:
+                postings = self.conn.execute(
+                    'SELECT segment FROM grams WHERE lc_src = ? AND '
+                    'lc_tgt = ? AND gram = ? LIMIT ?',
+                    (lc_src, lc_tgt, gram, self.max_postings + 1)).fetchall()
+                if len(postings) > self.max_postings:
+                    skipped += 1
+                    continue
+                for (segment,) in postings:
+                    shared[segment] = shared.get(segment, 0) + 1
+            # Dice needs |A & B| >= threshold * (|A| + |B|) / 2; skipped
+            # trigrams may account for some of that overlap.
+            needed = max(1, int(threshold * len(grams) / 2) - skipped)
+            candidates = [s for s, c in shared.items() if c >= needed]
+            candidates.sort(key=lambda s: -shared[s])
+            candidates = candidates[:self.max_candidates]
+            matches = []
+            for i in range(0, len(candidates), 500):
+                part = candidates[i:i + 500]
+                cur = self.conn.execute(
+                    'SELECT source, target, job_id FROM segments WHERE id '
+                    'IN (%s)' % ','.join(['?'] * len(part)), part)
+                for row in cur:
+                    found = trigrams(normalize(row[0]))
+                    score = 2.0 * len(grams & found) / \
+                        (len(found) + len(grams))
+                    if score >= threshold:
+                        matches.append(_match(score, row))
+        matches.sort(key=lambda m: -m['score'])
+        return matches[:limit]
+
+    def pre_submit_hook(self, threshold=0.95, action='skip'):
+        """
+        Returns a hook for Gengo(pre_submit=...). Text jobs with a match
+        scoring at least threshold are either left out of the submission
+        (action='skip') or sent anyway (action='flag'); in both cases the
+        best match per job ends up in response['pre_submit'].
+        """
+        def hook(jobs):
+            keep = {}
+            matches = {}
+            for key, job in jobs.items():
+                found = []
+                if job.get('body_src'):
+                    found = self.lookup(job['body_src'], job.get('lc_src'),
+                                        job.get('lc_tgt'), threshold, 1)
+                if found:
+                    matches[key] = found[0]
+                if not found or action == 'flag':
+                    keep[key] = job
+            return keep, matches
+        return hook
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute(
+                'SELECT COUNT(*) FROM segments').fetchone()[0]
+
+
+def _segment(job):
+    if job.get('status') != 'approved' or not job.get('body_tgt') or \
+            not job.get('body_src'):
+        return None
+    return (job['body_src'], job['body_tgt'], job['lc_src'], job['lc_tgt'],
+            job.get('job_id'))
+
+
+def _text(value):
+    if isinstance(value, str):
+        return value.decode('utf-8')
+    return value
+
+
+def _match(score, row):
+    return {'score': score, 'source': row[0], 'target': row[1],
+            'job_id': row[2]}
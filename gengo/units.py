@@ -0,0 +1,156 @@
+# All code provided from the http://gengo.com site, such as API example code
+# and libraries, is provided under the New BSD license unless otherwise
+# noted. Details are below.
+#
+# New BSD License
+# Copyright (c) 2009-2012, myGengo, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# Neither the name of myGengo, Inc. nor the names of its contributors may
+# be used to endorse or promote products derived from this software
+# without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Unit counting the way Gengo bills it: words for languages that separate
+words with spaces, characters for Japanese, Chinese and Korean.
+
+count_units() handles one string. count_units_batch() handles a whole list
+in one go: with NumPy available, the strings are joined into a single
+array of code points and words (or characters) are counted for every
+string at once with a couple of vectorized passes; without NumPy it falls
+back to the plain per-string loop. benchmark() compares the two.
+"""
+
+import sys
+
+from time import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Source languages billed per character rather than per word.
+CHARACTER_LANGUAGES = ('ja', 'zh', 'ko')
+
+# Batches smaller than this aren't worth setting NumPy up for.
+VECTORIZE_THRESHOLD = 64
+
+# Every whitespace character unicode.split() knows about is below U+3001
+# (U+3000, the ideographic space, is the last one).
+_SPACE_TABLE_SIZE = 0x3001
+_space_table = None
+
+
+def is_character_language(lc_src):
+    """
+    True for language codes (including variants like 'zh-tw') that are
+    counted in characters.
+    """
+    return (lc_src or '').split('-')[0].lower() in CHARACTER_LANGUAGES
+
+
+def count_units(text, lc_src):
+    """
+    Billable units in text for a given source language: non-whitespace
+    characters for ja/zh/ko, whitespace-separated words otherwise.
+    """
+    if not isinstance(text, unicode):
+        text = text.decode('utf-8')
+    if is_character_language(lc_src):
+        return len(''.join(text.split()))
+    return len(text.split())
+
+
+def count_units_batch(texts, lc_src):
+    """
+    count_units() for every string in texts (all in the same source
+    language); returns a list of counts in the same order.
+    """
+    if numpy is None or len(texts) < VECTORIZE_THRESHOLD:
+        return [count_units(t, lc_src) for t in texts]
+    return _count_vectorized(texts, is_character_language(lc_src))
+
+
+def benchmark(texts, lc_src, repeat=3):
+    """
+    Best-of-`repeat` timings (seconds) for counting texts with the
+    per-string loop and with count_units_batch().
+    """
+    timings = {'naive': None, 'batch': None, 'numpy': numpy is not None}
+    for name, run in (('naive', lambda: [count_units(t, lc_src)
+                                         for t in texts]),
+                      ('batch', lambda: count_units_batch(texts, lc_src))):
+        for i in range(repeat):
+            start = time()
+            run()
+            elapsed = time() - start
+            if timings[name] is None or elapsed < timings[name]:
+                timings[name] = elapsed
+    return timings
+
+
+def _spaces():
+    global _space_table
+    if _space_table is None:
+        _space_table = numpy.array([unichr(i).isspace()
+                                    for i in range(_SPACE_TABLE_SIZE)] +
+                                   [False])
+    return _space_table
+
+
+def _count_vectorized(texts, characters):
+    texts = [t if isinstance(t, unicode) else t.decode('utf-8')
+             for t in texts]
+    # Each string is followed by a newline, so every string starts right
+    # after whitespace and owns at least one element of the array.
+    joined = u'\n'.join(texts) + u'\n'
+    if sys.maxunicode > 0xffff:
+        codes = numpy.frombuffer(joined.encode('utf-32-le'),
+                                 dtype=numpy.uint32)
+    else:
+        # Narrow builds: len() counts UTF-16 code units, so work in those
+        # and discount low surrogates when counting characters.
+        codes = numpy.frombuffer(joined.encode('utf-16-le'),
+                                 dtype=numpy.uint16)
+    lengths = numpy.fromiter([len(t) + 1 for t in texts],
+                             dtype=numpy.int64, count=len(texts))
+    starts = numpy.zeros(len(texts), dtype=numpy.int64)
+    numpy.cumsum(lengths[:-1], out=starts[1:])
+
+    # The table has one extra (False) slot that every code point past
+    # the last whitespace character is clipped to.
+    space = _spaces()[numpy.minimum(codes, _SPACE_TABLE_SIZE)]
+    if characters:
+        counted = ~space
+        if codes.dtype == numpy.uint16:
+            counted &= ~((codes >= 0xdc00) & (codes <= 0xdfff))
+    else:
+        # A word starts wherever a non-space follows a space.
+        after_space = numpy.empty_like(space)
+        after_space[0] = True
+        after_space[1:] = space[:-1]
+        counted = ~space & after_space
+    return numpy.add.reduceat(counted.astype(numpy.int64),
+                              starts).tolist()